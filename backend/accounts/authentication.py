@@ -0,0 +1,163 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+USER_CACHE_DEFAULTS = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'TRUST_CLAIMS': False,
+}
+
+
+def get_user_cache_settings():
+    return {**USER_CACHE_DEFAULTS, **getattr(settings, 'JWT_USER_CACHE', {})}
+
+
+class UserCache:
+    """
+    Bounded LRU cache of user id -> user with a per-entry TTL.
+
+    Keys are normalised to strings, since tokens carry the id as a string
+    while model instances carry it as an int. Entries are dropped locally
+    when the user is saved or deleted (see ``accounts.signals``); the TTL
+    bounds staleness for changes made by other processes.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, allow_stub=False):
+        """Return (user, is_stub) for a live entry, or None"""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, is_stub, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            if is_stub and not allow_stub:
+                return None
+            self._entries.move_to_end(user_id)
+        # Hand out a copy so a view mutating its user can't leak into other requests
+        return copy.copy(user), is_stub
+
+    def set(self, user_id, user, is_stub=False):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        user_id = str(user_id)
+        with self._lock:
+            self._entries[user_id] = (copy.copy(user), is_stub, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with a native async, cached user lookup for async views"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        cache_settings = get_user_cache_settings()
+        self.user_cache = UserCache(cache_settings['MAX_SIZE'], cache_settings['TTL'])
+        self.trust_claims = cache_settings['TRUST_CLAIMS']
+
+    def build_stub_user(self, user_id):
+        """A user carrying only its id, good enough for scoping queries by owner"""
+        # Tokens carry the id as a string; keys built from user.pk expect the field's type
+        user_id = self.user_model._meta.get_field(api_settings.USER_ID_FIELD).to_python(user_id)
+        user = self.user_model(**{api_settings.USER_ID_FIELD: user_id})
+        user._state.adding = False
+        return user
+
+    async def aget_user(self, validated_token, full_user=False):
+        """
+        Async counterpart of ``JWTAuthentication.get_user``.
+
+        With ``TRUST_CLAIMS`` enabled, a cache miss returns a stub user built
+        from the token instead of querying the database, unless the caller
+        needs the full row (``full_user=True``).
+        """
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        trust_claims = self.trust_claims and not full_user
+        cached = self.user_cache.get(user_id, allow_stub=trust_claims)
+        if cached is not None:
+            user, is_stub = cached
+            if is_stub:
+                return user
+        elif trust_claims:
+            user = self.build_stub_user(user_id)
+            self.user_cache.set(user_id, user, is_stub=True)
+            return user
+        else:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            self.user_cache.set(user_id, user)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+# Shared by every async view so the user cache is process-wide
+jwt_authentication = AsyncJWTAuthentication()
+
+
+class AuthMixin:
+    """Mixin to handle JWT authentication for async views"""
+
+    async def get_authenticated_user(self, request, full_user=False, allow_query_token=False):
+        """
+        Get authenticated user from JWT token.
+
+        ``allow_query_token`` also accepts ``?token=``, for clients such as
+        EventSource that cannot set an Authorization header.
+        """
+        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        if auth_header and auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
+        elif allow_query_token and request.GET.get('token'):
+            token = request.GET['token']
+        else:
+            return None, JsonResponse({'error': 'Authentication required'}, status=401)
+
+        try:
+            # Signature checks are pure CPU; only a cache miss touches the DB
+            validated_token = jwt_authentication.get_validated_token(token)
+            user = await jwt_authentication.aget_user(validated_token, full_user=full_user)
+            return user, None
+        except Exception as e:
+            return None, JsonResponse({'error': f'Invalid token: {str(e)}'}, status=401)
@@ -0,0 +1,132 @@
+"""
+Bounded executor for password hashing.
+
+PBKDF2 is slow on purpose. Running it through sync_to_async puts it on the
+threads that also serve every ORM call, so a burst of logins can starve
+the rest of the API. Here hashing and checking run on a small dedicated
+pool instead, and once that pool has ``WORKERS + MAX_QUEUE`` jobs in
+flight, new ones are turned away at once with HashingPoolBusy (a 503)
+rather than queueing without limit. hashlib's PBKDF2 releases the GIL, so
+threads are enough.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password, verify_password
+
+from todo_project.metrics import record_wait
+
+
+HASHING_DEFAULTS = {
+    # Leave half the cores for the rest of the API
+    'WORKERS': max(1, (os.cpu_count() or 2) // 2),
+    'MAX_QUEUE': 32,
+}
+
+
+def get_hashing_settings():
+    return {**HASHING_DEFAULTS, **getattr(settings, 'PASSWORD_HASHING', {})}
+
+
+class HashingPoolBusy(Exception):
+    """Raised when the hashing pool's queue is full"""
+
+
+class HashingPool:
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.running = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    async def run(self, func, *args):
+        """Run ``func(*args)`` on the pool; raises HashingPoolBusy when saturated"""
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HashingPoolBusy('Too many password checks in progress, try again shortly')
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        # Run in the caller's context so the wait is charged to its request
+        future = self.executor.submit(contextvars.copy_context().run, self._timed, time.perf_counter(), func, args)
+        # Runs on completion and on cancellation, so in_flight can't leak
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _timed(self, submitted, func, args):
+        started = time.perf_counter()
+        record_wait('password_hash', started - submitted)
+        with self._lock:
+            self.running += 1
+            self.wait_seconds += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.run_seconds += time.perf_counter() - started
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'running': self.running,
+                'queued': self.in_flight - self.running,
+                'peak_in_flight': self.peak_in_flight,
+                'saturation': self.in_flight / (self.workers + self.max_queue),
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_ms': self.wait_seconds / self.completed * 1000 if self.completed else 0.0,
+                'avg_hash_ms': self.run_seconds / self.completed * 1000 if self.completed else 0.0,
+            }
+
+
+hashing_pool = HashingPool(**{key.lower(): value for key, value in get_hashing_settings().items()})
+
+
+async def hash_password(password):
+    return await hashing_pool.run(make_password, password)
+
+
+async def authenticate(username, password):
+    """
+    Async equivalent of ModelBackend.authenticate with the hash check on the pool.
+
+    The user lookup stays on the async ORM. Unknown usernames still pay
+    for one hash, so response time doesn't reveal which accounts exist.
+    """
+    User = get_user_model()
+    try:
+        user = await User._default_manager.aget_by_natural_key(username)
+    except User.DoesNotExist:
+        await hash_password(password)
+        return None
+
+    valid, must_update = await hashing_pool.run(verify_password, password, user.password)
+    if not valid or not user.is_active:
+        return None
+    if must_update:
+        # Hasher settings changed since this password was stored
+        user.password = await hash_password(password)
+        await user.asave(update_fields=['password'])
+    return user
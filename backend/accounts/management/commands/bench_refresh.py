@@ -0,0 +1,123 @@
+import asyncio
+import json
+import time
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView as StockTokenRefreshView
+
+from accounts.models import RevokedToken
+from accounts.revocation import RevocationStore
+from accounts.views import TokenRefreshView
+from todo_project.benchmarks import bench_user
+
+
+BENCH_USERNAME = 'refresh-benchmark-user'
+JTI_PREFIX = 'bench-'
+
+
+class Command(BaseCommand):
+    help = "Measure refresh-token revocation checks against a plain signature check and a per-refresh query"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--revoked', type=int, default=100000, help='Revoked tokens seeded into the table')
+        parser.add_argument('--iterations', type=int, default=2000, help='Calls per scenario')
+
+    def seed(self, count):
+        expires_at = timezone.now() + timedelta(days=1)
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=f'{JTI_PREFIX}{uuid.uuid4().hex}', expires_at=expires_at) for _ in range(count)],
+            batch_size=5000,
+        )
+
+    async def time_async(self, func, items):
+        started = time.perf_counter()
+        for item in items:
+            await func(item)
+        return (time.perf_counter() - started) / len(items)
+
+    async def run(self, tokens, iterations, revoked_jtis):
+        store = RevocationStore(capacity=100000, error_rate=0.001, sync_interval=5, rebuild_interval=3600)
+        started = time.perf_counter()
+        await sync_to_async(store.sync)()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        async def verify(token):
+            RefreshToken(token)
+
+        async def verify_and_check(token):
+            await store.is_revoked(RefreshToken(token)['jti'])
+
+        async def verify_and_query(token):
+            await RevokedToken.objects.filter(jti=RefreshToken(token)['jti']).aexists()
+
+        rows = [
+            ('signature only', await self.time_async(verify, tokens)),
+            ('signature + filter', await self.time_async(verify_and_check, tokens)),
+            ('signature + query', await self.time_async(verify_and_query, tokens)),
+            ('filter, revoked jti', await self.time_async(store.is_revoked, revoked_jtis)),
+        ]
+
+        checks = store.checks
+        false_positives = store.false_positives
+        unrevoked = [uuid.uuid4().hex for _ in range(iterations * 10)]
+        for jti in unrevoked:
+            await store.is_revoked(jti)
+        return rows, build_ms, store, store.false_positives - false_positives, store.checks - checks
+
+    async def refresh_views(self, user, iterations):
+        factory = RequestFactory()
+        new_view = TokenRefreshView.as_view()
+        stock_view = sync_to_async(StockTokenRefreshView.as_view())
+
+        async def measure(view, wrap):
+            token = str(RefreshToken.for_user(user))
+            started = time.perf_counter()
+            for _ in range(iterations):
+                request = factory.post(
+                    '/api/auth/token/refresh/', json.dumps({'refresh': token}), content_type='application/json'
+                )
+                response = await view(request)
+                token = json.loads(wrap(response))['refresh']
+            return (time.perf_counter() - started) / iterations
+
+        def rendered(response):
+            response.render()
+            return response.content
+
+        return [
+            ('simplejwt view (no blacklist)', await measure(stock_view, rendered)),
+            ('async view + revocation', await measure(new_view, lambda response: response.content)),
+        ]
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        with bench_user(BENCH_USERNAME) as user:
+            # Everything added from here on (seeded rows and real rotations) is removed afterwards
+            first_pk = RevokedToken.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            self.seed(options['revoked'])
+            try:
+                tokens = [str(RefreshToken.for_user(user)) for _ in range(iterations)]
+                revoked_jtis = list(
+                    RevokedToken.objects.filter(jti__startswith=JTI_PREFIX).values_list('jti', flat=True)[:iterations]
+                )
+                rows, build_ms, store, false_positives, probes = asyncio.run(
+                    self.run(tokens, iterations, revoked_jtis)
+                )
+                metrics = store.metrics()
+                self.stdout.write(
+                    f"filter: {metrics['entries']:,} entries, {metrics['filter_bytes'] / 1024:.0f} KiB, "
+                    f'built in {build_ms:.0f}ms; {false_positives} false positive(s) in {probes:,} unrevoked probes'
+                )
+                self.stdout.write(f"{'scenario':<32}{'us/call':>10}")
+                for name, seconds in rows:
+                    self.stdout.write(f'{name:<32}{seconds * 1e6:>10.1f}')
+                for name, seconds in asyncio.run(self.refresh_views(user, min(iterations, 500))):
+                    self.stdout.write(f'{name:<32}{seconds * 1e6:>10.1f}')
+            finally:
+                RevokedToken.objects.filter(pk__gt=first_pk).delete()
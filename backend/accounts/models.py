@@ -1,3 +1,12 @@
 from django.db import models
 
-# Create your models here.
+
+class RevokedToken(models.Model):
+    """A refresh token that may no longer be used, kept until it would have expired anyway"""
+
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Token {self.jti} revoked at {self.revoked_at}'
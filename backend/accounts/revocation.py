@@ -0,0 +1,170 @@
+"""
+Revocation store for refresh tokens.
+
+Revoked JTIs live in the RevokedToken table until the token would have
+expired anyway. Each process keeps a Bloom filter of them in memory, so a
+refresh with a token that was never revoked (nearly all of them) is
+answered without a query. Only a filter hit goes to the table, which rules
+out the filter's occasional false positive.
+
+Other processes revoke tokens too, so every ``SYNC_INTERVAL`` seconds the
+filter pulls in rows added since it last looked, using the primary key as
+a cursor. Pruned rows leave their bits set, which only costs extra lookups;
+the filter is rebuilt from the live rows every ``REBUILD_INTERVAL`` seconds
+or once it holds more than its capacity.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import RevokedToken
+
+
+REVOCATION_DEFAULTS = {
+    'CAPACITY': 100000,
+    'ERROR_RATE': 0.001,
+    # A token revoked by another process can still pass the filter here for
+    # up to this long; 0 syncs on every check
+    'SYNC_INTERVAL': 5,
+    'REBUILD_INTERVAL': 3600,
+}
+
+
+def get_revocation_settings():
+    return {**REVOCATION_DEFAULTS, **getattr(settings, 'TOKEN_REVOCATION', {})}
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        # Optimal bit count and number of hashes for the target error rate
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class RevocationStore:
+    def __init__(self, capacity, error_rate, sync_interval, rebuild_interval):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self.filter = None
+        self.last_id = 0
+        self.synced_at = 0.0
+        self.built_at = 0.0
+        self.checks = 0
+        self.db_checks = 0
+        self.false_positives = 0
+
+    def needs_sync(self, now):
+        return self.filter is None or now - self.synced_at >= self.sync_interval
+
+    def rebuild(self, now):
+        """Load every unexpired revocation into a fresh filter; caller holds the lock"""
+        rows = list(
+            RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('pk', 'jti').iterator()
+        )
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for _, jti in rows:
+            bloom.add(jti)
+        # Rows revoked while this ran are picked up by the next sync
+        self.last_id = max((pk for pk, _ in rows), default=self.last_id)
+        self.filter = bloom
+        self.built_at = now
+
+    def sync(self):
+        """Pull in revocations made since the last sync, by this process or any other"""
+        with self._lock:
+            now = time.monotonic()
+            if not self.needs_sync(now):
+                return
+            if (
+                self.filter is None
+                or self.filter.count > self.filter.capacity
+                or now - self.built_at >= self.rebuild_interval
+            ):
+                self.rebuild(now)
+            else:
+                # Primary keys only grow, and SQLite commits one writer at a time,
+                # so every row added since the last sync has a larger id
+                for pk, jti in RevokedToken.objects.filter(pk__gt=self.last_id).values_list('pk', 'jti'):
+                    self.filter.add(jti)
+                    self.last_id = max(self.last_id, pk)
+            self.synced_at = now
+
+    async def is_revoked(self, jti):
+        """Filter first; only a hit costs a query"""
+        if self.needs_sync(time.monotonic()):
+            await sync_to_async(self.sync)()
+        self.checks += 1
+        if jti not in self.filter:
+            return False
+        self.db_checks += 1
+        revoked = await RevokedToken.objects.filter(jti=jti).aexists()
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    async def revoke(self, jti, exp):
+        """
+        Revoke ``jti`` (a token expiring at the ``exp`` timestamp).
+
+        Returns False if it was already revoked. The unique index makes this
+        the tie-breaker when the same token is used twice at once, even
+        across processes whose filters haven't synced yet.
+        """
+        expires_at = datetime.fromtimestamp(exp, tz=dt_timezone.utc)
+        try:
+            await RevokedToken.objects.acreate(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        if self.filter is not None:
+            with self._lock:
+                self.filter.add(jti)
+        return True
+
+    def metrics(self):
+        bloom = self.filter
+        return {
+            'entries': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else self.capacity,
+            'filter_bytes': len(bloom.bits) if bloom else 0,
+            'checks': self.checks,
+            'db_checks': self.db_checks,
+            'false_positives': self.false_positives,
+        }
+
+
+revocation_store = RevocationStore(**{key.lower(): value for key, value in get_revocation_settings().items()})
+
+
+def prune_revoked_tokens(now=None):
+    """Delete revocations for tokens that have expired, returning how many were removed"""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
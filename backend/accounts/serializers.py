@@ -15,10 +15,13 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Passwords don't match")
         return attrs
 
-    def create(self, validated_data):
-        validated_data.pop('password_confirm')
-        user = User.objects.create_user(**validated_data)
-        return user
+    def build_user(self, password_hash):
+        """Unsaved user for the validated data, with a password hashed elsewhere"""
+        return User(
+            username=User.normalize_username(self.validated_data['username']),
+            email=User.objects.normalize_email(self.validated_data.get('email', '')),
+            password=password_hash,
+        )
 
 
 class UserLoginSerializer(serializers.Serializer):
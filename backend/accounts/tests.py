@@ -1,3 +1,237 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
+from uuid import uuid4
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .authentication import AsyncJWTAuthentication, jwt_authentication
+from .hashing import HashingPool, hashing_pool
+from .models import RevokedToken
+from .revocation import RevocationStore, prune_revoked_tokens
+
+
+@override_settings(RATE_LIMITS={'ENABLED': False})
+class TokenRefreshTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('refresher', password='refresher-password')
+
+    def setUp(self):
+        # Cached users outlive the test's rolled back transaction
+        self.addCleanup(jwt_authentication.user_cache.clear)
+
+    def refresh(self, token):
+        return self.client.post(
+            '/api/auth/token/refresh/', json.dumps({'refresh': str(token)}), content_type='application/json'
+        )
+
+    def test_refresh_rotates_and_revokes_the_old_token(self):
+        token = RefreshToken.for_user(self.user)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+
+        data = response.json()
+        rotated = RefreshToken(data['refresh'])
+        self.assertNotEqual(rotated['jti'], token['jti'])
+        self.assertEqual(AccessToken(data['access'])['user_id'], str(self.user.pk))
+        self.assertTrue(RevokedToken.objects.filter(jti=token['jti']).exists())
+
+        # The rotated token works in turn
+        self.assertEqual(self.refresh(rotated).status_code, 200)
+
+    def test_reused_token_is_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'error': 'Token has been revoked'})
+
+    def test_inactive_user_cannot_refresh(self):
+        token = RefreshToken.for_user(self.user)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_malformed_requests(self):
+        self.assertEqual(self.refresh('not-a-token').status_code, 401)
+        response = self.client.post('/api/auth/token/refresh/', '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(RATE_LIMITS={'ENABLED': False})
+class PasswordHashingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('hasher', password='hasher-password')
+
+    def post(self, path, data):
+        return self.client.post(path, json.dumps(data), content_type='application/json')
+
+    def test_register_and_login_hash_on_the_pool(self):
+        pool = HashingPool(workers=1, max_queue=0)
+        self.addCleanup(pool.executor.shutdown)
+        with mock.patch('accounts.hashing.hashing_pool', pool):
+            response = self.post('/api/auth/register/', {
+                'username': 'newcomer', 'email': 'New@EXAMPLE.com',
+                'password': 'newcomer-password', 'password_confirm': 'newcomer-password',
+            })
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(self.post('/api/auth/login/', {
+                'username': 'newcomer', 'password': 'newcomer-password',
+            }).status_code, 200)
+        self.assertEqual(pool.metrics()['completed'], 2)
+        user = User.objects.get(username='newcomer')
+        self.assertEqual(user.email, 'New@example.com')
+        self.assertTrue(user.check_password('newcomer-password'))
+
+    def test_saturated_pool_turns_requests_away(self):
+        saturated = hashing_pool.workers + hashing_pool.max_queue
+        rejected = hashing_pool.rejected
+        with mock.patch.object(hashing_pool, 'in_flight', saturated):
+            for path, data in (
+                ('/api/auth/login/', {'username': 'hasher', 'password': 'hasher-password'}),
+                ('/api/auth/register/', {
+                    'username': 'turned-away', 'password': 'turned-away-pw', 'password_confirm': 'turned-away-pw',
+                }),
+            ):
+                with self.subTest(path=path):
+                    response = self.post(path, data)
+                    self.assertEqual(response.status_code, 503)
+                    self.assertEqual(response['Retry-After'], '1')
+                    self.assertIn('error', response.json())
+        self.assertEqual(hashing_pool.rejected, rejected + 2)
+        self.assertFalse(User.objects.filter(username='turned-away').exists())
+
+
+class RevocationStoreTests(TestCase):
+    def make_store(self, capacity=100, rebuild_interval=3600):
+        # sync_interval=0 so every check sees rows written "by another process"
+        return RevocationStore(capacity, 0.001, sync_interval=0, rebuild_interval=rebuild_interval)
+
+    def revoke_elsewhere(self, expires_in=timedelta(days=1)):
+        return RevokedToken.objects.create(jti=uuid4().hex, expires_at=timezone.now() + expires_in).jti
+
+    def test_sync_picks_up_other_processes_revocations(self):
+        store = self.make_store()
+        is_revoked = async_to_sync(store.is_revoked)
+        self.assertFalse(is_revoked(uuid4().hex))
+        jti = self.revoke_elsewhere()
+        self.assertTrue(is_revoked(jti))
+        self.assertFalse(is_revoked(uuid4().hex))
+
+    def test_revoke_only_succeeds_once(self):
+        store = self.make_store()
+        expires = int((timezone.now() + timedelta(days=1)).timestamp())
+        self.assertTrue(async_to_sync(store.revoke)('twice', expires))
+        self.assertFalse(async_to_sync(store.revoke)('twice', expires))
+
+    def test_filter_is_rebuilt_past_capacity(self):
+        store = self.make_store(capacity=2)
+        self.revoke_elsewhere()
+        store.sync()
+        first = store.filter
+        self.assertEqual((first.count, first.capacity), (1, 2))
+
+        # Incremental syncs add to the same filter until it is over capacity
+        added = [self.revoke_elsewhere() for _ in range(3)]
+        store.sync()
+        self.assertIs(store.filter, first)
+        self.assertEqual(first.count, 4)
+
+        store.sync()
+        self.assertIsNot(store.filter, first)
+        self.assertEqual((store.filter.count, store.filter.capacity), (4, 8))
+        self.assertTrue(all(jti in store.filter for jti in added))
+
+    def test_rebuild_skips_expired_and_pruned_rows(self):
+        store = self.make_store(rebuild_interval=0)
+        kept = self.revoke_elsewhere()
+        self.revoke_elsewhere(expires_in=timedelta(seconds=-1))
+        pruned = RevokedToken.objects.create(jti=uuid4().hex, expires_at=timezone.now() + timedelta(hours=1))
+        store.sync()
+        self.assertEqual(store.filter.count, 2)
+
+        self.assertEqual(prune_revoked_tokens(now=timezone.now() + timedelta(hours=2)), 2)
+        store.sync()
+        self.assertEqual(store.filter.count, 1)
+        self.assertIn(kept, store.filter)
+        self.assertTrue(async_to_sync(store.is_revoked)(kept))
+        self.assertFalse(async_to_sync(store.is_revoked)(pruned.jti))
+
+
+@override_settings(RATE_LIMITS={'ENABLED': False})
+class UserCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cached', password='cached-password', email='cached@example.com')
+
+    def setUp(self):
+        self.addCleanup(jwt_authentication.user_cache.clear)
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def cached(self, user_id=None):
+        return jwt_authentication.user_cache.get(user_id or self.user.pk, allow_stub=True)
+
+    def test_save_and_delete_drop_the_cached_user(self):
+        self.assertEqual(self.client.get('/api/auth/profile/', headers=self.auth).status_code, 200)
+        self.assertIsNotNone(self.cached())
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertIsNone(self.cached())
+
+        self.client.get('/api/auth/profile/', headers=self.auth)
+        self.assertEqual(self.cached()[0].first_name, 'Renamed')
+        self.user.delete()
+        self.assertIsNone(self.cached())
+        self.assertEqual(self.client.get('/api/auth/profile/', headers=self.auth).status_code, 401)
+
+    def test_profile_update_only_writes_submitted_fields(self):
+        self.client.get('/api/auth/profile/', headers=self.auth)
+        # Changed by another process: this one's cached copy doesn't know
+        User.objects.filter(pk=self.user.pk).update(is_staff=True, email='changed@example.com')
+
+        response = self.client.put(
+            '/api/auth/profile/', json.dumps({'first_name': 'Ada'}), content_type='application/json', headers=self.auth
+        )
+        self.assertEqual(response.status_code, 200)
+        stored = User.objects.get(pk=self.user.pk)
+        self.assertEqual(stored.first_name, 'Ada')
+        self.assertTrue(stored.is_staff)
+        self.assertEqual(stored.email, 'changed@example.com')
+        self.assertTrue(stored.check_password('cached-password'))
+
+    @override_settings(JWT_USER_CACHE={'TRUST_CLAIMS': True})
+    def test_trusted_claims_give_a_stub_without_a_query(self):
+        authentication = AsyncJWTAuthentication()
+        token = RefreshToken.for_user(self.user).access_token
+        aget_user = async_to_sync(authentication.aget_user)
+
+        with self.assertNumQueries(0):
+            stub = aget_user(token)
+            self.assertIs(aget_user(token)._state.adding, False)
+        self.assertEqual(stub.pk, self.user.pk)
+        self.assertEqual(stub.username, '')
+
+        # Callers that need the real row still get it, and it replaces the stub
+        with self.assertNumQueries(1):
+            full = aget_user(token, full_user=True)
+        self.assertEqual(full.username, 'cached')
+        with self.assertNumQueries(0):
+            self.assertEqual(aget_user(token).username, 'cached')
+
+    @override_settings(JWT_USER_CACHE={'TRUST_CLAIMS': True})
+    def test_trusted_claims_still_scope_and_check_full_views(self):
+        with mock.patch('accounts.authentication.jwt_authentication', AsyncJWTAuthentication()):
+            response = self.client.get('/api/todos/', headers=self.auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), [])
+
+            self.user.is_active = False
+            self.user.save()
+            # The profile needs the real row, which is inactive
+            self.assertEqual(self.client.get('/api/auth/profile/', headers=self.auth).status_code, 401)
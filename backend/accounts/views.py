@@ -1,16 +1,26 @@
-from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from django.http import JsonResponse
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from asgiref.sync import sync_to_async
 import json
 
+from .authentication import AuthMixin, jwt_authentication
+from .hashing import HashingPoolBusy, authenticate, hash_password, hashing_pool
+from .revocation import revocation_store
 from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserSerializer
 
 
+def busy_response(error):
+    response = JsonResponse({'error': str(error)}, status=503)
+    response['Retry-After'] = '1'
+    return response
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class RegisterView(View):
     async def post(self, request):
@@ -18,19 +28,21 @@ class RegisterView(View):
             # Parse JSON data
             data = json.loads(request.body.decode('utf-8'))
             
-            # Validate data
+            # Validate; the username uniqueness check queries the DB
             serializer = UserRegistrationSerializer(data=data)
             is_valid = await sync_to_async(serializer.is_valid)()
             
             if is_valid:
-                # Create user asynchronously
-                user = await sync_to_async(serializer.save)()
-                
+                # Hash on the bounded pool, then create the user
+                password_hash = await hash_password(serializer.validated_data['password'])
+                user = serializer.build_user(password_hash)
+                await user.asave()
+
                 # Generate tokens
                 refresh = RefreshToken.for_user(user)
                 
                 # Serialize user data
-                user_data = await sync_to_async(lambda: UserSerializer(user).data)()
+                user_data = UserSerializer(user).data
                 
                 return JsonResponse({
                     'message': 'User created successfully',
@@ -39,9 +51,10 @@ class RegisterView(View):
                     'user': user_data
                 }, status=201)
             else:
-                errors = await sync_to_async(lambda: serializer.errors)()
-                return JsonResponse(errors, status=400)
+                return JsonResponse(serializer.errors, status=400)
                 
+        except HashingPoolBusy as e:
+            return busy_response(e)
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
         except Exception as e:
@@ -57,21 +70,21 @@ class LoginView(View):
             
             # Validate data
             serializer = UserLoginSerializer(data=data)
-            is_valid = await sync_to_async(serializer.is_valid)()
+            is_valid = serializer.is_valid()
             
             if is_valid:
                 username = serializer.validated_data['username']
                 password = serializer.validated_data['password']
                 
-                # Authenticate user
-                user = await sync_to_async(authenticate)(username=username, password=password)
+                # Authenticate user; the password check runs on the hashing pool
+                user = await authenticate(username, password)
                 
                 if user:
                     # Generate tokens
                     refresh = RefreshToken.for_user(user)
                     
                     # Serialize user data
-                    user_data = await sync_to_async(lambda: UserSerializer(user).data)()
+                    user_data = UserSerializer(user).data
                     
                     return JsonResponse({
                         'message': 'Login successful',
@@ -84,78 +97,114 @@ class LoginView(View):
                         'error': 'Invalid credentials'
                     }, status=401)
             else:
-                errors = await sync_to_async(lambda: serializer.errors)()
-                return JsonResponse(errors, status=400)
+                return JsonResponse(serializer.errors, status=400)
                 
+        except HashingPoolBusy as e:
+            return busy_response(e)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class TokenRefreshView(View):
+    async def post(self, request):
+        try:
+            # Parse JSON data
+            data = json.loads(request.body.decode('utf-8'))
+            raw_token = data.get('refresh') if isinstance(data, dict) else None
+            if not raw_token:
+                return JsonResponse({'refresh': ['This field is required.']}, status=400)
+
+            # Signature and expiry are checked in-process
+            refresh = RefreshToken(raw_token)
+            jti = refresh[api_settings.JTI_CLAIM]
+
+            # The revocation filter answers without a query unless the jti looks revoked
+            if await revocation_store.is_revoked(jti):
+                return JsonResponse({'error': 'Token has been revoked'}, status=401)
+
+            # Deleted or deactivated users can't refresh; usually served from the user cache
+            await jwt_authentication.aget_user(refresh, full_user=True)
+
+            response_data = {'access': str(refresh.access_token)}
+            if api_settings.ROTATE_REFRESH_TOKENS:
+                # Losing the revoke means the same token was just used elsewhere
+                if api_settings.BLACKLIST_AFTER_ROTATION and not await revocation_store.revoke(jti, refresh['exp']):
+                    return JsonResponse({'error': 'Token has been revoked'}, status=401)
+
+                refresh.set_jti()
+                refresh.set_exp()
+                refresh.set_iat()
+                response_data['refresh'] = str(refresh)
+
+            return JsonResponse(response_data)
+
+        except TokenError as e:
+            return JsonResponse({'error': f'Invalid token: {str(e)}'}, status=401)
+        except AuthenticationFailed:
+            return JsonResponse({'error': 'No active account found for the given token'}, status=401)
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
 
-class ProfileView(View):
+class ProfileView(View, AuthMixin):
     async def get(self, request):
         try:
-            # Check authentication
-            auth_header = request.META.get('HTTP_AUTHORIZATION')
-            if not auth_header or not auth_header.startswith('Bearer '):
-                return JsonResponse({'error': 'Authentication required'}, status=401)
-            
-            token = auth_header.split(' ')[1]
-            
-            # Validate token and get user
-            from rest_framework_simplejwt.authentication import JWTAuthentication
-            jwt_auth = JWTAuthentication()
+            # Authenticate user; the profile needs the full row, not a trusted stub
+            user, error_response = await self.get_authenticated_user(request, full_user=True)
+            if error_response:
+                return error_response
             
-            try:
-                validated_token = await sync_to_async(jwt_auth.get_validated_token)(token)
-                user = await sync_to_async(jwt_auth.get_user)(validated_token)
-                
-                # Serialize user data
-                user_data = await sync_to_async(lambda: UserSerializer(user).data)()
-                return JsonResponse(user_data)
-                
-            except Exception:
-                return JsonResponse({'error': 'Invalid token'}, status=401)
+            # Serialize user data
+            user_data = UserSerializer(user).data
+            return JsonResponse(user_data)
                 
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
     async def put(self, request):
         try:
-            # Check authentication
-            auth_header = request.META.get('HTTP_AUTHORIZATION')
-            if not auth_header or not auth_header.startswith('Bearer '):
-                return JsonResponse({'error': 'Authentication required'}, status=401)
+            # Authenticate user
+            user, error_response = await self.get_authenticated_user(request, full_user=True)
+            if error_response:
+                return error_response
             
-            token = auth_header.split(' ')[1]
-            
-            # Validate token and get user
-            from rest_framework_simplejwt.authentication import JWTAuthentication
-            jwt_auth = JWTAuthentication()
+            # Parse JSON data
+            data = json.loads(request.body.decode('utf-8'))
             
-            try:
-                validated_token = await sync_to_async(jwt_auth.get_validated_token)(token)
-                user = await sync_to_async(jwt_auth.get_user)(validated_token)
-                
-                # Parse JSON data
-                data = json.loads(request.body.decode('utf-8'))
-                
-                # Update user
-                serializer = UserSerializer(user, data=data, partial=True)
-                is_valid = await sync_to_async(serializer.is_valid)()
-                if is_valid:
-                    updated_user = await sync_to_async(serializer.save)()
-                    user_data = await sync_to_async(lambda: UserSerializer(updated_user).data)()
-                    return JsonResponse(user_data)
-                else:
-                    errors = await sync_to_async(lambda: serializer.errors)()
-                    return JsonResponse(errors, status=400)
-                    
-            except Exception:
-                return JsonResponse({'error': 'Invalid token'}, status=401)
+            # Update user; the username uniqueness validator queries the DB
+            serializer = UserSerializer(user, data=data, partial=True)
+            is_valid = await sync_to_async(serializer.is_valid)()
+            if is_valid:
+                for attr, value in serializer.validated_data.items():
+                    setattr(user, attr, value)
+                # The user may be a cached copy; writing every column could revert
+                # a password or is_active changed since by another process
+                await user.asave(update_fields=list(serializer.validated_data))
+                return JsonResponse(UserSerializer(user).data)
+            else:
+                return JsonResponse(serializer.errors, status=400)
                 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
+
+
+class HashingMetricsView(View, AuthMixin):
+    async def get(self, request):
+        try:
+            # Authenticate user; staff only, so check the real row
+            user, error_response = await self.get_authenticated_user(request, full_user=True)
+            if error_response:
+                return error_response
+            if not user.is_staff:
+                return JsonResponse({'error': 'Staff only'}, status=403)
+
+            return JsonResponse(hashing_pool.metrics())
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
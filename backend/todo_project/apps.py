@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class TodoProjectConfig(AppConfig):
+    name = "todo_project"
+
+    def ready(self):
+        from . import signals  # noqa: F401
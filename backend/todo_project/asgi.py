@@ -5,12 +5,70 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Requests under /api/ go to a handler built from settings.API_MIDDLEWARE
+instead of MIDDLEWARE. The API views authenticate with JWTs and are
+csrf_exempt, so sessions, CSRF, auth and messages would be dead weight,
+and each of those MiddlewareMixin classes costs thread hops under ASGI.
+The Host header is still checked against ALLOWED_HOSTS before the chain
+runs. Everything else, /admin/ included, keeps the full stack.
 """
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "todo_project.settings")
 
-application = get_asgi_application()
+API_PREFIX = "/api/"
+
+
+class APIHandler(ASGIHandler):
+    """ASGIHandler whose chain is settings.API_MIDDLEWARE, all async with no adapters"""
+
+    def load_middleware(self, is_async=True):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response_async)
+        for middleware_path in reversed(settings.API_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            if not getattr(middleware, "async_capable", False):
+                raise ImproperlyConfigured(
+                    f"{middleware_path} is not async-capable, so it can't be in API_MIDDLEWARE"
+                )
+            try:
+                instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(instance, "process_view") or hasattr(instance, "process_exception"):
+                raise ImproperlyConfigured(
+                    f"{middleware_path} uses process_view/process_exception, which API_MIDDLEWARE doesn't support"
+                )
+            handler = convert_exception_to_response(instance)
+
+        async def check_host(request):
+            # CommonMiddleware does this in the full stack. DisallowedHost
+            # becomes a 400 in convert_exception_to_response, as it would there.
+            request.get_host()
+            return await handler(request)
+
+        self._middleware_chain = convert_exception_to_response(check_host)
+
+
+django_application = get_asgi_application()
+api_application = APIHandler()
+
+
+async def application(scope, receive, send):
+    path = scope.get("path", "")[len(scope.get("root_path", "")):]
+    if scope["type"] == "http" and path.startswith(API_PREFIX):
+        await api_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,140 @@
+"""
+Shared pieces of the bench_* management commands.
+
+Each benchmark runs against the configured database with a throwaway user,
+drives the ASGI application in-process where it measures requests, and
+prints latencies as mean/p50/p99 columns.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from todos.models import Todo
+
+
+SEED_BATCH_SIZE = 5000
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def latency_columns(values, scale=1e6, precision=0):
+    """Mean, p50 and p99 of ``values`` in seconds as 10-wide columns; scale 1e6 is us, 1e3 ms"""
+    return ''.join(
+        f'{value * scale:>10.{precision}f}'
+        for value in (sum(values) / len(values), percentile(values, 0.5), percentile(values, 0.99))
+    )
+
+
+def best_of(func, repeat, *args):
+    """Fastest of ``repeat`` timed calls of ``func(*args)``, in seconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@contextmanager
+def bench_user(username, **extra):
+    """A fresh user for one benchmark run, deleted with everything it owns afterwards"""
+    User.objects.filter(username=username).delete()
+    user = User.objects.create_user(username, **extra)
+    try:
+        yield user
+    finally:
+        user.delete()
+
+
+def seed_todos(user, count, build=None):
+    """
+    Bulk create ``count`` todos for ``user`` and return their pks.
+
+    ``build(index)`` returns the fields of each todo; by default they only
+    get a numbered title.
+    """
+    build = build or (lambda index: {'title': f'Benchmark todo {index}'})
+    batch = []
+    with transaction.atomic():
+        for index in range(count):
+            batch.append(Todo(user=user, **build(index)))
+            if len(batch) == SEED_BATCH_SIZE:
+                Todo.objects.bulk_create(batch)
+                batch = []
+        Todo.objects.bulk_create(batch)
+    return list(Todo.objects.filter(user=user).order_by('pk').values_list('pk', flat=True))
+
+
+def bearer(user):
+    """Request headers carrying a fresh access token for ``user``"""
+    return [('Authorization', f'Bearer {RefreshToken.for_user(user).access_token}')]
+
+
+async def request_asgi(app, method, path, headers=(), body=b''):
+    """Run one HTTP request through an ASGI app in-process and return (status, body)"""
+    path, _, query_string = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode('ascii'),
+        'query_string': query_string.encode('ascii'),
+        'root_path': '',
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    request_sent = False
+    status = None
+    chunks = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # Never disconnect; Django cancels this once the response is sent
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return status, b''.join(chunks)
+
+
+async def call_asgi(app, method, path, headers=(), body=b''):
+    """Run one HTTP request through an ASGI app in-process and return the status code"""
+    status, _ = await request_asgi(app, method, path, headers, body)
+    return status
+
+
+async def interleave(variants, requests):
+    """
+    Time ``requests`` rounds of each coroutine function in ``variants``.
+
+    The variants take turns request by request so drift affects each alike.
+    Returns {name: [seconds, ...]}.
+    """
+    latencies = {name: [] for name in variants}
+    for _ in range(requests):
+        for name, send in variants.items():
+            started = time.perf_counter()
+            await send()
+            latencies[name].append(time.perf_counter() - started)
+    return latencies
@@ -0,0 +1,284 @@
+"""
+Negotiated response compression.
+
+The middleware picks the best encoding the client accepts, by q-value and
+then by the order of settings.COMPRESSION['ENCODINGS']. gzip and deflate
+are always available. br and zstd are offered when the brotli or
+zstandard package is installed.
+
+Bodies smaller than MIN_SIZE are sent as they are. Streaming responses are
+compressed chunk by chunk and flushed after each chunk, so they keep
+streaming. Event streams and responses that are already encoded are left
+alone.
+
+Responses with an ETag (todo lists and details) don't change until their
+ETag does, so their compressed bodies are kept in a small LRU cache keyed
+by (ETag, encoding). Those ETags come from version counters and
+timestamps rather than the body, and a counter can start over: a TodoStats
+row that is deleted and rebuilt begins again at version 0. Each entry
+therefore also stores a digest of the uncompressed body, and a hit only
+counts if the digest matches. Hashing costs a fraction of compressing.
+"""
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_DEFAULTS = {
+    'ENABLED': True,
+    # Server preference, used to break ties between equal q-values
+    'ENCODINGS': ['zstd', 'br', 'gzip', 'deflate'],
+    # Smaller bodies aren't worth the CPU or the extra headers
+    'MIN_SIZE': 1024,
+    'LEVELS': {'gzip': 6, 'deflate': 6, 'br': 4, 'zstd': 3},
+    # Total compressed bytes kept for ETagged responses; 0 disables the cache
+    'CACHE_MAX_BYTES': 8 * 1024 * 1024,
+    'CONTENT_TYPES': ['application/json', 'text/'],
+}
+
+# Must reach the client as it is produced
+EXCLUDED_CONTENT_TYPES = ('text/event-stream',)
+
+
+def get_compression_settings():
+    return {**COMPRESSION_DEFAULTS, **getattr(settings, 'COMPRESSION', {})}
+
+
+class ZlibStream:
+    def __init__(self, level, wbits):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def chunk(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def chunk(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def chunk(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+def get_codecs(levels):
+    """Map each available encoding to (compress(body), new_stream())"""
+    codecs = {
+        # mtime=0 keeps output identical for identical input
+        'gzip': (
+            lambda data: gzip.compress(data, levels['gzip'], mtime=0),
+            lambda: ZlibStream(levels['gzip'], 16 + zlib.MAX_WBITS),
+        ),
+        # HTTP "deflate" is the zlib format, not raw deflate
+        'deflate': (
+            lambda data: zlib.compress(data, levels['deflate']),
+            lambda: ZlibStream(levels['deflate'], zlib.MAX_WBITS),
+        ),
+    }
+    if brotli is not None:
+        codecs['br'] = (
+            lambda data: brotli.compress(data, quality=levels['br']),
+            lambda: BrotliStream(levels['br']),
+        )
+    if zstandard is not None:
+        codecs['zstd'] = (
+            lambda data: zstandard.ZstdCompressor(level=levels['zstd']).compress(data),
+            lambda: ZstdStream(levels['zstd']),
+        )
+    return codecs
+
+
+def parse_accept_encoding(header):
+    """'gzip;q=0.8, br' -> {'gzip': 0.8, 'br': 1.0}"""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate(header, preference):
+    """Return the best encoding in ``preference`` the client accepts, or None"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for coding in preference:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, digest):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != digest:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, digest, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[key] = (digest, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def metrics(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.size}
+
+
+compression_cache = CompressionCache(get_compression_settings()['CACHE_MAX_BYTES'])
+
+
+def compress_stream(content, stream):
+    for chunk in content:
+        if chunk:
+            yield stream.chunk(chunk)
+    yield stream.finish()
+
+
+async def acompress_stream(content, stream):
+    async for chunk in content:
+        if chunk:
+            yield stream.chunk(chunk)
+    yield stream.finish()
+
+
+@sync_and_async_middleware
+def compression_middleware(get_response):
+    config = get_compression_settings()
+    if not config['ENABLED']:
+        raise MiddlewareNotUsed
+    codecs = get_codecs({**COMPRESSION_DEFAULTS['LEVELS'], **config['LEVELS']})
+    preference = [coding for coding in config['ENCODINGS'] if coding in codecs]
+    content_types = tuple(config['CONTENT_TYPES'])
+    min_size = config['MIN_SIZE']
+    use_cache = config['CACHE_MAX_BYTES'] > 0
+
+    def compress_body(response, coding):
+        content = response.content
+        etag = response.get('ETag')
+        if not use_cache or etag is None:
+            return codecs[coding][0](content)
+        key = (etag, coding)
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        body = compression_cache.get(key, digest)
+        if body is None:
+            body = codecs[coding][0](content)
+            compression_cache.put(key, digest, body)
+        return body
+
+    def weaken_etag(response):
+        # The encoded bytes differ from what the ETag was computed for
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+
+    def finish(request, response):
+        # Varies on Accept-Encoding whether or not this one gets compressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), preference)
+        if coding is None:
+            return response
+        if response.status_code == 304:
+            # Match the ETag the compressed 200 carried
+            weaken_etag(response)
+            return response
+        content_type = response.get('Content-Type', '')
+        if (
+            response.has_header('Content-Encoding')
+            or not content_type.startswith(content_types)
+            or content_type.startswith(EXCLUDED_CONTENT_TYPES)
+            or (not response.streaming and len(response.content) < min_size)
+        ):
+            return response
+
+        if response.streaming:
+            stream = codecs[coding][1]()
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, stream)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, stream)
+            del response.headers['Content-Length']
+        else:
+            body = compress_body(response, coding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response.headers['Content-Length'] = str(len(body))
+
+        weaken_etag(response)
+        response.headers['Content-Encoding'] = coding
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return finish(request, await get_response(request))
+    else:
+        def middleware(request):
+            return finish(request, get_response(request))
+    return middleware
@@ -0,0 +1,42 @@
+"""
+Async response headers for the /api/ middleware chain.
+
+Django's SecurityMiddleware, XFrameOptionsMiddleware and CommonMiddleware
+are MiddlewareMixin classes, which under ASGI run their hooks through
+sync_to_async: a thread hop per hook for work that is pure header
+bookkeeping. This calls the same hooks inline instead, so the SECURE_* and
+X_FRAME_OPTIONS settings still apply, and sets Content-Length the way
+CommonMiddleware does.
+"""
+from asgiref.sync import iscoroutinefunction
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.security import SecurityMiddleware
+from django.utils.decorators import sync_and_async_middleware
+
+
+@sync_and_async_middleware
+def response_headers_middleware(get_response):
+    security = SecurityMiddleware(get_response)
+    frame_options = XFrameOptionsMiddleware(get_response)
+
+    def finish(request, response):
+        response = security.process_response(request, response)
+        response = frame_options.process_response(request, response)
+        if not response.streaming and not response.has_header('Content-Length'):
+            response.headers['Content-Length'] = str(len(response.content))
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            # Only returns a response for the HTTPS redirect
+            response = security.process_request(request)
+            if response is None:
+                response = await get_response(request)
+            return finish(request, response)
+    else:
+        def middleware(request):
+            response = security.process_request(request)
+            if response is None:
+                response = get_response(request)
+            return finish(request, response)
+    return middleware
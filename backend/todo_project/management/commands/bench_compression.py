@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+
+from todo_project.benchmarks import bearer, bench_user, interleave, latency_columns, request_asgi, seed_todos
+from todo_project.compression import COMPRESSION_DEFAULTS, CompressionCache, get_codecs
+
+
+BENCH_USERNAME = 'compression-benchmark-user'
+
+
+class Command(BaseCommand):
+    help = "Measure bytes saved against CPU spent by response compression and its ETag cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', type=int, default=2000, help='Todos seeded; the largest payload is the full list')
+        parser.add_argument('--repeat', type=int, default=50, help='Compressions timed per codec and size')
+        parser.add_argument('--requests', type=int, default=300, help='Sequential requests per Accept-Encoding')
+
+    def time_call(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (time.perf_counter() - started) / repeat, result
+
+    def compare_codecs(self, payload, repeat):
+        codecs = get_codecs(COMPRESSION_DEFAULTS['LEVELS'])
+        cache = CompressionCache(COMPRESSION_DEFAULTS['CACHE_MAX_BYTES'])
+        for coding, (compress, _) in codecs.items():
+            seconds, body = self.time_call(lambda: compress(payload), repeat)
+            digest = hashlib.blake2b(payload, digest_size=16).digest()
+            cache.put(('"etag"', coding), digest, body)
+            hit, _ = self.time_call(
+                lambda: cache.get(('"etag"', coding), hashlib.blake2b(payload, digest_size=16).digest()), repeat
+            )
+            self.stdout.write(
+                f'{len(payload):>10,}{coding:>9}{len(body):>10,}{len(payload) / len(body):>8.1f}x'
+                f'{seconds * 1e6:>12.0f}{hit * 1e6:>12.0f}{len(payload) / seconds / 1e6:>10.0f}'
+            )
+
+    @override_settings(RATE_LIMITS={'ENABLED': False})
+    def handle(self, *args, **options):
+        from todo_project.asgi import application
+
+        with bench_user(BENCH_USERNAME) as user:
+            seed_todos(user, options['todos'], lambda index: {
+                'title': f'Benchmark todo {index}',
+                'description': f'Details for todo number {index}',
+                'priority': ('low', 'medium', 'high')[index % 3],
+                'completed': index % 4 == 0,
+            })
+            auth = bearer(user)
+            connections.close_all()
+
+            self.stdout.write(
+                f"{'raw bytes':>10}{'coding':>9}{'bytes':>10}{'ratio':>9}{'cold us':>12}{'cached us':>12}{'MB/s':>10}"
+            )
+            paths = ['/api/todos/?limit=20', '/api/todos/?limit=200', '/api/todos/']
+            for path in paths:
+                _, payload = asyncio.run(request_asgi(application, 'GET', path, auth))
+                self.compare_codecs(payload, options['repeat'])
+
+            path = paths[-1]
+            sizes = {}
+
+            def fetch(name, headers):
+                async def send():
+                    _, body = await request_asgi(application, 'GET', path, headers)
+                    sizes[name] = len(body)
+                return send
+
+            results = asyncio.run(interleave({
+                'identity': fetch('identity', auth),
+                'gzip': fetch('gzip', auth + [('Accept-Encoding', 'gzip')]),
+            }, options['requests']))
+            self.stdout.write(f'\nGET {path}, ETag cache warm after the first request')
+            self.stdout.write(f"{'encoding':<10}{'bytes':>10}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+            for name, latencies in results.items():
+                self.stdout.write(f'{name:<10}{sizes[name]:>10,}{latency_columns(latencies)}')
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from todo_project.benchmarks import bearer, bench_user, call_asgi, interleave, latency_columns, seed_todos
+from todo_project.metrics import RequestStats, current_stats, install_query_timer, registry
+
+
+BENCH_USERNAME = 'metrics-benchmark-user'
+
+
+class Command(BaseCommand):
+    help = "Measure what the metrics middleware and query timer add to each request"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Sequential requests per mode')
+        parser.add_argument('--queries', type=int, default=20000, help='Queries for the query timer measurement')
+
+    def time_queries(self, count):
+        with connection.cursor() as cursor:
+            started = time.perf_counter()
+            for _ in range(count):
+                cursor.execute('SELECT 1')
+            return (time.perf_counter() - started) / count
+
+    @override_settings(RATE_LIMITS={'ENABLED': False})
+    def handle(self, *args, **options):
+        with bench_user(BENCH_USERNAME) as user:
+            [pk] = seed_todos(user, 1)
+            headers = bearer(user)
+            path = f'/api/todos/{pk}/'
+            connections.close_all()
+
+            self.stdout.write(f"{options['requests']} sequential GET {path}")
+            self.stdout.write(f"{'mode':<10}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+            variants = {}
+            for mode, enabled in (('off', False), ('on', True)):
+                with override_settings(METRICS={'ENABLED': enabled}):
+                    app = ASGIHandler()
+                variants[mode] = lambda app=app: call_asgi(app, 'GET', path, headers)
+            for mode, latencies in asyncio.run(interleave(variants, options['requests'])).items():
+                self.stdout.write(f'{mode:<10}{latency_columns(latencies)}')
+
+            connection.ensure_connection()
+            plain = self.time_queries(options['queries'])
+            install_query_timer(None, connection)
+            token = current_stats.set(RequestStats())
+            try:
+                timed = self.time_queries(options['queries'])
+            finally:
+                current_stats.reset(token)
+            self.stdout.write(f'SELECT 1: {plain * 1e6:.2f}us plain, {timed * 1e6:.2f}us timed')
+
+            started = time.perf_counter()
+            size = len(registry.render())
+            self.stdout.write(f'/metrics render: {size:,} bytes in {(time.perf_counter() - started) * 1000:.2f}ms')
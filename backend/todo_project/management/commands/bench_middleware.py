@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+
+from todo_project.benchmarks import bearer, bench_user, call_asgi, interleave, latency_columns, seed_todos
+
+
+BENCH_USERNAME = 'middleware-benchmark-user'
+
+
+class Command(BaseCommand):
+    help = "Compare /api/ latency through the full MIDDLEWARE stack and the API_MIDDLEWARE fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Sequential requests per scenario and stack')
+        parser.add_argument('--clients', type=int, default=50, help='Concurrent clients for the throughput run')
+
+    async def concurrent(self, app, path, headers, clients, requests):
+        async def client():
+            for _ in range(requests):
+                await call_asgi(app, 'GET', path, headers)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(clients)])
+        return clients * requests / (time.perf_counter() - started)
+
+    # Measure the stacks, not the limiter's 429s
+    @override_settings(RATE_LIMITS={'ENABLED': False})
+    def handle(self, *args, **options):
+        from todo_project.asgi import application, django_application
+
+        apps = {'full': django_application, 'api': application}
+        with bench_user(BENCH_USERNAME) as user:
+            [pk] = seed_todos(user, 1)
+            headers = bearer(user)
+            connections.close_all()
+
+            scenarios = [
+                ('401, no auth header', '/api/todos/', []),
+                ('GET detail', f'/api/todos/{pk}/', headers),
+            ]
+            self.stdout.write(f"{'scenario':<22}{'stack':<7}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+            for name, path, scenario_headers in scenarios:
+                results = asyncio.run(interleave({
+                    stack: lambda app=app: call_asgi(app, 'GET', path, scenario_headers)
+                    for stack, app in apps.items()
+                }, options['requests']))
+                means = {}
+                for stack, latencies in results.items():
+                    means[stack] = sum(latencies) / len(latencies)
+                    self.stdout.write(f'{name:<22}{stack:<7}{latency_columns(latencies)}')
+                self.stdout.write(self.style.SUCCESS(
+                    f"{'':<22}saved {(means['full'] - means['api']) * 1e6:.0f}us per request "
+                    f"({1 - means['api'] / means['full']:.0%})"
+                ))
+
+            per_client = max(options['requests'] // options['clients'], 1)
+            for stack, app in apps.items():
+                throughput = asyncio.run(
+                    self.concurrent(app, f'/api/todos/{pk}/', headers, options['clients'], per_client)
+                )
+                self.stdout.write(f"{options['clients']} clients, {stack}: {throughput:.0f} req/s")
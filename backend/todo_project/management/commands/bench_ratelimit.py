@@ -0,0 +1,89 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from todo_project.ratelimit import RateLimiter
+
+
+# Generous enough that nothing is rejected, so every call takes the full path
+RULES = [
+    {'name': 'login', 'path': '/api/auth/login/', 'rate': '1000000/s'},
+    {'name': 'api', 'path': '/api/', 'rate': '1000000/s'},
+]
+
+
+class StubUser:
+    def __init__(self, pk):
+        self.pk = self.id = pk
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request cost of the rate limiting middleware's check"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200000, help='Checks per scenario')
+        parser.add_argument('--threads', type=int, default=8, help='Threads for the contention scenario')
+
+    def measure(self, limiter, requests, iterations):
+        count = len(requests)
+        started = time.perf_counter()
+        for i in range(iterations):
+            limiter.check(requests[i % count])
+        return (time.perf_counter() - started) / iterations
+
+    def measure_threads(self, limiter, requests, iterations, threads):
+        per_thread = iterations // threads
+        barrier = threading.Barrier(threads + 1)
+
+        def work(offset):
+            barrier.wait()
+            for i in range(per_thread):
+                limiter.check(requests[(offset + i) % len(requests)])
+
+        workers = [threading.Thread(target=work, args=(n * 997,)) for n in range(threads)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        return (time.perf_counter() - started) / (per_thread * threads)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        factory = RequestFactory()
+        tokens = [str(AccessToken.for_user(StubUser(n))) for n in range(1000)]
+
+        anonymous = [factory.get('/api/todos/', REMOTE_ADDR=f'10.0.{n // 256}.{n % 256}') for n in range(1000)]
+        authenticated = [factory.get('/api/todos/', HTTP_AUTHORIZATION=f'Bearer {token}') for token in tokens]
+        many_clients = [factory.get('/api/todos/', REMOTE_ADDR=f'10.{n // 65536}.{n // 256 % 256}.{n % 256}') for n in range(100000)]
+        unmatched = [factory.get('/admin/')]
+
+        scenarios = [
+            ('unmatched path', lambda: self.measure(RateLimiter(RULES), unmatched, iterations)),
+            ('IP, 1k clients', lambda: self.measure(RateLimiter(RULES), anonymous, iterations)),
+            ('JWT, 1k users (cached)', lambda: self.measure(RateLimiter(RULES), authenticated, iterations)),
+            ('JWT, token cache off', lambda: self.measure(
+                RateLimiter(RULES, token_cache_size=0), authenticated, min(iterations, 5000))),
+            ('IP, 100k clients', lambda: self.measure(RateLimiter(RULES), many_clients, iterations)),
+            (f"IP, {options['threads']} threads", lambda: self.measure_threads(
+                RateLimiter(RULES), anonymous, iterations, options['threads'])),
+        ]
+
+        self.stdout.write(f"{'scenario':<26}{'us/request':>12}")
+        for name, run in scenarios:
+            self.stdout.write(f'{name:<26}{run() * 1e6:>12.2f}')
+
+        limiter = RateLimiter(RULES)
+        self.measure(limiter, many_clients, len(many_clients))
+        before = len(limiter)
+        time.sleep(0.01)
+        started = time.perf_counter()
+        for shard in limiter.shards:
+            limiter.sweep(shard, time.monotonic())
+        self.stdout.write(
+            f'sweep: {before:,} idle buckets -> {len(limiter):,} in {(time.perf_counter() - started) * 1000:.1f}ms'
+        )
@@ -0,0 +1,286 @@
+"""
+Request metrics in Prometheus text format.
+
+The middleware times every request and files it under its URL route
+pattern (``api/todos/<int:pk>/``) and its method, with any method outside
+the standard ones filed as ``other``, so label cardinality stays bounded.
+The stats for the current request live in a context variable. asgiref
+copies the context into sync_to_async threads, so a database execute
+wrapper on each connection can charge query counts and time to the
+request that ran them. Work handed to our own executors (the todo writer
+and the password hashing pool) reports its queue wait through
+``record_wait``.
+
+Totals are served at /metrics. Each response also gets a Server-Timing
+header with its own breakdown, which browser dev tools display.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+from django.views import View
+
+
+METRICS_DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    # Addresses allowed to scrape /metrics; None allows everyone
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+    'LATENCY_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'WAIT_BUCKETS': (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+}
+
+UNMATCHED_ROUTE = '<unmatched>'
+# Clients choose the method, so only these get a label value of their own
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+
+
+def get_metrics_settings():
+    return {**METRICS_DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class RequestStats:
+    __slots__ = ('db_queries', 'db_seconds', 'wait_seconds')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.wait_seconds = 0.0
+
+
+current_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+class Registry:
+    def __init__(self, latency_buckets, wait_buckets):
+        self.latency_buckets = tuple(latency_buckets)
+        self.wait_buckets = tuple(wait_buckets)
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.responses = {}
+        self.db_queries = {}
+        self.db_seconds = {}
+        self.waits = {}
+
+    def observe_request(self, method, route, status, seconds, stats):
+        if method not in HTTP_METHODS:
+            method = 'other'
+        key = (method, route)
+        with self._lock:
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(self.latency_buckets)
+            histogram.observe(seconds)
+            status_key = (method, route, status)
+            self.responses[status_key] = self.responses.get(status_key, 0) + 1
+            self.db_queries[key] = self.db_queries.get(key, 0) + stats.db_queries
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + stats.db_seconds
+
+    def observe_wait(self, executor, seconds):
+        with self._lock:
+            histogram = self.waits.get(executor)
+            if histogram is None:
+                histogram = self.waits[executor] = Histogram(self.wait_buckets)
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            for series in (self.latency, self.responses, self.db_queries, self.db_seconds, self.waits):
+                series.clear()
+
+    def render_histogram(self, lines, name, series, label_names):
+        for key, histogram in sorted(series.items()):
+            labels = list(zip(label_names, key if isinstance(key, tuple) else (key,)))
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{format_labels(labels + [("le", bound)])}}} {cumulative}')
+            lines.append(f'{name}_sum{{{format_labels(labels)}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{format_labels(labels)}}} {histogram.count}')
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP http_request_duration_seconds Time to produce a response, by route.',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            self.render_histogram(lines, 'http_request_duration_seconds', self.latency, ('method', 'route'))
+            lines += [
+                '# HELP http_responses_total Responses by route and status code.',
+                '# TYPE http_responses_total counter',
+            ]
+            for (method, route, status), count in sorted(self.responses.items()):
+                lines.append(
+                    f'http_responses_total{{{format_labels([("method", method), ("route", route), ("status", status)])}}} {count}'
+                )
+            lines += [
+                '# HELP db_queries_total Database queries run while serving requests, by route.',
+                '# TYPE db_queries_total counter',
+            ]
+            for (method, route), count in sorted(self.db_queries.items()):
+                lines.append(f'db_queries_total{{{format_labels([("method", method), ("route", route)])}}} {count}')
+            lines += [
+                '# HELP db_query_duration_seconds_total Time spent in database queries, by route.',
+                '# TYPE db_query_duration_seconds_total counter',
+            ]
+            for (method, route), seconds in sorted(self.db_seconds.items()):
+                lines.append(
+                    f'db_query_duration_seconds_total{{{format_labels([("method", method), ("route", route)])}}} {seconds}'
+                )
+            lines += [
+                '# HELP executor_wait_seconds Time work waited for a worker thread, by executor.',
+                '# TYPE executor_wait_seconds histogram',
+            ]
+            self.render_histogram(lines, 'executor_wait_seconds', self.waits, ('executor',))
+        lines += render_component_metrics()
+        return '\n'.join(lines) + '\n'
+
+
+def render_component_metrics():
+    """Point-in-time numbers from the writer queue, hashing pool, revocation store and compression cache"""
+    from accounts.hashing import hashing_pool
+    from accounts.revocation import revocation_store
+    from todo_project.compression import compression_cache
+    from todos.writer import coordinators
+
+    hashing = hashing_pool.metrics()
+    revocation = revocation_store.metrics()
+    compression = compression_cache.metrics()
+    values = [
+        ('password_hash_in_flight', 'gauge', 'Password hash jobs running or queued.',
+         hashing['running'] + hashing['queued']),
+        ('password_hash_saturation', 'gauge', 'Fraction of the hashing pool and queue in use.', hashing['saturation']),
+        ('password_hash_rejected_total', 'counter', 'Hash jobs turned away with a 503.', hashing['rejected']),
+        ('token_revocation_checks_total', 'counter', 'Refresh tokens checked against the revocation filter.',
+         revocation['checks']),
+        ('token_revocation_db_checks_total', 'counter', 'Revocation checks that hit the filter and queried the table.',
+         revocation['db_checks']),
+        ('token_revocation_false_positives_total', 'counter', 'Filter hits the table did not confirm.',
+         revocation['false_positives']),
+        ('compression_cache_hits_total', 'counter', 'Responses served from the compressed body cache.',
+         compression['hits']),
+        ('compression_cache_misses_total', 'counter', 'ETagged responses that had to be compressed.',
+         compression['misses']),
+        ('compression_cache_bytes', 'gauge', 'Compressed bytes held by the cache.', compression['bytes']),
+    ]
+    lines = []
+    for name, kind, help_text, value in values:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {value}']
+    lines += [
+        '# HELP todo_writer_jobs_total Writes run by the single-writer queue, by database.',
+        '# TYPE todo_writer_jobs_total counter',
+    ]
+    lines += [f'todo_writer_jobs_total{{alias="{alias}"}} {c.jobs_run}' for alias, c in sorted(coordinators.items())]
+    lines += [
+        '# HELP todo_writer_transactions_total Transactions committed by the writer queue, by database.',
+        '# TYPE todo_writer_transactions_total counter',
+    ]
+    lines += [f'todo_writer_transactions_total{{alias="{alias}"}} {c.groups}' for alias, c in sorted(coordinators.items())]
+    return lines
+
+
+registry = Registry(get_metrics_settings()['LATENCY_BUCKETS'], get_metrics_settings()['WAIT_BUCKETS'])
+
+
+def record_wait(executor, seconds):
+    """Record time a job spent queued for ``executor`` and charge it to the current request"""
+    registry.observe_wait(executor, seconds)
+    stats = current_stats.get()
+    if stats is not None:
+        stats.wait_seconds += seconds
+
+
+def time_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # The wrapper object outlives reconnects, so only add the timer once
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def server_timing(total, stats):
+    parts = [f'total;dur={total * 1000:.1f}', f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_queries} queries"']
+    if stats.wait_seconds:
+        parts.append(f'wait;dur={stats.wait_seconds * 1000:.1f}')
+    return ', '.join(parts)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    config = get_metrics_settings()
+    if not config['ENABLED']:
+        raise MiddlewareNotUsed
+    connection_created.connect(install_query_timer, dispatch_uid='todo_project.metrics.install_query_timer')
+    add_header = config['SERVER_TIMING']
+
+    def start():
+        stats = RequestStats()
+        return stats, current_stats.set(stats), time.perf_counter()
+
+    def finish(request, response, stats, token, started):
+        # Streaming responses are timed up to their first byte
+        elapsed = time.perf_counter() - started
+        current_stats.reset(token)
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else UNMATCHED_ROUTE
+        registry.observe_request(request.method, route, str(response.status_code), elapsed, stats)
+        if add_header:
+            response['Server-Timing'] = server_timing(elapsed, stats)
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats, token, started = start()
+            response = await get_response(request)
+            return finish(request, response, stats, token, started)
+    else:
+        def middleware(request):
+            stats, token, started = start()
+            response = get_response(request)
+            return finish(request, response, stats, token, started)
+    return middleware
+
+
+class MetricsView(View):
+    async def get(self, request):
+        allowed = get_metrics_settings()['ALLOWED_IPS']
+        if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+            return JsonResponse({'error': 'Forbidden'}, status=403)
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,195 @@
+"""
+Token-bucket rate limiting for the API.
+
+Each request is matched against settings.RATE_LIMITS['RULES'] by path
+prefix (first match wins) and charged one token from the bucket for
+(rule, client). The client is the user id from a valid JWT, or else the
+client IP. Buckets live in a fixed number of shards, each behind its own
+lock, so threads only contend when they hash to the same shard. A bucket
+that has been idle long enough to refill completely is the same as a
+missing one, so sweeps drop those.
+"""
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+RATE_LIMIT_DEFAULTS = {
+    'ENABLED': True,
+    'RULES': [],
+    'SHARDS': 16,
+    'SWEEP_INTERVAL': 60,
+    # META key holding the real client address behind a trusted proxy,
+    # e.g. 'HTTP_X_FORWARDED_FOR'; the first address in it is used
+    'CLIENT_IP_HEADER': None,
+    'TOKEN_CACHE_SIZE': 10000,
+}
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600}
+
+
+def get_rate_limit_settings():
+    return {**RATE_LIMIT_DEFAULTS, **getattr(settings, 'RATE_LIMITS', {})}
+
+
+def parse_rate(rate):
+    """'10/min' -> tokens per second"""
+    try:
+        count, period = rate.split('/')
+        return int(count) / PERIODS[period.strip()]
+    except (ValueError, KeyError):
+        raise ImproperlyConfigured(f"Invalid rate {rate!r}; use e.g. '10/s', '30/min' or '1000/hour'")
+
+
+class Rule:
+    def __init__(self, name, path, rate, burst=None, methods=None):
+        self.name = name
+        self.path = path
+        self.rate = parse_rate(rate)
+        # By default a client can spend a full period's allowance at once
+        self.burst = burst if burst is not None else max(1, int(rate.split('/')[0]))
+        self.methods = {method.upper() for method in methods} if methods else None
+
+    def matches(self, request):
+        return request.path.startswith(self.path) and (self.methods is None or request.method in self.methods)
+
+
+class Shard:
+    __slots__ = ('lock', 'buckets', 'swept_at')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> [tokens, updated_at, full_at]
+        self.buckets = {}
+        self.swept_at = time.monotonic()
+
+
+class RateLimiter:
+    def __init__(self, rules, shards=16, sweep_interval=60, client_ip_header=None, token_cache_size=10000):
+        self.rules = [Rule(**rule) for rule in rules]
+        self.shards = [Shard() for _ in range(shards)]
+        self.sweep_interval = sweep_interval
+        self.client_ip_header = client_ip_header
+        self.token_cache_size = token_cache_size
+        # Verified access token -> (user id, expiry); checking a signature
+        # costs ~100us, far more than the rest of the limiter
+        self._tokens = {}
+        self._tokens_lock = threading.Lock()
+
+    def match(self, request):
+        for rule in self.rules:
+            if rule.matches(request):
+                return rule
+        return None
+
+    def user_id(self, raw_token):
+        cached = self._tokens.get(raw_token)
+        now = time.time()
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        try:
+            token = AccessToken(raw_token)
+            user_id = token[api_settings.USER_ID_CLAIM]
+        except (TokenError, KeyError):
+            return None
+        if self.token_cache_size > 0:
+            with self._tokens_lock:
+                if len(self._tokens) >= self.token_cache_size:
+                    # Dicts keep insertion order, so this drops the oldest entry
+                    self._tokens.pop(next(iter(self._tokens)), None)
+                self._tokens[raw_token] = (user_id, token['exp'])
+        return user_id
+
+    def client_ip(self, request):
+        if self.client_ip_header:
+            forwarded = request.META.get(self.client_ip_header)
+            if forwarded:
+                return forwarded.split(',')[0].strip()
+        return request.META.get('REMOTE_ADDR', '')
+
+    def client_key(self, request):
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if header.startswith('Bearer '):
+            user_id = self.user_id(header[7:])
+            if user_id is not None:
+                return f'user:{user_id}'
+        return f'ip:{self.client_ip(request)}'
+
+    def take(self, key, rule, now=None):
+        """Charge one token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        shard = self.shards[hash(key) % len(self.shards)]
+        with shard.lock:
+            bucket = shard.buckets.get(key)
+            if bucket is None:
+                tokens = rule.burst
+            else:
+                tokens = min(rule.burst, bucket[0] + (now - bucket[1]) * rule.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            shard.buckets[key] = [tokens, now, now + (rule.burst - tokens) / rule.rate]
+            if now - shard.swept_at >= self.sweep_interval:
+                self.sweep(shard, now)
+        return 0 if allowed else (1 - tokens) / rule.rate
+
+    def sweep(self, shard, now):
+        """Drop buckets that have refilled completely; caller holds the shard lock"""
+        idle = [key for key, bucket in shard.buckets.items() if bucket[2] <= now]
+        for key in idle:
+            del shard.buckets[key]
+        shard.swept_at = now
+
+    def __len__(self):
+        return sum(len(shard.buckets) for shard in self.shards)
+
+    def check(self, request):
+        """Return a 429 response if the request is over its limit, else None"""
+        rule = self.match(request)
+        if rule is None:
+            return None
+        retry_after = self.take(f'{rule.name}:{self.client_key(request)}', rule)
+        if not retry_after:
+            return None
+        response = JsonResponse({'error': 'Too many requests, slow down'}, status=429)
+        response['Retry-After'] = str(math.ceil(retry_after))
+        return response
+
+
+@sync_and_async_middleware
+def rate_limit_middleware(get_response):
+    config = get_rate_limit_settings()
+    if not config['ENABLED'] or not config['RULES']:
+        raise MiddlewareNotUsed
+    limiter = RateLimiter(
+        config['RULES'],
+        shards=config['SHARDS'],
+        sweep_interval=config['SWEEP_INTERVAL'],
+        client_ip_header=config['CLIENT_IP_HEADER'],
+        token_cache_size=config['TOKEN_CACHE_SIZE'],
+    )
+
+    # The check never awaits, so both variants share it
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = limiter.check(request)
+            if response is None:
+                response = await get_response(request)
+            return response
+    else:
+        def middleware(request):
+            response = limiter.check(request)
+            if response is None:
+                response = get_response(request)
+            return response
+    middleware.limiter = limiter
+    return middleware
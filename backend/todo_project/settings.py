@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
@@ -46,12 +47,19 @@ INSTALLED_APPS = [
     "corsheaders",
     
     # Local apps
+    "todo_project",
     "accounts",
     "todos",
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover every other middleware
+    "todo_project.metrics.metrics_middleware",
     "corsheaders.middleware.CorsMiddleware",
+    # Before sessions/auth so rejected requests cost as little as possible
+    "todo_project.ratelimit.rate_limit_middleware",
+    # Outside everything that touches the body, as Django's GZipMiddleware would be
+    "todo_project.compression.compression_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -61,6 +69,18 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# The shorter chain todo_project.asgi uses for /api/ requests. The API views
+# don't use sessions, CSRF, request.user or messages, so only CORS, rate
+# limiting, metrics, compression and the security/Content-Length headers
+# remain. Entries must be async-capable.
+API_MIDDLEWARE = [
+    "todo_project.metrics.metrics_middleware",
+    "corsheaders.middleware.CorsMiddleware",
+    "todo_project.ratelimit.rate_limit_middleware",
+    "todo_project.compression.compression_middleware",
+    "todo_project.headers.response_headers_middleware",
+]
+
 ROOT_URLCONF = "todo_project.urls"
 
 TEMPLATES = [
@@ -88,9 +108,30 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Connections belong to a thread, and under ASGI each request does its
+        # sync work on a fresh thread, so keep-alive only pays off under WSGI
+        # or runserver's threads
+        "CONN_MAX_AGE": config('DB_CONN_MAX_AGE', default=0, cast=int),
+        "CONN_HEALTH_CHECKS": config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        "OPTIONS": {
+            # Take the write lock at BEGIN, so a transaction that reads and then
+            # writes waits out busy_timeout instead of failing on lock upgrade
+            "transaction_mode": config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+        },
     }
 }
 
+# Per-connection PRAGMAs applied on connection_created (todo_project.sqlite).
+# Set any of these to an empty string to leave SQLite's default.
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-64000, cast=int),
+    'temp_store': config('SQLITE_TEMP_STORE', default='MEMORY'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -154,6 +195,78 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Rotated refresh tokens are revoked in accounts.RevokedToken, fronted by an
+# in-memory Bloom filter per process (accounts.revocation). Prune expired rows
+# with the prune_revoked_tokens command.
+TOKEN_REVOCATION = {
+    'CAPACITY': config('TOKEN_REVOCATION_CAPACITY', default=100000, cast=int),
+    'ERROR_RATE': config('TOKEN_REVOCATION_ERROR_RATE', default=0.001, cast=float),
+    'SYNC_INTERVAL': config('TOKEN_REVOCATION_SYNC_INTERVAL', default=5, cast=float),
+}
+
+# Funnel todo writes from async views through one writer thread per SQLite
+# database (todos.writer) instead of letting request threads fight for the lock
+TODO_WRITE_QUEUE = config('TODO_WRITE_QUEUE', default=True, cast=bool)
+
+# Cache of JWT user lookups shared by the async views (accounts.authentication).
+# TRUST_CLAIMS skips the DB lookup on a miss and scopes requests by the token's
+# user id alone until the cache entry expires.
+JWT_USER_CACHE = {
+    'MAX_SIZE': config('JWT_USER_CACHE_MAX_SIZE', default=10000, cast=int),
+    'TTL': config('JWT_USER_CACHE_TTL', default=60, cast=int),
+    'TRUST_CLAIMS': config('JWT_TRUST_CLAIMS', default=False, cast=bool),
+}
+
+# Token-bucket limits per client (JWT user id, else IP), matched by path prefix;
+# the first matching rule applies. burst defaults to the rate's count.
+RATE_LIMITS = {
+    'ENABLED': config('RATE_LIMIT_ENABLED', default=True, cast=bool),
+    'CLIENT_IP_HEADER': config('RATE_LIMIT_CLIENT_IP_HEADER', default=None),
+    'RULES': [
+        {'name': 'login', 'path': '/api/auth/login/', 'rate': config('RATE_LIMIT_LOGIN', default='10/min')},
+        {'name': 'register', 'path': '/api/auth/register/', 'rate': config('RATE_LIMIT_REGISTER', default='5/min')},
+        {'name': 'api', 'path': '/api/', 'rate': config('RATE_LIMIT_API', default='20/s'), 'burst': 100},
+    ],
+}
+
+# Password hashing runs on its own bounded pool (accounts.hashing); logins and
+# registrations beyond WORKERS + MAX_QUEUE in flight get a 503
+PASSWORD_HASHING = {
+    'WORKERS': config('PASSWORD_HASHING_WORKERS', default=max(1, (os.cpu_count() or 2) // 2), cast=int),
+    'MAX_QUEUE': config('PASSWORD_HASHING_MAX_QUEUE', default=32, cast=int),
+}
+
+# Per-route latency histograms, status counts and DB time, served in Prometheus
+# format at /metrics to the listed addresses, plus a Server-Timing header
+METRICS = {
+    'ENABLED': config('METRICS_ENABLED', default=True, cast=bool),
+    'SERVER_TIMING': config('METRICS_SERVER_TIMING', default=True, cast=bool),
+    'ALLOWED_IPS': [
+        ip.strip() for ip in config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1').split(',') if ip.strip()
+    ],
+}
+
+# Per-user change events streamed at /api/todos/events/ (todos.events). With
+# several server processes, set TODO_EVENTS_SOCKET_DIR to a directory they all
+# share so events published in one reach streams held by the others.
+TODO_EVENTS = {
+    'QUEUE_SIZE': config('TODO_EVENTS_QUEUE_SIZE', default=100, cast=int),
+    'HEARTBEAT': config('TODO_EVENTS_HEARTBEAT', default=15, cast=float),
+    'MAX_CONNECTIONS_PER_USER': config('TODO_EVENTS_MAX_CONNECTIONS_PER_USER', default=20, cast=int),
+}
+if config('TODO_EVENTS_SOCKET_DIR', default=''):
+    TODO_EVENTS['BACKEND'] = 'todos.events.UnixSocketBackend'
+    TODO_EVENTS['OPTIONS'] = {'directory': config('TODO_EVENTS_SOCKET_DIR')}
+
+# Negotiated gzip/deflate (plus br/zstd when brotli/zstandard are installed)
+# for JSON and text bodies of at least MIN_SIZE bytes (todo_project.compression).
+# Compressed bodies of ETagged responses are cached up to CACHE_MAX_BYTES.
+COMPRESSION = {
+    'ENABLED': config('COMPRESSION_ENABLED', default=True, cast=bool),
+    'MIN_SIZE': config('COMPRESSION_MIN_SIZE', default=1024, cast=int),
+    'CACHE_MAX_BYTES': config('COMPRESSION_CACHE_MAX_BYTES', default=8 * 1024 * 1024, cast=int),
+}
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -0,0 +1,11 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .sqlite import apply_pragmas
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Apply the SQLite performance profile to every new connection"""
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection)
@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+# Defaults for settings.SQLITE_PRAGMAS. WAL lets readers run alongside the
+# single writer, and NORMAL sync is durable across application crashes in
+# WAL mode (only an OS crash can lose the last commits).
+SQLITE_PRAGMA_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms to wait for the write lock before "database is locked"
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # negative means KiB, so 64 MB of page cache
+    'temp_store': 'MEMORY',
+}
+
+
+def get_sqlite_pragmas():
+    """Pragmas to run on each new connection; a value of None or '' skips one"""
+    pragmas = {**SQLITE_PRAGMA_DEFAULTS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    return {name: value for name, value in pragmas.items() if value not in (None, '')}
+
+
+def apply_pragmas(connection):
+    # Runs on the raw DB-API connection: this is called while Django is
+    # still setting the connection up
+    for name, value in get_sqlite_pragmas().items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def read_snapshot(using=DEFAULT_DB_ALIAS):
+    """
+    A transaction for long consistent reads that doesn't hold the write lock.
+
+    atomic() begins IMMEDIATE under this project's transaction_mode, which
+    would keep every writer waiting. A DEFERRED transaction in WAL mode
+    reads from the snapshot its first query sees while writers carry on.
+    Other backends get a plain atomic block.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        with transaction.atomic(using=using):
+            yield
+        return
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = 'DEFERRED'
+    try:
+        with transaction.atomic(using=using):
+            # BEGIN has run; anything nested is a savepoint
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
@@ -0,0 +1,381 @@
+import asyncio
+import gzip
+import json
+import tempfile
+import zlib
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from todos.models import Todo
+
+from . import asgi
+from .compression import compression_cache, compression_middleware, negotiate
+from .metrics import registry
+from .ratelimit import RateLimiter
+from .sqlite import SQLITE_PRAGMA_DEFAULTS
+
+
+async def call_asgi(app, path, headers=(), method='GET', root_path=''):
+    """Run one request through an ASGI app; returns (status, headers, body)"""
+    path, _, query_string = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': root_path + path,
+        'raw_path': (root_path + path).encode(),
+        'query_string': query_string.encode(),
+        'root_path': root_path,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    sent = False
+    start, chunks = {}, []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            start.update(message)
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in start['headers']}
+    return start['status'], headers, b''.join(chunks)
+
+
+class RoutingTests(SimpleTestCase):
+    def route(self, path, root_path=''):
+        """Return which application ``path`` is handed to"""
+        with mock.patch.object(asgi, 'api_application') as api, \
+                mock.patch.object(asgi, 'django_application') as django:
+            api.side_effect = django.side_effect = lambda scope, receive, send: asyncio.sleep(0)
+            async_to_sync(asgi.application)({'type': 'http', 'path': root_path + path, 'root_path': root_path}, None, None)
+        return 'api' if api.called else 'django'
+
+    def test_api_paths_take_the_short_chain(self):
+        self.assertEqual(self.route('/api/todos/'), 'api')
+        self.assertEqual(self.route('/api/auth/profile/'), 'api')
+        self.assertEqual(self.route('/api/todos/', root_path='/app'), 'api')
+
+    def test_other_paths_get_the_full_stack(self):
+        for path in ('/admin/', '/metrics', '/apix/', '/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.route(path), 'django')
+
+    def test_full_stack_only_middleware_is_skipped_for_api(self):
+        _, api_headers, _ = async_to_sync(call_asgi)(asgi.application, '/api/todos/')
+        _, admin_headers, _ = async_to_sync(call_asgi)(asgi.application, '/admin/login/')
+        # SessionMiddleware and CsrfViewMiddleware only run on the full stack
+        self.assertNotIn('Cookie', api_headers.get('vary', ''))
+        self.assertIn('Cookie', admin_headers.get('vary', ''))
+        # The security headers still apply to the API
+        self.assertEqual(api_headers['x-content-type-options'], 'nosniff')
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_disallowed_host_is_rejected(self):
+        for path in ('/api/todos/', '/api/auth/profile/', '/admin/login/'):
+            with self.subTest(path=path):
+                status, _, _ = async_to_sync(call_asgi)(asgi.application, path, [('Host', 'evil.example')])
+                self.assertEqual(status, 400)
+        status, _, _ = async_to_sync(call_asgi)(asgi.application, '/api/todos/', [('Host', 'testserver')])
+        self.assertEqual(status, 401)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('measured', password='measured-password')
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_each_request_files_one_series_per_method_and_route(self):
+        self.client.get('/api/todos/')
+        self.client.get('/api/todos/')
+        self.client.get('/api/todos/1/')
+        self.client.get('/no/such/page/')
+        self.assertEqual(
+            {key: histogram.count for key, histogram in registry.latency.items()},
+            {('GET', 'api/todos/'): 2, ('GET', 'api/todos/<int:pk>/'): 1, ('GET', '<unmatched>'): 1},
+        )
+        self.assertEqual(registry.responses[('GET', 'api/todos/', '401')], 2)
+
+    def test_made_up_methods_share_one_label(self):
+        for index in range(20):
+            self.client.generic(f'BREW{index}', '/api/todos/')
+        self.client.generic('delete', '/api/todos/')
+        self.assertEqual(set(registry.latency), {('other', 'api/todos/'), ('DELETE', 'api/todos/')})
+        self.assertEqual(registry.latency[('other', 'api/todos/')].count, 20)
+        self.assertEqual({method for method, _, _ in registry.responses}, {'other', 'DELETE'})
+
+    def test_server_timing_reports_queries(self):
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.client.get('/api/todos/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertGreater(registry.db_queries[('GET', 'api/todos/')], 0)
+
+    @override_settings(METRICS={'SERVER_TIMING': False})
+    def test_server_timing_can_be_turned_off(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/todos/'))
+
+    def test_metrics_access_is_limited_to_allowed_addresses(self):
+        self.client.get('/api/todos/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_responses_total{method="GET",route="api/todos/",status="401"} 1', response.content.decode())
+
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 403)
+        with override_settings(METRICS={'ALLOWED_IPS': ['203.0.113.9']}):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 200)
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS={'ALLOWED_IPS': None}):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 200)
+
+
+class CompressionTests(SimpleTestCase):
+    body = json.dumps([{'id': index, 'title': f'Todo {index}'} for index in range(100)]).encode()
+
+    def respond(self, response, accept_encoding='gzip, deflate, br'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return compression_middleware(lambda request: response)(request)
+
+    def json_response(self, body=None, **headers):
+        return HttpResponse(self.body if body is None else body, content_type='application/json', headers=headers)
+
+    def test_negotiation(self):
+        preference = ['zstd', 'br', 'gzip', 'deflate']
+        self.assertEqual(negotiate('gzip, br', preference), 'br')
+        self.assertEqual(negotiate('gzip;q=1.0, br;q=0.5', preference), 'gzip')
+        self.assertEqual(negotiate('deflate, *;q=0.1', preference), 'deflate')
+        self.assertEqual(negotiate('*', preference), 'zstd')
+        self.assertEqual(negotiate('gzip;q=0, identity', preference), None)
+        self.assertEqual(negotiate('', preference), None)
+
+    def test_best_available_encoding_is_used(self):
+        response = self.respond(self.json_response(), 'deflate;q=0.5, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+
+        response = self.respond(self.json_response(), 'deflate')
+        self.assertEqual(zlib.decompress(response.content), self.body)
+
+    @mock.patch('todo_project.compression.brotli', None)
+    @mock.patch('todo_project.compression.zstandard', None)
+    def test_unavailable_or_refused_encodings_send_identity(self):
+        for accept_encoding in ('br', 'zstd', 'identity', 'gzip;q=0', ''):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.respond(self.json_response(), accept_encoding)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(response.content, self.body)
+                self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_vary_is_added_to_every_response(self):
+        for response in (self.json_response(), self.json_response(b'[]'), self.json_response(Vary='Cookie')):
+            with self.subTest(response=response):
+                vary = self.respond(response)['Vary']
+                self.assertIn('Accept-Encoding', vary)
+        self.assertEqual(self.respond(self.json_response(Vary='Cookie'))['Vary'], 'Cookie, Accept-Encoding')
+
+    def test_small_and_excluded_bodies_are_sent_as_they_are(self):
+        small = b'[' + b' ' * 1000 + b']'
+        self.assertFalse(self.respond(self.json_response(small)).has_header('Content-Encoding'))
+        image = HttpResponse(b'\x89PNG' * 1000, content_type='image/png')
+        self.assertFalse(self.respond(image).has_header('Content-Encoding'))
+        encoded = self.json_response(gzip.compress(self.body), **{'Content-Encoding': 'gzip'})
+        self.assertEqual(self.respond(encoded).content, gzip.compress(self.body))
+
+    def test_event_streams_pass_through_uncompressed(self):
+        chunks = [b'event: created\ndata: {}\n\n', b': heartbeat\n\n']
+        response = self.respond(StreamingHttpResponse(iter(chunks), content_type='text/event-stream'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(list(response.streaming_content), chunks)
+
+    def test_other_streams_are_compressed_chunk_by_chunk(self):
+        chunks = [self.body[:500], b'', self.body[500:]]
+        response = self.respond(StreamingHttpResponse(iter(chunks), content_type='application/json'), 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        received = []
+        for chunk in response.streaming_content:
+            # Each chunk is flushed, so what's been sent so far decodes on its own
+            received.append(decompressor.decompress(chunk))
+            if len(received) == 1:
+                self.assertEqual(received[0], self.body[:500])
+        self.assertEqual(b''.join(received), self.body)
+
+    def test_etag_is_weakened_and_body_cached(self):
+        compression_cache.entries.clear()
+        self.addCleanup(compression_cache.entries.clear)
+        first = self.respond(self.json_response(ETag='"v1"'), 'gzip')
+        self.assertEqual(first['ETag'], 'W/"v1"')
+        hits = compression_cache.hits
+        second = self.respond(self.json_response(ETag='"v1"'), 'gzip')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(compression_cache.hits, hits + 1)
+
+        # Same ETag, different body: the digest keeps the stale entry from being served
+        other = self.body.replace(b'Todo', b'Done')
+        third = self.respond(self.json_response(other, ETag='"v1"'), 'gzip')
+        self.assertEqual(gzip.decompress(third.content), other)
+
+        self.assertEqual(self.respond(self.json_response(ETag='"v1"'), 'identity')['ETag'], '"v1"')
+
+
+@override_settings(RATE_LIMITS={'ENABLED': False})
+class CompressedConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('compressed', password='compressed-password')
+        Todo.objects.bulk_create(Todo(user=cls.user, title=f'Todo number {index}') for index in range(30))
+
+    def test_weak_etag_still_revalidates(self):
+        headers = {
+            'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}',
+            'Accept-Encoding': 'gzip',
+        }
+        response = self.client.get('/api/todos/', headers=headers)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        response = self.client.get('/api/todos/', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+
+class RateLimiterTests(SimpleTestCase):
+    rules = [
+        {'name': 'login', 'path': '/api/auth/login/', 'rate': '2/min', 'methods': ['post']},
+        {'name': 'api', 'path': '/api/', 'rate': '10/s', 'burst': 3},
+    ]
+
+    def request(self, path='/api/todos/', method='get', **extra):
+        return getattr(RequestFactory(), method)(path, **extra)
+
+    def test_rules_match_by_prefix_and_method(self):
+        limiter = RateLimiter(self.rules)
+        self.assertEqual(limiter.match(self.request('/api/auth/login/', 'post')).name, 'login')
+        self.assertEqual(limiter.match(self.request('/api/auth/login/')).name, 'api')
+        self.assertIsNone(limiter.match(self.request('/admin/')))
+
+    def test_over_the_limit_gets_429_with_retry_after(self):
+        limiter = RateLimiter(self.rules)
+        login = self.request('/api/auth/login/', 'post')
+        self.assertIsNone(limiter.check(login))
+        self.assertIsNone(limiter.check(login))
+        response = limiter.check(login)
+        self.assertEqual(response.status_code, 429)
+        # One token every 30s, rounded up to whole seconds
+        self.assertIn(int(response['Retry-After']), (29, 30))
+        self.assertEqual(json.loads(response.content), {'error': 'Too many requests, slow down'})
+
+    def test_buckets_refill_at_the_rule_rate(self):
+        limiter = RateLimiter(self.rules)
+        rule = limiter.rules[1]
+        self.assertEqual([limiter.take('k', rule, now=100) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(limiter.take('k', rule, now=100), 0.1)
+        self.assertEqual(limiter.take('k', rule, now=100.15), 0)
+        self.assertGreater(limiter.take('k', rule, now=100.15), 0)
+
+    def test_users_are_keyed_by_token_and_others_by_address(self):
+        limiter = RateLimiter(self.rules, client_ip_header='HTTP_X_FORWARDED_FOR')
+        first, second = (User(pk=pk, username=f'user{pk}') for pk in (1, 2))
+
+        def bearer(user):
+            return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+        self.assertEqual(limiter.client_key(self.request(**bearer(first))), 'user:1')
+        self.assertEqual(limiter.client_key(self.request(**bearer(second))), 'user:2')
+        self.assertEqual(limiter.client_key(self.request(REMOTE_ADDR='198.51.100.7')), 'ip:198.51.100.7')
+        self.assertEqual(limiter.client_key(self.request(HTTP_AUTHORIZATION='Bearer forged')), 'ip:127.0.0.1')
+        self.assertEqual(
+            limiter.client_key(self.request(HTTP_X_FORWARDED_FOR='203.0.113.5, 10.0.0.1')), 'ip:203.0.113.5'
+        )
+
+        # Users behind one address each get their own allowance
+        for _ in range(3):
+            self.assertIsNone(limiter.check(self.request(**bearer(first))))
+        self.assertEqual(limiter.check(self.request(**bearer(first))).status_code, 429)
+        self.assertIsNone(limiter.check(self.request(**bearer(second))))
+        self.assertIsNone(limiter.check(self.request()))
+
+    def test_sweep_drops_only_full_buckets(self):
+        limiter = RateLimiter(self.rules, shards=1, sweep_interval=10)
+        rule = limiter.rules[1]
+        limiter.shards[0].swept_at = 0
+        limiter.take('idle', rule, now=1)
+        for _ in range(3):
+            limiter.take('busy', rule, now=5)
+        self.assertEqual(len(limiter), 2)
+
+        # 'idle' refilled by 1.1, 'busy' is still empty at 5.2
+        limiter.take('busy', rule, now=5.2)
+        self.assertEqual(len(limiter), 2)
+        limiter.take('busy', rule, now=10)
+        self.assertEqual(set(limiter.shards[0].buckets), {'busy'})
+        self.assertEqual(limiter.shards[0].swept_at, 10)
+
+
+@override_settings(RATE_LIMITS={'RULES': [{'name': 'api', 'path': '/api/', 'rate': '1/min', 'burst': 2}]})
+class RateLimitMiddlewareTests(TestCase):
+    def test_limit_applies_before_the_view(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/todos/').status_code, 401)
+        response = self.client.get('/api/todos/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        # Other addresses and paths outside the rules are unaffected
+        self.assertEqual(self.client.get('/api/todos/', REMOTE_ADDR='192.0.2.1').status_code, 401)
+        self.assertEqual(self.client.get('/admin/login/').status_code, 200)
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    def connect(self):
+        """A new connection to a file database, set up the way Django sets up any other"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = {**connections['default'].settings_dict, 'NAME': f'{directory.name}/db.sqlite3'}
+        wrapper = DatabaseWrapper(settings_dict, alias='pragmas')
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper.connection
+
+    def pragma(self, connection, name):
+        return connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_new_connections_get_the_profile(self):
+        connection = self.connect()
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), SQLITE_PRAGMA_DEFAULTS['busy_timeout'])
+        self.assertEqual(self.pragma(connection, 'cache_size'), SQLITE_PRAGMA_DEFAULTS['cache_size'])
+        self.assertEqual(self.pragma(connection, 'temp_store'), 2)  # MEMORY
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': '', 'synchronous': 'FULL', 'busy_timeout': 250})
+    def test_settings_override_or_skip_pragmas(self):
+        connection = self.connect()
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'delete')
+        self.assertEqual(self.pragma(connection, 'synchronous'), 2)  # FULL
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 250)
@@ -18,8 +18,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import MetricsView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/", include("accounts.urls")),
     path("api/todos/", include("todos.urls")),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
@@ -1,5 +1,11 @@
 from django.contrib import admin
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
 from .models import Todo
+from .changes import record_tombstones
+from .search import FTS_TABLE, build_match_query
+from .stats import rebuild_user_stats
 
 
 @admin.register(Todo)
@@ -8,3 +14,37 @@ class TodoAdmin(admin.ModelAdmin):
     list_filter = ['completed', 'priority', 'created_at']
     search_fields = ['title', 'description']
     list_editable = ['completed', 'priority']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the FTS5 index instead of LIKE '%term%' scans when it is available
+        match_query = build_match_query(search_term)
+        if connection.vendor != 'sqlite' or not match_query:
+            return super().get_search_results(request, queryset, search_term)
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match_query])
+        return queryset.filter(pk__in=matches), False
+
+    # Admin edits bypass todos.writes, so recount the owners' stats, which
+    # also bumps the version their list ETags are built from, and leave
+    # tombstones for deletes
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            previous = Todo.objects.filter(pk=obj.pk).values_list('user_id', flat=True).first()
+            super().save_model(request, obj, form, change)
+            for user_id in {previous, obj.user_id} - {None}:
+                rebuild_user_stats(user_id)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            record_tombstones(obj.user_id, [obj.pk])
+            super().delete_model(request, obj)
+            rebuild_user_stats(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            deleted = {}
+            for user_id, pk in queryset.values_list('user_id', 'pk'):
+                deleted.setdefault(user_id, []).append(pk)
+            super().delete_queryset(request, queryset)
+            for user_id, pks in deleted.items():
+                record_tombstones(user_id, pks)
+                rebuild_user_stats(user_id)
@@ -0,0 +1,141 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .changes import record_tombstones
+from .models import Todo
+from .stats import apply_delta, count_todo
+from .serializers import TodoSerializer
+
+
+MAX_BATCH_OPERATIONS = 500
+OPERATIONS = ('create', 'update', 'toggle', 'delete')
+
+
+class BatchError(ValueError):
+    """Raised when the batch payload itself is malformed"""
+
+
+def get_max_operations():
+    return getattr(settings, 'TODO_BATCH_MAX_OPERATIONS', MAX_BATCH_OPERATIONS)
+
+
+def item_error(index, status, errors):
+    return {'index': index, 'status': status, 'errors': errors}
+
+
+def validate_operations(operations):
+    """
+    Validate every operation without touching the database.
+
+    Returns (validated, results) where ``validated`` is a list of
+    (index, op, pk, validated_data) and ``results`` already holds an entry
+    for each operation that failed validation.
+    """
+    if not isinstance(operations, list):
+        raise BatchError('operations must be a list')
+    if len(operations) > get_max_operations():
+        raise BatchError(f'A batch may contain at most {get_max_operations()} operations')
+
+    validated = []
+    results = {}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            results[index] = item_error(index, 400, {'op': [f'Must be one of: {", ".join(OPERATIONS)}']})
+            continue
+
+        op = operation['op']
+        pk = operation.get('id')
+        # bool is an int subclass, and True must not mean todo 1
+        if op != 'create' and (not isinstance(pk, int) or isinstance(pk, bool)):
+            results[index] = item_error(index, 400, {'id': ['A valid integer is required.']})
+            continue
+
+        data = None
+        if op in ('create', 'update'):
+            serializer = TodoSerializer(data=operation.get('data') or {}, partial=op == 'update')
+            if not serializer.is_valid():
+                results[index] = item_error(index, 400, serializer.errors)
+                continue
+            data = serializer.validated_data
+
+        validated.append((index, op, pk, data))
+    return validated, results
+
+
+def apply_operations(user, validated, results):
+    """
+    Apply validated operations in a single transaction using bulk queries.
+
+    One query loads every referenced todo, then creates, updates and
+    deletes go out as one bulk_create, one bulk_update and one DELETE.
+    """
+    now = timezone.now()
+    delta = Counter()
+    to_create = []
+    dirty = {}
+    dirty_fields = {'updated_at'}
+    deleted = set()
+    created = {}
+
+    with transaction.atomic():
+        ids = {pk for _, op, pk, _ in validated if op != 'create'}
+        existing = Todo.objects.filter(user=user).in_bulk(ids) if ids else {}
+        # Take every loaded todo out of the stats now and add back whatever survives
+        for todo in existing.values():
+            count_todo(delta, todo, -1)
+
+        for index, op, pk, data in validated:
+            if op == 'create':
+                todo = Todo(user=user, **data)
+                to_create.append(todo)
+                created[index] = todo
+                continue
+
+            todo = existing.get(pk)
+            if todo is None or pk in deleted:
+                results[index] = item_error(index, 404, {'id': ['No Todo matches the given query.']})
+                continue
+
+            if op == 'delete':
+                deleted.add(pk)
+                dirty.pop(pk, None)
+                results[index] = {'index': index, 'status': 204}
+                continue
+
+            if op == 'update':
+                for attr, value in data.items():
+                    setattr(todo, attr, value)
+                dirty_fields.update(data)
+            else:
+                todo.completed = not todo.completed
+                dirty_fields.add('completed')
+            # bulk_update skips auto_now, so stamp updated_at ourselves
+            todo.updated_at = now
+            dirty[pk] = todo
+            # Later operations may change the same todo again, so report its state as of this one
+            results[index] = {'index': index, 'status': 200, 'data': TodoSerializer(todo).data}
+
+        if to_create:
+            Todo.objects.bulk_create(to_create)
+        if dirty:
+            Todo.objects.bulk_update(list(dirty.values()), sorted(dirty_fields))
+        if deleted:
+            Todo.objects.filter(user=user, pk__in=deleted).delete()
+            record_tombstones(user.pk, deleted)
+
+        for todo in to_create:
+            count_todo(delta, todo, 1)
+        for pk, todo in existing.items():
+            if pk not in deleted:
+                count_todo(delta, todo, 1)
+        apply_delta(user.pk, delta)
+
+    # Creates are serialized once bulk_create has given them ids; nothing
+    # later in the batch can refer to them
+    for index, todo in created.items():
+        results[index] = {'index': index, 'status': 201, 'data': TodoSerializer(todo).data}
+
+    return [results[index] for index in sorted(results)]
@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Todo, TodoTombstone
+from .pagination import DEFAULT_PAGE_SIZE
+
+
+TOMBSTONE_RETENTION_DAYS = 30
+
+
+class InvalidSyncToken(ValueError):
+    """Raised when a client sends a sync token we did not issue"""
+
+
+class SyncTokenExpired(Exception):
+    """Raised when a token predates the oldest tombstone we still keep"""
+
+
+def get_tombstone_retention():
+    return timedelta(days=getattr(settings, 'TODO_TOMBSTONE_RETENTION_DAYS', TOMBSTONE_RETENTION_DAYS))
+
+
+def encode_sync_token(todo_position, tombstone_position):
+    """Pack the (timestamp, id) high-water marks of both change streams"""
+    payload = json.dumps({
+        't': [todo_position[0].isoformat(), todo_position[1]] if todo_position else None,
+        'd': [tombstone_position[0].isoformat(), tombstone_position[1]] if tombstone_position else None,
+        'i': timezone.now().isoformat(),
+    }, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_sync_token(token):
+    """Return (todo_position, tombstone_position, issued_at) from a sync token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        positions = []
+        for key in ('t', 'd'):
+            value = payload[key]
+            positions.append((datetime.fromisoformat(value[0]), int(value[1])) if value else None)
+        issued_at = datetime.fromisoformat(payload['i'])
+    except (TypeError, ValueError, KeyError, IndexError, UnicodeError):
+        raise InvalidSyncToken('Invalid sync token')
+    return positions[0], positions[1], issued_at
+
+
+def after(queryset, field, position):
+    """Keyset filter for rows strictly after (timestamp, id) in (field, id) order"""
+    if position is None:
+        return queryset
+    timestamp, pk = position
+    return queryset.filter(**{f'{field}__gte': timestamp}).filter(
+        Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk})
+    )
+
+
+async def get_changes(user, token=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return (changed_todos, deleted_ids, next_token, has_more) since ``token``.
+
+    Live rows and tombstones are walked as two independent keyset streams on
+    (updated_at, id) and (deleted_at, id), so the work done is proportional
+    to the number of changes rather than the size of the account.
+    """
+    if token:
+        todo_position, tombstone_position, issued_at = decode_sync_token(token)
+        if issued_at < timezone.now() - get_tombstone_retention():
+            raise SyncTokenExpired('Sync token has expired; fetch the full list again')
+    else:
+        # A fresh client gets every live todo and no tombstones
+        todo_position = None
+        tombstone_position = (timezone.now(), 0)
+
+    todos_qs = after(Todo.objects.filter(user=user), 'updated_at', todo_position).order_by('updated_at', 'id')
+    todos = [todo async for todo in todos_qs[:limit + 1]]
+
+    tombstones_qs = after(
+        TodoTombstone.objects.filter(user=user), 'deleted_at', tombstone_position
+    ).order_by('deleted_at', 'id')
+    tombstones = [tombstone async for tombstone in tombstones_qs[:limit + 1]]
+
+    has_more = len(todos) > limit or len(tombstones) > limit
+    todos = todos[:limit]
+    tombstones = tombstones[:limit]
+
+    if todos:
+        todo_position = (todos[-1].updated_at, todos[-1].pk)
+    if tombstones:
+        tombstone_position = (tombstones[-1].deleted_at, tombstones[-1].pk)
+
+    next_token = encode_sync_token(todo_position, tombstone_position)
+    return todos, [tombstone.todo_id for tombstone in tombstones], next_token, has_more
+
+
+def record_tombstones(user_id, todo_ids):
+    """Create tombstones for deleted todos; call inside the deleting transaction"""
+    TodoTombstone.objects.bulk_create([TodoTombstone(user_id=user_id, todo_id=pk) for pk in todo_ids])
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones older than the retention window, returning how many were removed"""
+    cutoff = (now or timezone.now()) - get_tombstone_retention()
+    deleted, _ = TodoTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,71 @@
+import calendar
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .filters import depends_on_clock
+from .models import TodoStats
+from .stats import rebuild_user_stats
+from .writer import run_write
+
+
+def make_etag(*parts):
+    """Build a quoted ETag from the values that determine a response body"""
+    digest = hashlib.md5(repr(parts).encode('utf-8'), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def to_timestamp(value):
+    return calendar.timegm(value.utctimetuple()) if value else None
+
+
+async def list_validators(user, request):
+    """
+    ETag for a user's list, from the version counter in their TodoStats row.
+
+    Every todo write bumps the version in its own transaction, so this is a
+    primary-key read whatever the size of the account, and deletes change it
+    like any other write. Lists carry no Last-Modified: a delete leaves no
+    newer timestamp behind, and HTTP dates can't tell apart two edits in the
+    same second.
+
+    Returns None for ?overdue=true: todos become overdue as time passes
+    without any write, so no version can say the client's copy is current.
+    """
+    if depends_on_clock(request.GET):
+        return None
+    version = await TodoStats.objects.filter(user_id=user.pk).values_list('version', flat=True).afirst()
+    if version is None:
+        # First read for a user whose todos predate the stats table
+        version = (await run_write(rebuild_user_stats, user.pk)).version
+    return make_etag('list', user.pk, version, request.META.get('QUERY_STRING', ''))
+
+
+def detail_validators(todo, request):
+    """ETag and Last-Modified for a single todo"""
+    etag = make_etag('detail', todo.pk, todo.updated_at.isoformat(), request.META.get('QUERY_STRING', ''))
+    return etag, todo.updated_at
+
+
+def set_validators(response, etag, last_modified=None):
+    if etag is None:
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(to_timestamp(last_modified))
+    # Let clients keep a copy but make them revalidate it every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """Return a 304 response if the client's copy is still current, otherwise None"""
+    if etag is None:
+        return None
+    response = get_conditional_response(request, etag=etag, last_modified=to_timestamp(last_modified))
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
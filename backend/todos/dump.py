@@ -0,0 +1,176 @@
+"""
+Compact bulk dump format for users and todos.
+
+A dump is a gzip-compressed NDJSON file. The first line is a header naming
+each section, its columns and its row count. Every following line is one
+row as a JSON array in column order, with users first and then todos, so a
+reader always knows which section a line belongs to from its position.
+"""
+import gzip
+import json
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from todo_project.sqlite import read_snapshot
+
+from .encoding import dumps
+from .models import Todo
+
+
+DUMP_FORMAT = 'todos-dump'
+DUMP_VERSION = 1
+EXPORT_CHUNK_SIZE = 5000
+IMPORT_BATCH_SIZE = 5000
+
+# Users first so todos' foreign keys resolve. Group and permission
+# memberships are not exported.
+SECTIONS = [
+    ('users', User, [
+        'id', 'username', 'password', 'email', 'first_name', 'last_name',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login',
+    ]),
+    ('todos', Todo, [
+        'id', 'user_id', 'title', 'description', 'completed', 'priority',
+        'created_at', 'updated_at', 'due_date',
+    ]),
+]
+
+
+class DumpError(ValueError):
+    pass
+
+
+def build_header(using=DEFAULT_DB_ALIAS):
+    return {
+        'format': DUMP_FORMAT,
+        'version': DUMP_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'sections': [
+            {'name': name, 'fields': fields, 'rows': model.objects.using(using).count()}
+            for name, model, fields in SECTIONS
+        ],
+    }
+
+
+def datetime_columns(model, fields):
+    """Indices of the DateTimeField columns in a section's field list"""
+    return [
+        index for index, field in enumerate(fields)
+        if isinstance(model._meta.get_field(field), models.DateTimeField)
+    ]
+
+
+def write_dump(path, chunk_size=EXPORT_CHUNK_SIZE, progress=None, using=DEFAULT_DB_ALIAS):
+    """
+    Stream every user and todo into ``path``.
+
+    Rows come from ``values_list().iterator(chunk_size)``, which uses a
+    server-side cursor where the backend has one, so memory stays flat.
+    The header counts and the rows are read from one snapshot, so they
+    agree even while the app keeps writing, and writers aren't held up.
+    Datetimes are written with ``isoformat()`` whichever encoder is in use,
+    keeping their microseconds. ``progress(rows_written)`` is called after
+    each chunk. Returns the header.
+    """
+    written = 0
+    with read_snapshot(using), gzip.open(path, 'wb', compresslevel=6) as out:
+        header = build_header(using)
+        out.write(dumps(header) + b'\n')
+        for name, model, fields in SECTIONS:
+            datetimes = datetime_columns(model, fields)
+            rows = model.objects.using(using).order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size)
+            buffer = []
+            for row in rows:
+                row = list(row)
+                for index in datetimes:
+                    if row[index] is not None:
+                        row[index] = row[index].isoformat()
+                buffer.append(dumps(row))
+                if len(buffer) == chunk_size:
+                    out.write(b'\n'.join(buffer) + b'\n')
+                    written += len(buffer)
+                    buffer = []
+                    if progress:
+                        progress(written)
+            if buffer:
+                out.write(b'\n'.join(buffer) + b'\n')
+                written += len(buffer)
+                if progress:
+                    progress(written)
+    return header
+
+
+def read_header(dump):
+    """Read and check the header line of an open dump"""
+    try:
+        header = json.loads(dump.readline())
+    except ValueError as e:
+        raise DumpError(f'Not a todo dump: {e}')
+    if not isinstance(header, dict) or header.get('format') != DUMP_FORMAT:
+        raise DumpError('Not a todo dump')
+    if header.get('version') != DUMP_VERSION:
+        raise DumpError(f"Unsupported dump version {header.get('version')}")
+
+    known = {name: fields for name, _, fields in SECTIONS}
+    for section in header['sections']:
+        if known.get(section['name']) != section['fields']:
+            raise DumpError(f"Section {section['name']} does not match this schema")
+    return header
+
+
+def iter_batches(dump, header, skip=0, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Yield ``(model, objects)`` batches for the rows after the first ``skip``.
+
+    A batch never spans two sections. Datetime columns are parsed here so
+    bulk_create gets aware datetimes rather than strings.
+    """
+    models_by_name = {name: model for name, model, _ in SECTIONS}
+    position = 0
+    for section in header['sections']:
+        model = models_by_name[section['name']]
+        fields = section['fields']
+        datetimes = datetime_columns(model, fields)
+        batch = []
+        for _ in range(section['rows']):
+            line = dump.readline()
+            if not line:
+                raise DumpError(f"Dump ends early in section {section['name']}")
+            position += 1
+            if position <= skip:
+                continue
+            row = json.loads(line)
+            for index in datetimes:
+                if row[index] is not None:
+                    row[index] = parse_datetime(row[index])
+            batch.append(model(**dict(zip(fields, row))))
+            if len(batch) == batch_size:
+                yield model, batch
+                batch = []
+        if batch:
+            yield model, batch
+
+
+@contextmanager
+def preserve_timestamps():
+    """
+    Stop auto_now / auto_now_add from overwriting dumped timestamps.
+
+    bulk_create runs each field's pre_save, which stamps the current time
+    on these fields. Only for use in a single-purpose process like import.
+    """
+    saved = []
+    for _, model, _ in SECTIONS:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
@@ -0,0 +1,244 @@
+"""
+Per-user todo change events for the SSE endpoint.
+
+Views publish a compact event after each committed write, and every open
+/api/todos/events/ stream of that user receives it. A stream holds a
+bounded asyncio queue. A client that falls too far behind gets its backlog
+replaced by a single ``resync`` event, which tells it to refetch the list.
+
+Publishing goes through a backend, so it can reach streams held by other
+server processes:
+
+- ``LocalBackend`` delivers within this process only.
+- ``UnixSocketBackend`` has every process bind a datagram socket in a
+  shared directory, and sends each event to all of them.
+
+Datagrams are best effort. A process whose receive buffer is full misses
+events until the client's next resync or reconnect.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+EVENT_DEFAULTS = {
+    'BACKEND': 'todos.events.LocalBackend',
+    'OPTIONS': {},
+    # Events buffered per stream before it is told to resync
+    'QUEUE_SIZE': 100,
+    # Seconds between keepalive comments on an idle stream
+    'HEARTBEAT': 15,
+    'MAX_CONNECTIONS_PER_USER': 20,
+}
+
+# Larger events are sent without the todo body; clients refetch instead
+MAX_EVENT_BYTES = 16 * 1024
+
+RESYNC = json.dumps({'type': 'resync'}, separators=(',', ':'))
+
+
+def get_event_settings():
+    return {**EVENT_DEFAULTS, **getattr(settings, 'TODO_EVENTS', {})}
+
+
+class TooManyConnections(Exception):
+    """Raised when a user already has MAX_CONNECTIONS_PER_USER open streams"""
+
+
+class Subscription:
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    def put(self, message):
+        """Queue an encoded event; runs on the subscription's loop"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A partial history is useless, so drop it and have the client refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class Broker:
+    def __init__(self, backend, queue_size, max_connections_per_user, options=None):
+        self.queue_size = queue_size
+        self.max_connections_per_user = max_connections_per_user
+        self._lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+        self.backend = import_string(backend)(self, **(options or {}))
+
+    def subscribe(self, user_id):
+        self.backend.start()
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            if len(self.subscriptions[user_id]) >= self.max_connections_per_user:
+                raise TooManyConnections('Too many open event streams')
+            self.subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            streams = self.subscriptions.get(subscription.user_id)
+            if streams is not None:
+                streams.discard(subscription)
+                if not streams:
+                    del self.subscriptions[subscription.user_id]
+
+    def publish(self, user_id, message):
+        self.backend.publish(user_id, message)
+
+    def deliver(self, user_id, message):
+        """Hand an encoded event to this process's streams for ``user_id``, from any thread"""
+        with self._lock:
+            streams = list(self.subscriptions.get(user_id, ()))
+        for subscription in streams:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # Its event loop has shut down
+                self.unsubscribe(subscription)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(streams) for streams in self.subscriptions.values())
+
+
+class LocalBackend:
+    """Fan-out within this process"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def start(self):
+        pass
+
+    def publish(self, user_id, message):
+        self.broker.deliver(user_id, message)
+
+
+class UnixSocketBackend:
+    """Fan-out to every process on this host that binds a socket in ``directory``"""
+
+    def __init__(self, broker, directory):
+        self.broker = broker
+        self.directory = Path(directory)
+        self.path = None
+        self.sender = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.path is not None:
+            return
+        with self._lock:
+            if self.path is not None:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f'{os.getpid()}-{uuid.uuid4().hex[:8]}.sock'
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            receiver.bind(str(path))
+            self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sender.setblocking(False)
+            threading.Thread(target=self.receive, args=(receiver,), name='todo-events', daemon=True).start()
+            atexit.register(path.unlink, missing_ok=True)
+            self.path = path
+
+    def receive(self, receiver):
+        while True:
+            payload = receiver.recv(MAX_EVENT_BYTES + 64)
+            # Anything can write to the socket; a bad datagram must not end the thread
+            try:
+                user_id, _, message = payload.decode('utf-8').partition('\n')
+                self.broker.deliver(int(user_id), message)
+            except Exception:
+                logger.exception('Dropped undeliverable event datagram %r', payload[:64])
+
+    def publish(self, user_id, message):
+        self.start()
+        self.broker.deliver(user_id, message)
+        payload = f'{user_id}\n{message}'.encode('utf-8')
+        for path in self.directory.glob('*.sock'):
+            if path == self.path:
+                continue
+            try:
+                self.sender.sendto(payload, str(path))
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Left behind by a process that has exited
+                path.unlink(missing_ok=True)
+            except BlockingIOError:
+                pass
+
+
+broker = None
+broker_lock = threading.Lock()
+
+
+def get_broker():
+    global broker
+    with broker_lock:
+        if broker is None:
+            config = get_event_settings()
+            broker = Broker(
+                config['BACKEND'],
+                config['QUEUE_SIZE'],
+                config['MAX_CONNECTIONS_PER_USER'],
+                config['OPTIONS'],
+            )
+        return broker
+
+
+def publish_change(user_id, kind, pk, todo=None):
+    """Tell the user's open streams that a todo was created, updated or deleted"""
+    event = {'type': kind, 'id': pk}
+    if todo is not None:
+        event['todo'] = todo
+    message = json.dumps(event, separators=(',', ':'))
+    if len(message) > MAX_EVENT_BYTES:
+        message = json.dumps({'type': kind, 'id': pk}, separators=(',', ':'))
+    get_broker().publish(user_id, message)
+
+
+async def event_stream(subscription, heartbeat):
+    try:
+        # Tell EventSource how long to wait before reconnecting
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing the idle connection
+                yield ': keepalive\n\n'
+                continue
+            yield f'data: {message}\n\n'
+    finally:
+        get_broker().unsubscribe(subscription)
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    def __init__(self, subscription, heartbeat):
+        super().__init__(event_stream(subscription, heartbeat), content_type='text/event-stream')
+        self.subscription = subscription
+        self['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        self['X-Accel-Buffering'] = 'no'
+
+    def close(self):
+        # The stream may be torn down before its generator ever started
+        get_broker().unsubscribe(self.subscription)
+        super().close()
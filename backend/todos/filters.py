@@ -0,0 +1,95 @@
+from datetime import datetime, time
+
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Todo
+
+
+ORDERING_FIELDS = ('due_date', 'priority', 'updated_at', 'created_at')
+PRIORITIES = [value for value, _ in Todo.PRIORITY_CHOICES]
+
+
+def parse_bool(name, value):
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes'):
+        return True
+    if lowered in ('false', '0', 'no'):
+        return False
+    raise ValueError(f'{name} must be true or false')
+
+
+def parse_moment(name, value):
+    """Parse an ISO datetime or date; bare dates mean midnight in the current timezone"""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'{name} must be an ISO 8601 date or datetime')
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def depends_on_clock(params):
+    """True when the results can change with no write at all, as overdue ones do"""
+    return bool(params.get('overdue')) and parse_bool('overdue', params['overdue'])
+
+
+def apply_filters(queryset, params):
+    """
+    Narrow a todo queryset from query parameters so filtering happens in SQL.
+
+    Each filter lines up with an index on (user, ...): completed,
+    priority and due_date, with overdue served by the partial open-todo index.
+    """
+    if params.get('completed'):
+        queryset = queryset.filter(completed=parse_bool('completed', params['completed']))
+
+    if params.get('priority'):
+        priorities = [value.strip() for value in params['priority'].split(',') if value.strip()]
+        unknown = set(priorities) - set(PRIORITIES)
+        if unknown:
+            raise ValueError(f'priority must be one of: {", ".join(PRIORITIES)}')
+        queryset = queryset.filter(priority__in=priorities)
+
+    if params.get('due_before'):
+        queryset = queryset.filter(due_date__lt=parse_moment('due_before', params['due_before']))
+    if params.get('due_after'):
+        queryset = queryset.filter(due_date__gte=parse_moment('due_after', params['due_after']))
+
+    if params.get('overdue') and parse_bool('overdue', params['overdue']):
+        queryset = queryset.filter(completed=False, due_date__lt=timezone.now())
+
+    return queryset
+
+
+def apply_ordering(queryset, value):
+    """
+    Sort by a comma-separated list such as ``due_date,-priority``.
+
+    Priority sorts by rank (low < medium < high) rather than alphabetically,
+    which SQLite has to sort in a temp B-tree. id is appended as a stable
+    tiebreaker in the direction of the last key, so single-key sorts on
+    due_date or updated_at walk their (user, field, id) index end to end.
+    """
+    ordering = []
+    for key in (part.strip() for part in value.split(',')):
+        if not key:
+            continue
+        descending = key.startswith('-')
+        field = key.lstrip('-')
+        if field not in ORDERING_FIELDS:
+            raise ValueError(f'ordering must use: {", ".join(ORDERING_FIELDS)}')
+        if field == 'priority':
+            queryset = queryset.annotate(priority_rank=Case(
+                *[When(priority=priority, then=Value(rank)) for rank, priority in enumerate(PRIORITIES)],
+                output_field=IntegerField(),
+            ))
+            field = 'priority_rank'
+        ordering.append(f'-{field}' if descending else field)
+    if not ordering:
+        return queryset.order_by('-created_at', '-id')
+    return queryset.order_by(*ordering, '-id' if ordering[-1].startswith('-') else 'id')
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from todo_project.benchmarks import bench_user, latency_columns, request_asgi
+from todos.events import get_broker
+
+
+BENCH_USERNAME = 'events-benchmark-user'
+
+
+class Stream:
+    """One open /api/todos/events/ connection driven in-process"""
+
+    def __init__(self, app, token):
+        self.messages = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        self.requested = False
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': '/api/todos/events/',
+            'raw_path': b'/api/todos/events/',
+            'root_path': '',
+            'query_string': f'token={token}'.encode(),
+            'headers': [],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        self.task = asyncio.create_task(app(scope, self.receive, self.messages.put))
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def next_event(self):
+        while True:
+            message = await self.messages.get()
+            if message['type'] == 'http.response.body' and message['body'].startswith(b'data: '):
+                return message['body']
+
+    async def close(self):
+        self.disconnected.set()
+        await self.task
+
+
+class Command(BaseCommand):
+    help = "Measure change event fan-out latency and the memory an idle event stream holds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=200, help='Open event streams for the user')
+        parser.add_argument('--writes', type=int, default=50, help='Todos created while the streams are open')
+
+    async def run(self, app, token, streams, writes):
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        opened = [Stream(app, token) for _ in range(streams)]
+        while len(get_broker()) < streams:
+            await asyncio.sleep(0.01)
+        per_stream = sum(
+            stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename')
+        ) / streams
+        tracemalloc.stop()
+
+        headers = [('Authorization', f'Bearer {token}'), ('Content-Type', 'application/json')]
+        latencies = []
+        try:
+            for index in range(writes):
+                started = time.perf_counter()
+                await request_asgi(app, 'POST', '/api/todos/', headers, json.dumps({'title': f'Event {index}'}).encode())
+                written = time.perf_counter()
+                await asyncio.gather(*[stream.next_event() for stream in opened])
+                latencies.append((written - started, time.perf_counter() - written))
+        finally:
+            await asyncio.gather(*[stream.close() for stream in opened])
+        return per_stream, latencies
+
+    @override_settings(RATE_LIMITS={'ENABLED': False}, TODO_EVENTS={'MAX_CONNECTIONS_PER_USER': 100000})
+    def handle(self, *args, **options):
+        from todo_project.asgi import application
+
+        with bench_user(BENCH_USERNAME) as user:
+            token = str(RefreshToken.for_user(user).access_token)
+            connections.close_all()
+
+            per_stream, latencies = asyncio.run(
+                self.run(application, token, options['streams'], options['writes'])
+            )
+            writes = [write for write, _ in latencies]
+            fanouts = [fanout for _, fanout in latencies]
+            self.stdout.write(f"{options['streams']} idle streams: ~{per_stream / 1024:.1f} KiB each")
+            self.stdout.write(f"{'':<24}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+            for name, values in (('POST /api/todos/', writes), (f"delivered to all {options['streams']}", fanouts)):
+                self.stdout.write(f'{name:<24}{latency_columns(values, scale=1e3, precision=2)}')
+            self.stdout.write(f'streams left open: {len(get_broker())}')
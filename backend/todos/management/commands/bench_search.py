@@ -0,0 +1,61 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from todo_project.benchmarks import best_of, bench_user, seed_todos
+from todos.models import Todo
+from todos.search import build_match_query, search_ids
+
+
+BENCH_USERNAME = 'search-benchmark-user'
+WORDS = (
+    'buy call email fix review write plan book clean pay order send schedule update test deploy '
+    'groceries dentist report invoice meeting garden car laundry taxes budget slides release '
+    'kitchen printer backup server ticket birthday flight hotel insurance contract'
+).split()
+# Common words match a large share of rows; project codes match a handful each,
+# which is where a LIKE scan has to read the whole table
+QUERIES = ['invoice', 'groc', 'flight hotel', 'proj123', 'proj4567', 'proj89 taxes']
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 todo search against a LIKE '%term%' scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Todos to seed')
+        parser.add_argument('--limit', type=int, default=50, help='Results per query')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per query')
+
+    def seed(self, user, rows):
+        rng = random.Random(42)
+        seed_todos(user, rows, lambda index: {
+            'title': ' '.join(rng.choices(WORDS, k=3)),
+            'description': ' '.join(rng.choices(WORDS, k=12) + [f'proj{rng.randrange(max(rows // 10, 1))}']),
+        })
+
+    def like_search(self, user, text, limit):
+        condition = Q()
+        for token in text.split():
+            condition &= Q(title__icontains=token) | Q(description__icontains=token)
+        return list(Todo.objects.filter(condition, user=user).values_list('id', flat=True)[:limit])
+
+    def fts_search(self, user, text, limit):
+        return search_ids(user.pk, build_match_query(text), limit)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_search needs the SQLite FTS5 index')
+
+        with bench_user(BENCH_USERNAME) as user:
+            started = time.perf_counter()
+            self.seed(user, options['rows'])
+            self.stdout.write(f"Seeded {options['rows']:,} todos in {time.perf_counter() - started:.1f}s")
+
+            self.stdout.write(f"{'query':<16}{'LIKE ms':>12}{'FTS5 ms':>12}{'speedup':>10}")
+            for text in QUERIES:
+                like = best_of(self.like_search, options['repeat'], user, text, options['limit'])
+                fts = best_of(self.fts_search, options['repeat'], user, text, options['limit'])
+                self.stdout.write(f'{text:<16}{like * 1000:>12.2f}{fts * 1000:>12.2f}{like / fts:>9.1f}x')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+
+from todo_project.benchmarks import best_of, bench_user, seed_todos
+from todos.encoding import TODO_FIELDS, FastJsonResponse, format_datetimes, orjson
+from todos.models import Todo
+from todos.serializers import TodoSerializer
+
+
+BENCH_USERNAME = 'serialization-benchmark-user'
+
+
+class Command(BaseCommand):
+    help = "Compare rows/second of the TodoSerializer list path against the values() fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Todos to seed and serialize')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per path')
+
+    def drf_path(self, queryset):
+        return JsonResponse(TodoSerializer(list(queryset), many=True).data, safe=False)
+
+    def fast_path(self, queryset):
+        return FastJsonResponse(format_datetimes(list(queryset.values(*TODO_FIELDS))))
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with bench_user(BENCH_USERNAME) as user:
+            seed_todos(user, rows, lambda index: {'title': f'Benchmark todo {index}', 'description': 'x' * 80})
+            queryset = Todo.objects.filter(user=user).order_by('-created_at')
+
+            drf = best_of(self.drf_path, options['repeat'], queryset)
+            fast = best_of(self.fast_path, options['repeat'], queryset)
+
+        self.stdout.write(f"encoder: {'orjson' if orjson is not None else 'json (stdlib)'}")
+        self.stdout.write(f'TodoSerializer: {rows / drf:>12,.0f} rows/s ({drf * 1000:.1f} ms)')
+        self.stdout.write(f'values() path:  {rows / fast:>12,.0f} rows/s ({fast * 1000:.1f} ms)')
+        self.stdout.write(self.style.SUCCESS(f'speedup: {drf / fast:.1f}x'))
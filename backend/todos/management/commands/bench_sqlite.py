@@ -0,0 +1,104 @@
+import gc
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from todo_project.benchmarks import bench_user, percentile, seed_todos
+from todo_project.sqlite import SQLITE_PRAGMA_DEFAULTS
+from todos.encoding import TODO_FIELDS
+from todos.models import Todo
+from todos.writes import create_todo, toggle_todo
+
+
+BENCH_USERNAME = 'sqlite-benchmark-user'
+
+# Django's stock SQLite setup: rollback journal, deferred transactions and
+# only the sqlite3 module's default busy handler
+STOCK_PROFILE = ({**dict.fromkeys(SQLITE_PRAGMA_DEFAULTS, ''), 'journal_mode': 'DELETE'}, None)
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent read/write throughput and lock errors for stock vs tuned SQLite settings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent worker threads')
+        parser.add_argument('--ops', type=int, default=200, help='Operations per thread')
+        parser.add_argument('--write-ratio', type=float, default=0.5, help='Share of operations that write')
+        parser.add_argument('--todos', type=int, default=2000, help='Todos seeded for the benchmark user')
+
+    def use_profile(self, pragmas, transaction_mode):
+        """Point new connections at a profile; journal_mode needs the file to itself"""
+        connections.close_all()
+        settings.DATABASES['default']['OPTIONS']['transaction_mode'] = transaction_mode
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            connection.ensure_connection()
+
+    def worker(self, user, pks, options, barrier, results):
+        rng = random.Random()
+        latencies, errors = [], 0
+        barrier.wait()
+        for i in range(options['ops']):
+            started = time.perf_counter()
+            try:
+                if rng.random() >= options['write_ratio']:
+                    list(Todo.objects.filter(user=user).values(*TODO_FIELDS)[:50])
+                elif rng.random() < 0.5:
+                    create_todo(user, {'title': f'Concurrent todo {i}'})
+                else:
+                    toggle_todo(user, rng.choice(pks))
+            except OperationalError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+        connections.close_all()
+        results.append((latencies, errors))
+
+    def run(self, user, pks, options, pragmas):
+        barrier = threading.Barrier(options['threads'] + 1)
+        results = []
+        threads = [
+            threading.Thread(target=self.worker, args=(user, pks, options, barrier, results))
+            for _ in range(options['threads'])
+        ]
+        # Lock errors leave cursors in traceback cycles. If the collector
+        # frees one from another thread while its own connection waits on
+        # the busy handler, both threads stall until the timeout.
+        gc.collect()
+        gc.disable()
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        gc.enable()
+        latencies = [latency for thread_latencies, _ in results for latency in thread_latencies]
+        return elapsed, latencies, sum(errors for _, errors in results)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_sqlite only applies to the SQLite backend')
+
+        tuned = (getattr(settings, 'SQLITE_PRAGMAS', {}), settings.DATABASES['default']['OPTIONS'].get('transaction_mode'))
+        total = options['threads'] * options['ops']
+        self.stdout.write(f"{options['threads']} threads x {options['ops']} ops, {options['write_ratio']:.0%} writes")
+        self.stdout.write(f"{'profile':<8}{'ops/s':>10}{'errors':>8}{'err %':>8}{'p50 ms':>10}{'p99 ms':>10}")
+        with bench_user(BENCH_USERNAME) as user:
+            pks = seed_todos(user, options['todos'])
+            try:
+                for name, (pragmas, transaction_mode) in (('stock', STOCK_PROFILE), ('tuned', tuned)):
+                    self.use_profile(pragmas, transaction_mode)
+                    elapsed, latencies, errors = self.run(user, pks, options, pragmas)
+                    self.stdout.write(
+                        f'{name:<8}{total / elapsed:>10.0f}{errors:>8}{errors / total:>8.1%}'
+                        f'{percentile(latencies, 0.5) * 1000:>10.2f}{percentile(latencies, 0.99) * 1000:>10.2f}'
+                    )
+            finally:
+                # Leave the database in the configured profile
+                self.use_profile(*tuned)
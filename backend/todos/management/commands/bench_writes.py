@@ -0,0 +1,73 @@
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+
+from todo_project.benchmarks import bearer, bench_user, call_asgi, percentile, seed_todos
+from todos.writer import get_coordinator
+
+
+BENCH_USERNAME = 'writes-benchmark-user'
+
+
+class Command(BaseCommand):
+    help = "Compare write-heavy ASGI throughput and tail latency with and without the single-writer queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50, help='Number of concurrent clients')
+        parser.add_argument('--requests', type=int, default=40, help='Requests issued by each client')
+        parser.add_argument('--todos', type=int, default=500, help='Todos seeded for the benchmark user')
+
+    async def run_client(self, app, headers, pks, requests, offset, latencies):
+        errors = 0
+        body = json.dumps({'title': 'Queued todo', 'priority': 'high'}).encode()
+        for i in range(requests):
+            started = time.perf_counter()
+            # Alternate creates and toggles; every request writes
+            if (offset + i) % 2:
+                status = await call_asgi(app, 'POST', '/api/todos/', headers + [('Content-Type', 'application/json')], body)
+            else:
+                pk = pks[(offset * requests + i) % len(pks)]
+                status = await call_asgi(app, 'PATCH', f'/api/todos/{pk}/toggle/', headers)
+            latencies.append(time.perf_counter() - started)
+            if status is None or status >= 400:
+                errors += 1
+        return errors
+
+    async def run(self, clients, requests, headers, pks):
+        from todo_project.asgi import application
+
+        latencies = []
+        started = time.perf_counter()
+        errors = await asyncio.gather(*[
+            self.run_client(application, headers, pks, requests, offset, latencies)
+            for offset in range(clients)
+        ])
+        return time.perf_counter() - started, latencies, sum(errors)
+
+    # One user hammering the API is the point here, so don't throttle it
+    @override_settings(RATE_LIMITS={'ENABLED': False})
+    def handle(self, *args, **options):
+        total = options['clients'] * options['requests']
+        with bench_user(BENCH_USERNAME) as user:
+            pks = seed_todos(user, max(options['todos'], 1))
+            headers = bearer(user)
+            connections.close_all()
+
+            self.stdout.write(f"{options['clients']} clients x {options['requests']} writes")
+            self.stdout.write(f"{'mode':<8}{'req/s':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+            for name, enabled in (('direct', False), ('queued', True)):
+                with override_settings(TODO_WRITE_QUEUE=enabled):
+                    elapsed, latencies, errors = asyncio.run(
+                        self.run(options['clients'], options['requests'], headers, pks)
+                    )
+                self.stdout.write(
+                    f'{name:<8}{total / elapsed:>10.0f}{errors:>8}'
+                    + ''.join(f'{percentile(latencies, q) * 1000:>10.1f}' for q in (0.5, 0.95, 0.99))
+                )
+            coordinator = get_coordinator()
+            if coordinator.groups:
+                self.stdout.write(f'writer ran {coordinator.jobs_run} jobs in {coordinator.groups} transactions')
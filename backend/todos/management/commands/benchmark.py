@@ -0,0 +1,291 @@
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+import types
+from collections import defaultdict
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import include, path
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from todo_project.benchmarks import call_asgi, percentile, request_asgi
+from todos.models import Todo, TodoStats
+from todos.stats import counter_field
+
+
+USERNAME_PREFIX = 'benchmark-user-'
+BENCH_PASSWORD = 'benchmark-password'
+
+# Relative weights of each operation in the default traffic mix. Clients keep
+# their tokens for an hour, so logins are rare; each one is a full PBKDF2 run.
+DEFAULT_MIX = 'list=45,create=15,toggle=15,update=15,delete=9,login=1'
+OPERATIONS = ('list', 'create', 'toggle', 'update', 'delete', 'login')
+
+# The alternative view modules in the tree, so their performance can be compared
+VIEW_MODULES = {
+    'current': ('todos.views', 'accounts.views'),
+    'new': ('todos.views_new', 'accounts.views_new'),
+    'old': ('todos.views_old', 'accounts.views_old'),
+}
+
+
+def parse_mix(value):
+    """'list=40,create=15' -> {'list': 40, 'create': 15}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(f"Unknown operation {name!r} in --mix; choose from {', '.join(OPERATIONS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Invalid weight for {name!r} in --mix')
+    if not any(mix.values()):
+        raise CommandError('--mix needs at least one operation with a positive weight')
+    return mix
+
+
+def build_urlconf(variant):
+    """A URLconf serving the given view modules at the usual API paths"""
+    todos_views, accounts_views = (import_module(name) for name in VIEW_MODULES[variant])
+    todo_patterns = [
+        path('', todos_views.TodoListCreateView.as_view()),
+        path('<int:pk>/', todos_views.TodoDetailView.as_view()),
+        path('<int:pk>/toggle/', todos_views.TodoToggleView.as_view()),
+    ]
+    auth_patterns = [
+        path('register/', accounts_views.RegisterView.as_view()),
+        path('login/', accounts_views.LoginView.as_view()),
+        path('profile/', accounts_views.ProfileView.as_view()),
+    ]
+    urlconf = types.ModuleType(f'benchmark_urls_{variant}')
+    urlconf.urlpatterns = [
+        path('api/auth/', include(auth_patterns)),
+        path('api/todos/', include(todo_patterns)),
+    ]
+    return urlconf
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Client:
+    """One simulated user session: a token, its own slice of todos and a seeded RNG"""
+
+    def __init__(self, app, username, token, pks, rng, mix):
+        self.app = app
+        self.username = username
+        self.headers = [('Authorization', f'Bearer {token}')]
+        self.json_headers = self.headers + [('Content-Type', 'application/json')]
+        self.pks = pks
+        self.rng = rng
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+
+    def pick_pk(self):
+        return self.rng.choice(self.pks) if self.pks else 0
+
+    async def list(self):
+        status, _ = await request_asgi(self.app, 'GET', '/api/todos/?limit=50', self.headers)
+        return status
+
+    async def create(self):
+        body = json.dumps({'title': 'Benchmark todo', 'priority': self.rng.choice(['low', 'medium', 'high'])})
+        status, content = await request_asgi(self.app, 'POST', '/api/todos/', self.json_headers, body.encode())
+        if status == 201:
+            self.pks.append(json.loads(content)['id'])
+        return status
+
+    async def toggle(self):
+        return await call_asgi(self.app, 'PATCH', f'/api/todos/{self.pick_pk()}/toggle/', self.headers)
+
+    async def update(self):
+        body = json.dumps({'title': f'Renamed {self.rng.randrange(1000)}', 'priority': 'high'})
+        return await call_asgi(self.app, 'PUT', f'/api/todos/{self.pick_pk()}/', self.json_headers, body.encode())
+
+    async def delete(self):
+        if not self.pks:
+            return await self.create()
+        pk = self.pks.pop(self.rng.randrange(len(self.pks)))
+        return await call_asgi(self.app, 'DELETE', f'/api/todos/{pk}/', self.headers)
+
+    async def login(self):
+        body = json.dumps({'username': self.username, 'password': BENCH_PASSWORD})
+        return await call_asgi(self.app, 'POST', '/api/auth/login/', [('Content-Type', 'application/json')], body.encode())
+
+    async def run(self, requests, results):
+        for _ in range(requests):
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            started = time.perf_counter()
+            status = await getattr(self, operation)()
+            results[operation].append((time.perf_counter() - started, status))
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed users x todos, drive the ASGI application in-process with concurrent clients running "
+        "a mix of list/create/toggle/update/delete/login, and report per-endpoint throughput and latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Users to seed')
+        parser.add_argument('--todos', type=int, default=200, help='Todos seeded per user')
+        parser.add_argument('--clients', type=int, default=100, help='Number of concurrent clients')
+        parser.add_argument('--requests', type=int, default=20, help='Requests issued by each client')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX})')
+        parser.add_argument('--views', choices=sorted(VIEW_MODULES), default='current',
+                            help='Which view modules to serve the API from')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix')
+        parser.add_argument('--json', metavar='PATH',
+                            help="Also write the results as JSON to PATH ('-' for stdout instead of the table)")
+
+    def seed(self, users, todos):
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        # One hash shared by every user, so seeding doesn't pay for thousands of PBKDF2 runs
+        password = make_password(BENCH_PASSWORD)
+        User.objects.bulk_create(
+            [User(username=f'{USERNAME_PREFIX}{n}', password=password) for n in range(users)],
+            batch_size=1000,
+        )
+        seeded = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk'))
+
+        priorities = [choice for choice, _ in Todo.PRIORITY_CHOICES]
+        batch, stats = [], []
+        for user in seeded:
+            counts = dict.fromkeys(TodoStats.COUNTER_FIELDS, 0)
+            for i in range(todos):
+                todo = Todo(user=user, title=f'Benchmark todo {i}', priority=priorities[i % 3], completed=i % 4 == 0)
+                counts['total'] += 1
+                counts[counter_field(todo.completed, todo.priority)] += 1
+                batch.append(todo)
+            stats.append(TodoStats(user=user, **counts))
+            if len(batch) >= 5000:
+                Todo.objects.bulk_create(batch)
+                batch = []
+        Todo.objects.bulk_create(batch)
+        TodoStats.objects.bulk_create(stats)
+
+        pks = defaultdict(list)
+        for user_id, pk in Todo.objects.filter(user__in=seeded).values_list('user_id', 'pk').iterator():
+            pks[user_id].append(pk)
+        return seeded, pks
+
+    def build_clients(self, app, users, pks, count, mix, seed):
+        tokens = {user.pk: str(RefreshToken.for_user(user).access_token) for user in users}
+        clients = []
+        for n in range(count):
+            user = users[n % len(users)]
+            # Clients sharing a user split its todos, so one never deletes another's
+            sharing = len(range(n % len(users), count, len(users)))
+            own = pks[user.pk][n // len(users)::sharing]
+            clients.append(Client(app, user.username, tokens[user.pk], own, random.Random(seed * 100003 + n), mix))
+        return clients
+
+    async def run(self, clients, requests):
+        results = defaultdict(list)
+        started = time.perf_counter()
+        await asyncio.gather(*[client.run(requests, results) for client in clients])
+        return time.perf_counter() - started, results
+
+    def summarize(self, samples, elapsed):
+        latencies = [latency for latency, _ in samples]
+        errors = sum(1 for _, status in samples if status is None or status >= 400)
+        statuses = defaultdict(int)
+        for _, status in samples:
+            statuses[str(status)] += 1
+        return {
+            'requests': len(samples),
+            'errors': errors,
+            'throughput': len(samples) / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': max(latencies) * 1000,
+            'statuses': dict(sorted(statuses.items())),
+        }
+
+    def write_table(self, report):
+        self.stdout.write(
+            f"{report['config']['clients']} clients x {report['config']['requests']} requests, "
+            f"{report['config']['users']} users x {report['config']['todos']} todos, "
+            f"views={report['config']['views']}, {report['elapsed_s']:.2f}s"
+        )
+        header = f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        rows = list(report['endpoints'].items()) + [('total', report['total'])]
+        for name, row in rows:
+            line = (
+                f"{name:<10}{row['requests']:>10}{row['errors']:>8}{row['throughput']:>10.1f}"
+                f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+            )
+            if name == 'total':
+                self.stdout.write('-' * len(header))
+                line = self.style.SUCCESS(line)
+            self.stdout.write(line)
+        for name, row in report['endpoints'].items():
+            failed = {status: count for status, count in row['statuses'].items() if status == 'None' or int(status) >= 400}
+            if failed:
+                self.stdout.write(self.style.WARNING(f'{name}: {failed}'))
+
+    # Each client hammers the API as fast as it can, so don't throttle it
+    @override_settings(RATE_LIMITS={'ENABLED': False})
+    def handle(self, *args, **options):
+        mix = {name: weight for name, weight in parse_mix(options['mix']).items() if weight > 0}
+        if options['users'] < 1 or options['clients'] < 1 or options['requests'] < 1:
+            raise CommandError('--users, --clients and --requests must be at least 1')
+
+        started = time.perf_counter()
+        users, pks = self.seed(options['users'], options['todos'])
+        seed_seconds = time.perf_counter() - started
+        connections.close_all()
+
+        try:
+            from todo_project.asgi import application
+
+            # The handler resolves settings.ROOT_URLCONF per request, so the override is enough
+            urlconf = None if options['views'] == 'current' else build_urlconf(options['views'])
+            with override_settings(ROOT_URLCONF=urlconf or settings.ROOT_URLCONF):
+                clients = self.build_clients(application, users, pks, options['clients'], mix, options['seed'])
+                elapsed, results = asyncio.run(self.run(clients, options['requests']))
+        finally:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        report = {
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'config': {
+                key: options[key] for key in ('users', 'todos', 'clients', 'requests', 'views', 'seed')
+            } | {'mix': mix},
+            'seed_s': seed_seconds,
+            'elapsed_s': elapsed,
+            'endpoints': {name: self.summarize(results[name], elapsed) for name in OPERATIONS if results[name]},
+            'total': self.summarize([sample for samples in results.values() for sample in samples], elapsed),
+        }
+
+        if options['json'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"seeded {options['users'] * options['todos']:,} todos in {seed_seconds:.2f}s")
+        self.write_table(report)
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"wrote {options['json']}")
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from todos.filters import apply_filters, apply_ordering
+from todos.models import Todo
+
+
+class Command(BaseCommand):
+    help = "Print the SQLite EXPLAIN QUERY PLAN for the queries behind each todo endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=1, help='User id to plug into the queries')
+
+    def get_queries(self, user_id):
+        """Querysets matching what each endpoint actually runs"""
+        now = timezone.now()
+        todos = Todo.objects.filter(user_id=user_id)
+        return [
+            ('GET /api/todos/', todos.order_by('-created_at')),
+            ('GET /api/todos/?limit=50', todos.order_by('-created_at', '-id')[:51]),
+            ('GET /api/todos/?cursor=<next>', todos.order_by('-created_at', '-id').filter(created_at__lte=now).filter(
+                Q(created_at__lt=now) | Q(created_at=now, id__lt=1)
+            )[:51]),
+            ('GET /api/todos/?cursor=<previous>', todos.order_by('created_at', 'id').filter(created_at__gte=now).filter(
+                Q(created_at__gt=now) | Q(created_at=now, id__gt=1)
+            )[:51]),
+            ('GET/PUT/DELETE /api/todos/<pk>/', todos.filter(pk=1)),
+            ('PATCH /api/todos/<pk>/toggle/', todos.filter(pk=1)),
+            ('GET /api/todos/?completed=false', apply_filters(todos, {'completed': 'false'}).order_by('-created_at')),
+            ('GET /api/todos/?priority=high', apply_filters(todos, {'priority': 'high'}).order_by('-created_at')),
+            ('GET /api/todos/?due_after=...&due_before=...', apply_filters(
+                todos, {'due_after': '2025-01-01', 'due_before': '2025-02-01'}
+            ).order_by('-created_at')),
+            ('GET /api/todos/?overdue=true', apply_filters(todos, {'overdue': 'true'}).order_by('-created_at')),
+            ('GET /api/todos/?ordering=due_date', apply_ordering(todos, 'due_date')),
+            ('GET /api/todos/?ordering=-updated_at', apply_ordering(todos, '-updated_at')),
+            ('GET /api/todos/?ordering=priority', apply_ordering(todos, 'priority')),
+        ]
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('explain_queries only understands SQLite query plans')
+
+        problems = 0
+        for label, queryset in self.get_queries(options['user']):
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(plan)
+
+            # A bare SCAN of the table or a temp B-tree means the index was missed
+            lines = plan.splitlines()
+            full_scan = any('SCAN' in line and 'INDEX' not in line for line in lines)
+            temp_sort = any('USE TEMP B-TREE' in line for line in lines)
+            if full_scan or temp_sort:
+                problems += 1
+                self.stdout.write(self.style.WARNING('  -> table scan or temp B-tree sort'))
+            self.stdout.write('')
+
+        if problems:
+            self.stdout.write(self.style.ERROR(f'{problems} query plan(s) need a table scan or temp B-tree sort'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All queries are served by an index'))
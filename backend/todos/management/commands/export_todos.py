@@ -0,0 +1,33 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from todos.dump import EXPORT_CHUNK_SIZE, write_dump
+
+
+class Command(BaseCommand):
+    help = "Stream every user and todo into a gzip NDJSON dump for import_todos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Dump file to write, e.g. todos.ndjson.gz')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Rows fetched per round trip')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to export from')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(rows):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{rows:,} rows ({rows / elapsed:,.0f} rows/s)', ending='\r')
+
+        header = write_dump(options['path'], options['chunk_size'], progress, using=options['database'])
+        elapsed = time.perf_counter() - started
+        total = sum(section['rows'] for section in header['sections'])
+        counts = ', '.join(f"{section['rows']:,} {section['name']}" for section in header['sections'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {counts} to {options['path']} "
+            f"({os.path.getsize(options['path']) / 1024 / 1024:.1f} MiB) "
+            f'in {elapsed:.1f}s, {total / max(elapsed, 1e-9):,.0f} rows/s'
+        ))
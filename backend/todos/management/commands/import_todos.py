@@ -0,0 +1,90 @@
+import gzip
+import json
+import os
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from todos.dump import IMPORT_BATCH_SIZE, SECTIONS, DumpError, iter_batches, preserve_timestamps, read_header
+
+
+class Command(BaseCommand):
+    help = "Restore users and todos from an export_todos dump with batched bulk inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Dump file written by export_todos')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Rows per transaction')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Continue after the last committed batch of an interrupted import',
+        )
+
+    def read_checkpoint(self, path, header):
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('created_at') != header['created_at']:
+            raise CommandError(f'{path} belongs to a different dump; delete it to start over')
+        return checkpoint['rows']
+
+    def write_checkpoint(self, path, header, rows):
+        # Write then rename so a crash never leaves a half-written checkpoint
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'created_at': header['created_at'], 'rows': rows}, f)
+        os.replace(f'{path}.tmp', path)
+
+    def handle(self, *args, **options):
+        checkpoint_path = f"{options['path']}.progress"
+        started = time.perf_counter()
+
+        with gzip.open(options['path'], 'rb') as dump:
+            try:
+                header = read_header(dump)
+            except DumpError as e:
+                raise CommandError(str(e))
+            total = sum(section['rows'] for section in header['sections'])
+
+            skip = self.read_checkpoint(checkpoint_path, header) if options['resume'] else 0
+            if skip:
+                self.stdout.write(f'Resuming after {skip:,} of {total:,} rows')
+            committed = skip
+            inserted = 0
+
+            # Each batch commits on its own and the checkpoint is only
+            # advanced afterwards. ignore_conflicts makes replaying a batch
+            # that committed just before a crash harmless.
+            with preserve_timestamps():
+                try:
+                    for model, batch in iter_batches(dump, header, skip, options['batch_size']):
+                        with transaction.atomic():
+                            # bulk_create returns every object even when ignore_conflicts
+                            # drops the row, so count the ids already present first
+                            present = model.objects.filter(pk__in=[obj.pk for obj in batch]).count()
+                            model.objects.bulk_create(batch, ignore_conflicts=True)
+                        inserted += len(batch) - present
+                        committed += len(batch)
+                        self.write_checkpoint(checkpoint_path, header, committed)
+                        rate = (committed - skip) / (time.perf_counter() - started)
+                        self.stdout.write(f'{committed:,}/{total:,} rows ({rate:,.0f} rows/s)', ending='\r')
+                except DumpError as e:
+                    raise CommandError(str(e))
+
+        # Explicit ids leave sequences behind on backends that have them
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [model for _, model, _ in SECTIONS]):
+                cursor.execute(sql)
+        # bulk_create skips the per-write stats bookkeeping
+        call_command('reconcile_stats', stdout=self.stdout)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {inserted:,} rows from {options['path']}, "
+            f'skipped {committed - skip - inserted:,} already present, '
+            f'in {elapsed:.1f}s, {(committed - skip) / max(elapsed, 1e-9):,.0f} rows/s'
+        ))
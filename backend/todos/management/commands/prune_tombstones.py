@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from todos.changes import get_tombstone_retention, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete todo tombstones older than TODO_TOMBSTONE_RETENTION_DAYS"
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {deleted} tombstone(s) older than {get_tombstone_retention().days} day(s)'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from todos.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Recreate the todo FTS5 table and triggers if missing and reindex every todo"
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The full-text index is only maintained on SQLite')
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Todo search index rebuilt'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from todos.models import TodoStats
+from todos.stats import compute_all_counts
+
+
+class Command(BaseCommand):
+    help = "Rebuild every user's TodoStats counters in bulk and report any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fresh = compute_all_counts()
+            existing = TodoStats.objects.in_bulk()
+            empty = dict.fromkeys(TodoStats.COUNTER_FIELDS, 0)
+
+            to_create, to_update = [], []
+            for user_id in fresh.keys() | existing.keys():
+                counts = fresh.get(user_id, empty)
+                stats = existing.get(user_id)
+                if stats is None:
+                    to_create.append(TodoStats(user_id=user_id, **counts))
+                    continue
+                drift = {
+                    field: counts[field] - getattr(stats, field)
+                    for field in TodoStats.COUNTER_FIELDS
+                    if counts[field] != getattr(stats, field)
+                }
+                if drift:
+                    self.stdout.write(self.style.WARNING(f'user {user_id}: drift {drift}'))
+                    for field, value in counts.items():
+                        setattr(stats, field, value)
+                    # Rows written behind the stats' back (e.g. an import) change the list too
+                    stats.version = F('version') + 1
+                    to_update.append(stats)
+
+            if not options['dry_run']:
+                TodoStats.objects.bulk_create(to_create, batch_size=1000)
+                TodoStats.objects.bulk_update(to_update, [*TodoStats.COUNTER_FIELDS, 'version'], batch_size=1000)
+
+        verb = 'Would fix' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(to_update)} drifted and {len(to_create)} missing stats row(s) '
+            f'across {len(fresh.keys() | existing.keys())} user(s)'
+        ))
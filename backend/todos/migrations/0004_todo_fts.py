@@ -0,0 +1,64 @@
+from django.db import migrations
+
+
+FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS todos_todo_fts USING fts5(
+        title, description,
+        content='todos_todo', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_todo_fts_ai AFTER INSERT ON todos_todo BEGIN
+        INSERT INTO todos_todo_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_todo_fts_ad AFTER DELETE ON todos_todo BEGIN
+        INSERT INTO todos_todo_fts(todos_todo_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_todo_fts_au AFTER UPDATE OF title, description ON todos_todo BEGIN
+        INSERT INTO todos_todo_fts(todos_todo_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO todos_todo_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO todos_todo_fts(todos_todo_fts) VALUES ('rebuild')",
+]
+
+DROP_FTS = [
+    "DROP TRIGGER IF EXISTS todos_todo_fts_ai",
+    "DROP TRIGGER IF EXISTS todos_todo_fts_ad",
+    "DROP TRIGGER IF EXISTS todos_todo_fts_au",
+    "DROP TABLE IF EXISTS todos_todo_fts",
+]
+
+
+def create_fts(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends fall back to icontains search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in FTS_SCHEMA:
+        schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_FTS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0003_todo_tombstones'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
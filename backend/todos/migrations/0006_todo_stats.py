@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('todos', '0005_todo_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TodoStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='todo_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('open_low', models.IntegerField(default=0)),
+                ('open_medium', models.IntegerField(default=0)),
+                ('open_high', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0006_todo_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todostats',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -20,6 +20,58 @@ class Todo(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # List endpoint: filter by user, newest first, id as keyset tiebreaker
+            models.Index(fields=['user', '-created_at', '-id'], name='todo_user_created_idx'),
+            # completed/priority filters keep the default newest-first order
+            models.Index(fields=['user', 'completed', '-created_at', '-id'], name='todo_user_done_created_idx'),
+            models.Index(fields=['user', 'priority', '-created_at', '-id'], name='todo_user_prio_created_idx'),
+            # due_date range filters and ?ordering=due_date
+            models.Index(fields=['user', 'due_date', 'id'], name='todo_user_due_idx'),
+            # Delta sync walks a user's rows in (updated_at, id) order
+            models.Index(fields=['user', 'updated_at', 'id'], name='todo_user_updated_idx'),
+            # Upcoming/overdue lookups only ever care about open todos
+            models.Index(
+                fields=['user', 'due_date'],
+                name='todo_user_open_due_idx',
+                condition=models.Q(completed=False),
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class TodoTombstone(models.Model):
+    """Records a deleted todo so delta-sync clients can drop their copy"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='todo_tombstones')
+    todo_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'Todo {self.todo_id} deleted at {self.deleted_at}'
+
+
+class TodoStats(models.Model):
+    """Per-user dashboard counters, adjusted in the same transaction as every todo write"""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='todo_stats')
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    open_low = models.IntegerField(default=0)
+    open_medium = models.IntegerField(default=0)
+    open_high = models.IntegerField(default=0)
+    # Bumped by every write to the user's todos; the list ETag is built from it
+    version = models.BigIntegerField(default=0)
+
+    COUNTER_FIELDS = ['total', 'completed', 'open_low', 'open_medium', 'open_high']
+
+    def __str__(self):
+        return f'Todo stats for user {self.user_id}'
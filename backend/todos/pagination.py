@@ -0,0 +1,100 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue"""
+
+
+def get_page_size_limits():
+    """Return (default, maximum) page sizes, overridable from settings"""
+    default = getattr(settings, 'TODO_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    maximum = getattr(settings, 'TODO_MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+    return default, maximum
+
+
+def parse_limit(value):
+    """Parse the ``limit`` query parameter, clamping it to the maximum page size"""
+    default, maximum = get_page_size_limits()
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be a positive integer')
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, maximum)
+
+
+def encode_cursor(row, direction):
+    """Build an opaque cursor pointing at a ``values()`` row for the given direction ('n' or 'p')"""
+    payload = json.dumps(
+        {'c': row['created_at'].isoformat(), 'i': row['id'], 'd': direction},
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id, direction) from a cursor produced by ``encode_cursor``"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at = datetime.fromisoformat(payload['c'])
+        pk = int(payload['i'])
+        direction = payload['d']
+    except (TypeError, ValueError, KeyError, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+    if direction not in ('n', 'p'):
+        raise InvalidCursor('Invalid cursor')
+    return created_at, pk, direction
+
+
+async def paginate(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Keyset-paginate a ``values()`` queryset on (-created_at, -id).
+
+    Only ``limit + 1`` rows are fetched per page and the position is carried in
+    the cursor itself, so a page deep in the list costs the same as the first.
+    Returns (rows, next_cursor, previous_cursor).
+    """
+    if cursor is None:
+        created_at, pk, direction = None, None, 'n'
+    else:
+        created_at, pk, direction = decode_cursor(cursor)
+
+    if direction == 'n':
+        queryset = queryset.order_by('-created_at', '-id')
+        if cursor is not None:
+            # The plain range lets SQLite seek into the index instead of scanning the user's rows
+            queryset = queryset.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+    else:
+        # Walk backwards in ascending order, then flip the page back around
+        queryset = queryset.order_by('created_at', 'id').filter(created_at__gte=created_at).filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        )
+
+    rows = [row async for row in queryset[:limit + 1]]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if direction == 'n':
+        next_cursor = encode_cursor(rows[-1], 'n') if has_more else None
+        previous_cursor = encode_cursor(rows[0], 'p') if cursor is not None and rows else None
+    else:
+        rows.reverse()
+        next_cursor = encode_cursor(rows[-1], 'n') if rows else None
+        previous_cursor = encode_cursor(rows[0], 'p') if has_more else None
+
+    return rows, next_cursor, previous_cursor
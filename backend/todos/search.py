@@ -0,0 +1,102 @@
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import Q
+
+from .models import Todo
+
+
+FTS_TABLE = 'todos_todo_fts'
+
+# External-content FTS5 index over todos_todo, kept in sync by triggers.
+# Django rebuilds SQLite tables on some ALTERs, which drops triggers, so the
+# rebuild_search_index command re-runs these statements.
+FTS_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='todos_todo', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON todos_todo BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON todos_todo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON todos_todo BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+# Title matches count ten times as much as description matches
+RANK_SQL = f'bm25({FTS_TABLE}, 10.0, 1.0)'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so user input can never inject
+    FTS5 operators and ``"wor"`` matches "work" and "world".
+    """
+    tokens = TOKEN_RE.findall(text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_ids(user_id, match_query, limit):
+    """Return ids of the user's todos matching ``match_query``, best match first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT t.id
+            FROM {FTS_TABLE}
+            JOIN todos_todo t ON t.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s AND t.user_id = %s
+            ORDER BY {RANK_SQL}
+            LIMIT %s
+            """,
+            [match_query, user_id, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+async def search_todos(user, text, fields, limit):
+    """
+    Ranked search over the user's todo titles and descriptions.
+
+    Returns ``values()`` rows for ``fields``. Backends without FTS5 fall back
+    to an unranked icontains scan.
+    """
+    tokens = TOKEN_RE.findall(text or '')
+    if connection.vendor != 'sqlite':
+        condition = Q()
+        for token in tokens:
+            condition &= Q(title__icontains=token) | Q(description__icontains=token)
+        queryset = Todo.objects.filter(condition, user=user).values(*fields)[:limit]
+        return [row async for row in queryset]
+
+    ids = await sync_to_async(search_ids)(user.pk, build_match_query(text), limit)
+    rows = {row['id']: row async for row in Todo.objects.filter(pk__in=ids).values(*fields)}
+    return [rows[pk] for pk in ids if pk in rows]
+
+
+def rebuild_index():
+    """Recreate the FTS table and triggers if missing and reindex every todo"""
+    with connection.cursor() as cursor:
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
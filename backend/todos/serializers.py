@@ -3,6 +3,13 @@ from .models import Todo
 
 
 class TodoSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Trim to a sparse fieldset, e.g. TodoSerializer(todo, fields=('id', 'title'))
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Todo
         fields = ['id', 'title', 'description', 'completed', 'priority', 'created_at', 'updated_at', 'due_date']
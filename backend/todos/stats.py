@@ -0,0 +1,106 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Todo, TodoStats
+from .writer import run_write
+
+
+def counter_field(completed, priority):
+    """The TodoStats column a todo in this state is counted under, besides total"""
+    return 'completed' if completed else f'open_{priority}'
+
+
+def count_todo(delta, todo, sign):
+    """Add (sign=1) or remove (sign=-1) a todo's contribution to a stats delta"""
+    delta['total'] += sign
+    delta[counter_field(todo.completed, todo.priority)] += sign
+    return delta
+
+
+def apply_delta(user_id, delta):
+    """
+    Adjust a user's counters with one UPDATE ... SET x = x + n, and bump
+    their list version.
+
+    Must run inside the transaction that made the todo change, even when
+    the delta is empty (an edit that doesn't move the todo between
+    counters), so the list ETag changes with it. If the user has no stats
+    row yet it is built from scratch instead, which already includes the
+    change.
+    """
+    changes = {field: F(field) + amount for field, amount in delta.items() if amount}
+    if not TodoStats.objects.filter(user_id=user_id).update(**changes, version=F('version') + 1):
+        rebuild_user_stats(user_id)
+
+
+def counter_aggregates():
+    """Aggregates for each counter, aliased so they can't shadow the completed field"""
+    aggregates = {
+        'total_count': Count('id'),
+        'completed_count': Count('id', filter=Q(completed=True)),
+    }
+    for priority, _ in Todo.PRIORITY_CHOICES:
+        aggregates[f'open_{priority}_count'] = Count('id', filter=Q(completed=False, priority=priority))
+    return aggregates
+
+
+def strip_suffix(row):
+    return {field: row[f'{field}_count'] for field in TodoStats.COUNTER_FIELDS}
+
+
+def rebuild_user_stats(user_id):
+    """
+    Recount a user's todos from scratch, creating their stats row if needed;
+    bumps the version.
+
+    The count and the write share one transaction, so no todo write can
+    land between them. From async code, go through run_write so the
+    rebuild also queues behind the writes already waiting.
+    """
+    with transaction.atomic():
+        counts = strip_suffix(Todo.objects.filter(user_id=user_id).aggregate(**counter_aggregates()))
+        if not TodoStats.objects.filter(user_id=user_id).update(**counts, version=F('version') + 1):
+            TodoStats.objects.get_or_create(user_id=user_id, defaults=counts)
+        return TodoStats.objects.get(user_id=user_id)
+
+
+def compute_all_counts():
+    """Fresh counters for every user with todos, from one GROUP BY query"""
+    rows = Todo.objects.order_by().values('user_id').annotate(**counter_aggregates())
+    return {row['user_id']: strip_suffix(row) for row in rows}
+
+
+async def get_stats(user):
+    """
+    Dashboard counters for a user.
+
+    Totals come from the maintained TodoStats row. Overdue and due-today
+    depend on the clock, so they are counted from the partial open-todo
+    (user, due_date) index in one range scan.
+    """
+    try:
+        stats = await TodoStats.objects.aget(user_id=user.pk)
+    except TodoStats.DoesNotExist:
+        # First read for a user whose todos predate the stats table
+        stats = await run_write(rebuild_user_stats, user.pk)
+
+    now = timezone.now()
+    today = datetime.combine(timezone.localdate(now), time.min, tzinfo=timezone.get_current_timezone())
+    tomorrow = today + timedelta(days=1)
+    due = await Todo.objects.filter(
+        user=user, completed=False, due_date__lt=tomorrow
+    ).aaggregate(
+        overdue=Count('id', filter=Q(due_date__lt=now)),
+        due_today=Count('id', filter=Q(due_date__gte=today, due_date__lt=tomorrow)),
+    )
+
+    return {
+        'total': stats.total,
+        'completed': stats.completed,
+        'open': {priority: getattr(stats, f'open_{priority}') for priority, _ in Todo.PRIORITY_CHOICES},
+        'overdue': due['overdue'],
+        'due_today': due['due_today'],
+    }
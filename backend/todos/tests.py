@@ -1,3 +1,937 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.http import Http404, JsonResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import encoding, stats
+from .events import RESYNC, Broker, EventStreamResponse, UnixSocketBackend, event_stream
+from .models import Todo, TodoStats, TodoTombstone
+from .serializers import TodoSerializer
+from .stats import compute_all_counts
+from .conditional import list_validators
+from .dump import write_dump
+from .search import FTS_TABLE
+from .writer import WriteCoordinator, run_write
+from .writes import create_todo
+
+
+async def read_stream(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+class FastSerializationParityTests(TestCase):
+    """The values() fast path must produce exactly what TodoSerializer does"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('parity', password='parity-password')
+        Todo.objects.bulk_create([
+            Todo(user=cls.user, title='Plain'),
+            Todo(user=cls.user, title='Unicode ✓ "quoted"', description='line\nbreak', priority='high',
+                 due_date=datetime(2030, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc)),
+            Todo(user=cls.user, title='Micro', completed=True, priority='low',
+                 due_date=datetime(2030, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc)),
+        ])
+
+    def setUp(self):
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        queryset = Todo.objects.filter(user=self.user).order_by('-created_at')
+        self.expected = JsonResponse(TodoSerializer(queryset, many=True).data, safe=False).content
+
+    def served(self, path):
+        response = self.client.get(path, headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            return async_to_sync(read_stream)(response)
+        return response.content
+
+    def assert_served(self, expected):
+        self.assertEqual(self.served('/api/todos/'), expected)
+        self.assertEqual(self.served('/api/todos/?stream=1'), expected)
+
+    def test_stdlib_encoder_serves_serializer_bytes(self):
+        with mock.patch.multiple(encoding, orjson=None, ITEM_SEPARATOR=b', '):
+            self.assert_served(self.expected)
+
+    @skipIf(encoding.orjson is None, 'orjson is not installed')
+    def test_orjson_encoder_serves_serializer_data(self):
+        # orjson writes compact JSON, so compare with what it makes of the serializer output
+        expected = encoding.orjson.dumps(json.loads(self.expected))
+        with mock.patch.object(encoding, 'ITEM_SEPARATOR', b','):
+            self.assert_served(expected)
+
+
+@override_settings(RATE_LIMITS={'ENABLED': False})
+class APITestCase(TestCase):
+    """Creates ``self.user`` with a bearer token for the async API views"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='owner-password')
+        cls.other = User.objects.create_user('other', password='other-password')
+
+    def setUp(self):
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def get(self, path, params=None, **headers):
+        return self.client.get(path, params or {}, headers={**self.auth, **headers})
+
+    def send(self, method, path, data=None):
+        return getattr(self.client, method)(
+            path, json.dumps(data) if data is not None else None,
+            content_type='application/json', headers=self.auth,
+        )
+
+
+    def assert_stats_match(self, user=None):
+        """The maintained TodoStats row must equal a fresh GROUP BY over the todos"""
+        user = user or self.user
+        stats = TodoStats.objects.get(user=user)
+        fresh = compute_all_counts().get(user.pk, dict.fromkeys(TodoStats.COUNTER_FIELDS, 0))
+        self.assertEqual({field: getattr(stats, field) for field in TodoStats.COUNTER_FIELDS}, fresh)
+
+
+class CursorPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Todo.objects.bulk_create([Todo(user=cls.user, title=f'Todo {index}') for index in range(7)])
+        # Three todos share each timestamp, so pages have to break ties on id
+        base = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+        for position, todo in enumerate(Todo.objects.filter(user=cls.user).order_by('id')):
+            Todo.objects.filter(pk=todo.pk).update(created_at=base + timedelta(minutes=position // 3))
+        Todo.objects.create(user=cls.other, title='Not yours')
+
+    def expected_ids(self):
+        return list(Todo.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_forward_then_back_visits_every_todo_once(self):
+        pages = []
+        response = self.get('/api/todos/', {'limit': 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            pages.append([todo['id'] for todo in body['results']])
+            if body['next'] is None:
+                break
+            response = self.get('/api/todos/', {'limit': 2, 'cursor': body['next']})
+        self.assertEqual([pk for page in pages for pk in page], self.expected_ids())
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+        backwards = []
+        previous = body['previous']
+        while previous is not None:
+            body = self.get('/api/todos/', {'limit': 2, 'cursor': previous}).json()
+            backwards.insert(0, [todo['id'] for todo in body['results']])
+            previous = body['previous']
+        self.assertEqual(backwards, pages[:-1])
+
+    def test_sparse_fields_still_paginate(self):
+        body = self.get('/api/todos/', {'limit': 3, 'fields': 'title'}).json()
+        self.assertEqual(set(body['results'][0]), {'id', 'title'})
+        body = self.get('/api/todos/', {'limit': 3, 'fields': 'title', 'cursor': body['next']}).json()
+        self.assertEqual([todo['id'] for todo in body['results']], self.expected_ids()[3:6])
+
+    def test_malformed_cursor_is_rejected(self):
+        bad_direction = base64.urlsafe_b64encode(b'{"c":"2030-01-01T00:00:00+00:00","i":1,"d":"x"}').decode()
+        for cursor in ('not-a-cursor', '!!!', bad_direction):
+            response = self.get('/api/todos/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+    def test_limit_must_be_positive(self):
+        self.assertEqual(self.get('/api/todos/', {'limit': 0}).status_code, 400)
+        self.assertEqual(self.get('/api/todos/', {'limit': 'ten'}).status_code, 400)
+
+
+class ListValidatorTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.todos = Todo.objects.bulk_create([Todo(user=cls.user, title=f'Todo {index}') for index in range(3)])
+
+    def assert_changes_etag(self, write):
+        etag = self.get('/api/todos/')['ETag']
+        self.assertEqual(self.get('/api/todos/', If_None_Match=etag).status_code, 304)
+        write()
+        response = self.get('/api/todos/', If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_every_write_changes_the_list_etag(self):
+        pk = self.todos[0].pk
+        self.assert_changes_etag(lambda: self.send('post', '/api/todos/', {'title': 'New'}))
+        self.assert_changes_etag(lambda: self.send('put', f'/api/todos/{pk}/', {'title': 'Renamed'}))
+        self.assert_changes_etag(lambda: self.send('patch', f'/api/todos/{pk}/toggle/'))
+        self.assert_changes_etag(lambda: self.send('delete', f'/api/todos/{pk}/'))
+        self.assert_changes_etag(lambda: self.send('post', '/api/todos/batch/', {
+            'operations': [{'op': 'toggle', 'id': self.todos[1].pk}],
+        }))
+
+    def test_other_users_writes_keep_the_etag(self):
+        etag = self.get('/api/todos/')['ETag']
+        Todo.objects.create(user=self.other, title='Elsewhere')
+        self.client.post(
+            '/api/todos/', {'title': 'Elsewhere'}, content_type='application/json',
+            headers={'Authorization': f'Bearer {RefreshToken.for_user(self.other).access_token}'},
+        )
+        self.assertEqual(self.get('/api/todos/', If_None_Match=etag).status_code, 304)
+
+    def test_list_has_no_last_modified(self):
+        response = self.get('/api/todos/')
+        self.assertNotIn('Last-Modified', response)
+        # If-Modified-Since alone can never produce a 304, so a delete is always seen
+        self.send('delete', f'/api/todos/{self.todos[2].pk}/')
+        response = self.get('/api/todos/', If_Modified_Since='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_cursor_page_validators_do_not_scan_the_list(self):
+        first = self.get('/api/todos/', {'limit': 1}).json()
+        with self.assertNumQueries(2):
+            # One primary-key read of the version, one page query
+            response = self.get('/api/todos/', {'limit': 1, 'cursor': first['next']})
+        self.assertEqual(response.status_code, 200)
+
+
+class BatchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.first = Todo.objects.create(user=cls.user, title='First', priority='high')
+        cls.second = Todo.objects.create(user=cls.user, title='Second', completed=True)
+        cls.foreign = Todo.objects.create(user=cls.other, title='Not yours')
+
+    def batch(self, *operations):
+        return self.send('post', '/api/todos/batch/', {'operations': list(operations)})
+
+    def test_mixed_operations(self):
+        response = self.batch(
+            {'op': 'create', 'data': {'title': 'Created', 'priority': 'low'}},
+            {'op': 'update', 'id': self.first.pk, 'data': {'title': 'Renamed'}},
+            {'op': 'toggle', 'id': self.second.pk},
+            {'op': 'delete', 'id': self.first.pk},
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], [201, 200, 200, 204])
+        self.assertEqual(results[0]['data']['title'], 'Created')
+        self.assertEqual(results[1]['data']['title'], 'Renamed')
+        self.assertFalse(results[2]['data']['completed'])
+
+        self.assertTrue(Todo.objects.filter(pk=results[0]['data']['id'], user=self.user).exists())
+        self.assertFalse(Todo.objects.filter(pk=self.first.pk).exists())
+        self.assertFalse(Todo.objects.get(pk=self.second.pk).completed)
+        self.assertEqual(
+            list(TodoTombstone.objects.filter(user=self.user).values_list('todo_id', flat=True)), [self.first.pk]
+        )
+        self.assert_stats_match()
+
+    def test_each_result_reports_the_state_after_its_own_operation(self):
+        results = self.batch(
+            {'op': 'update', 'id': self.first.pk, 'data': {'title': 'Renamed', 'completed': False}},
+            {'op': 'toggle', 'id': self.first.pk},
+            {'op': 'toggle', 'id': self.first.pk},
+        ).json()['results']
+        self.assertEqual([result['data']['completed'] for result in results], [False, True, False])
+        self.assertEqual(results[1]['data']['title'], 'Renamed')
+
+    def test_other_users_todos_are_not_found(self):
+        results = self.batch(
+            {'op': 'delete', 'id': self.foreign.pk},
+            {'op': 'toggle', 'id': self.foreign.pk},
+            {'op': 'update', 'id': self.foreign.pk, 'data': {'title': 'Mine now'}},
+        ).json()['results']
+        self.assertEqual([result['status'] for result in results], [404, 404, 404])
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.title, 'Not yours')
+        self.assertFalse(self.foreign.completed)
+
+    def test_invalid_operations_fail_alone(self):
+        results = self.batch(
+            {'op': 'rename', 'id': self.first.pk},
+            {'op': 'delete', 'id': True},
+            {'op': 'delete', 'id': str(self.first.pk)},
+            {'op': 'create', 'data': {'priority': 'urgent'}},
+            {'op': 'delete', 'id': self.first.pk},
+            {'op': 'toggle', 'id': self.first.pk},
+        ).json()['results']
+        self.assertEqual([result['status'] for result in results], [400, 400, 400, 400, 204, 404])
+        self.assertIn('title', results[3]['errors'])
+        self.assertIn('priority', results[3]['errors'])
+        # A bool id must not be read as todo 1
+        self.assertTrue(Todo.objects.filter(pk=self.second.pk).exists())
+
+    def test_malformed_payload(self):
+        self.assertEqual(self.send('post', '/api/todos/batch/', {'operations': 'all'}).status_code, 400)
+        self.assertEqual(self.send('post', '/api/todos/batch/', [1, 2]).status_code, 400)
+        with self.settings(TODO_BATCH_MAX_OPERATIONS=2):
+            response = self.batch(*[{'op': 'toggle', 'id': self.first.pk}] * 3)
+        self.assertEqual(response.status_code, 400)
+
+    def test_failure_rolls_back_the_whole_batch(self):
+        with mock.patch('todos.batch.record_tombstones', side_effect=RuntimeError('disk full')):
+            response = self.batch(
+                {'op': 'create', 'data': {'title': 'Created'}},
+                {'op': 'toggle', 'id': self.second.pk},
+                {'op': 'delete', 'id': self.first.pk},
+            )
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(Todo.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Todo.objects.get(pk=self.second.pk).completed)
+        self.assertFalse(TodoTombstone.objects.exists())
+
+
+class ChangesTests(APITestCase):
+    def changes(self, **params):
+        response = self.get('/api/todos/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sync(self, since, limit=2):
+        """Follow has_more to the end, returning (changed ids, deleted ids, token)"""
+        changed, deleted = [], []
+        while True:
+            page = self.changes(since=since, limit=limit)
+            changed += [todo['id'] for todo in page['changed']]
+            deleted += page['deleted']
+            since = page['sync_token']
+            if not page['has_more']:
+                return changed, deleted, since
+
+    def test_first_sync_returns_every_live_todo_without_tombstones(self):
+        todos = [Todo.objects.create(user=self.user, title=f'Todo {index}') for index in range(5)]
+        Todo.objects.create(user=self.other, title='Not yours')
+        self.send('delete', f'/api/todos/{todos[0].pk}/')
+
+        page = self.changes()
+        self.assertEqual([todo['id'] for todo in page['changed']], [todo.pk for todo in todos[1:]])
+        self.assertEqual(page['deleted'], [])
+        self.assertFalse(page['has_more'])
+
+    def test_paging_and_tombstones(self):
+        todos = [Todo.objects.create(user=self.user, title=f'Todo {index}') for index in range(5)]
+        first = self.changes(limit=2)
+        self.assertTrue(first['has_more'])
+        changed, deleted, token = self.sync(first['sync_token'])
+        self.assertEqual([todo['id'] for todo in first['changed']] + changed, [todo.pk for todo in todos])
+        self.assertEqual(deleted, [])
+
+        # Nothing changed since the last token
+        self.assertEqual(self.sync(token)[:2], ([], []))
+
+        self.send('patch', f'/api/todos/{todos[1].pk}/toggle/')
+        self.send('put', f'/api/todos/{todos[3].pk}/', {'title': 'Renamed'})
+        for todo in (todos[0], todos[2], todos[4]):
+            self.send('delete', f'/api/todos/{todo.pk}/')
+        Todo.objects.create(user=self.other, title='Not yours')
+
+        changed, deleted, _ = self.sync(token, limit=1)
+        self.assertEqual(changed, [todos[1].pk, todos[3].pk])
+        self.assertEqual(deleted, [todos[0].pk, todos[2].pk, todos[4].pk])
+
+    def test_expired_token(self):
+        token = self.changes()['sync_token']
+        with override_settings(TODO_TOMBSTONE_RETENTION_DAYS=1):
+            with mock.patch('django.utils.timezone.now', return_value=datetime.now(dt_timezone.utc) + timedelta(days=2)):
+                response = self.get('/api/todos/changes/', {'since': token})
+        self.assertEqual(response.status_code, 410)
+
+    def test_invalid_token(self):
+        response = self.get('/api/todos/changes/', {'since': 'not-a-token'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Invalid sync token'})
+
+
+class FilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = datetime.now(dt_timezone.utc)
+        cls.late = Todo.objects.create(user=cls.user, title='Late', priority='low', due_date=now - timedelta(days=2))
+        cls.done = Todo.objects.create(
+            user=cls.user, title='Done late', priority='high', completed=True, due_date=now - timedelta(days=1)
+        )
+        cls.soon = Todo.objects.create(user=cls.user, title='Soon', priority='high', due_date=now + timedelta(hours=1))
+        cls.later = Todo.objects.create(
+            user=cls.user, title='Later', priority='medium', due_date=datetime(2100, 1, 1, tzinfo=dt_timezone.utc)
+        )
+        cls.undated = Todo.objects.create(user=cls.user, title='Undated', priority='medium')
+        Todo.objects.create(user=cls.other, title='Not yours', due_date=now - timedelta(days=3))
+
+    def ids(self, **params):
+        response = self.get('/api/todos/', params)
+        self.assertEqual(response.status_code, 200)
+        return [todo['id'] for todo in response.json()]
+
+    def test_completed_and_priority(self):
+        self.assertEqual(self.ids(completed='true'), [self.done.pk])
+        self.assertEqual(len(self.ids(completed='no')), 4)
+        self.assertEqual(sorted(self.ids(priority='high,low')), sorted([self.late.pk, self.done.pk, self.soon.pk]))
+
+    def test_due_ranges(self):
+        self.assertEqual(
+            self.ids(due_before=datetime.now(dt_timezone.utc).isoformat(), ordering='due_date'),
+            [self.late.pk, self.done.pk],
+        )
+        self.assertEqual(self.ids(due_after='2099-12-31'), [self.later.pk])
+        self.assertEqual(self.ids(due_after='2100-01-01T00:00:00Z', due_before='2100-01-02'), [self.later.pk])
+        # Undated todos never match a due range
+        self.assertNotIn(self.undated.pk, self.ids(due_after='2000-01-01'))
+
+    def test_overdue(self):
+        self.assertEqual(self.ids(overdue='true'), [self.late.pk])
+        self.assertEqual(len(self.ids(overdue='false')), 5)
+
+    def test_overdue_lists_are_not_validated(self):
+        # A todo can become overdue without any write, so a version-based ETag would go stale
+        response = self.get('/api/todos/', {'overdue': 'true'})
+        self.assertNotIn('ETag', response)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        etag = self.get('/api/todos/')['ETag']
+        response = self.get('/api/todos/', {'overdue': 'true'}, If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_priority_ordering_uses_rank(self):
+        ordered = self.ids(ordering='-priority,due_date')
+        self.assertEqual(ordered[:2], [self.done.pk, self.soon.pk])
+        self.assertEqual(set(ordered[2:4]), {self.later.pk, self.undated.pk})
+        self.assertEqual(ordered[4], self.late.pk)
+        self.assertEqual(self.ids(ordering='priority')[0], self.late.pk)
+
+    def test_invalid_parameters(self):
+        for params in ({'completed': 'maybe'}, {'priority': 'urgent'}, {'due_before': 'tomorrow'},
+                       {'overdue': 'soon'}, {'ordering': 'title'}):
+            with self.subTest(**params):
+                self.assertEqual(self.get('/api/todos/', params).status_code, 400)
+
+
+class StatsTests(APITestCase):
+    def stats(self):
+        response = self.get('/api/todos/stats/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_writes_keep_counters_equal_to_a_recount(self):
+        ids = []
+        for title, priority in (('One', 'low'), ('Two', 'high'), ('Three', 'high')):
+            ids.append(self.send('post', '/api/todos/', {'title': title, 'priority': priority}).json()['id'])
+        self.assert_stats_match()
+
+        self.send('patch', f'/api/todos/{ids[0]}/toggle/')
+        self.assert_stats_match()
+        self.send('put', f'/api/todos/{ids[1]}/', {'title': 'Two', 'priority': 'medium'})
+        self.assert_stats_match()
+        self.send('delete', f'/api/todos/{ids[2]}/')
+        self.assert_stats_match()
+
+        self.send('post', '/api/todos/batch/', {'operations': [
+            {'op': 'create', 'data': {'title': 'Four', 'completed': True}},
+            {'op': 'toggle', 'id': ids[0]},
+            {'op': 'update', 'id': ids[1], 'data': {'title': 'Two', 'priority': 'low'}},
+            {'op': 'delete', 'id': ids[1]},
+        ]})
+        self.assert_stats_match()
+        self.assertEqual(self.stats()['open'], {'low': 1, 'medium': 0, 'high': 0})
+        self.assertEqual(self.stats()['completed'], 1)
+
+    def test_missing_row_is_rebuilt(self):
+        Todo.objects.create(user=self.user, title='Predates stats', priority='high')
+        Todo.objects.create(user=self.user, title='Done', completed=True)
+        self.assertFalse(TodoStats.objects.filter(user=self.user).exists())
+
+        stats = self.stats()
+        self.assertEqual((stats['total'], stats['completed'], stats['open']['high']), (2, 1, 1))
+        self.assert_stats_match()
+
+        # A write for a user without a row recounts instead of adding to nothing
+        TodoStats.objects.filter(user=self.user).delete()
+        self.send('post', '/api/todos/', {'title': 'New'})
+        self.assert_stats_match()
+
+    def test_reconcile_fixes_drift(self):
+        self.send('post', '/api/todos/', {'title': 'One'})
+        TodoStats.objects.filter(user=self.user).update(total=10, open_medium=0)
+        version = TodoStats.objects.get(user=self.user).version
+        call_command('reconcile_stats', stdout=io.StringIO())
+        self.assert_stats_match()
+        self.assertEqual(TodoStats.objects.get(user=self.user).version, version + 1)
+
+    def test_import_rebuilds_counters(self):
+        for title, completed in (('One', False), ('Two', True)):
+            self.send('post', '/api/todos/', {'title': title, 'completed': completed})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'todos.ndjson.gz')
+            call_command('export_todos', path, stdout=io.StringIO())
+            User.objects.all().delete()
+            call_command('import_todos', path, stdout=io.StringIO())
+        self.assert_stats_match()
+        self.assertEqual(TodoStats.objects.get(user=self.user).total, 2)
+
+
+class DumpTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('dumped', password='dumped-password')
+        cls.todo = Todo.objects.create(
+            user=cls.user, title='Precise', due_date=datetime(2030, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc)
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'todos.ndjson.gz')
+
+    def import_dump(self):
+        output = io.StringIO()
+        call_command('import_todos', self.path, stdout=output)
+        return output.getvalue()
+
+    def test_round_trip_keeps_microseconds_with_either_encoder(self):
+        expected = Todo.objects.values_list('created_at', 'updated_at', 'due_date').get()
+        for orjson in {encoding.orjson, None}:
+            with self.subTest(orjson=orjson is not None), mock.patch.object(encoding, 'orjson', orjson):
+                call_command('export_todos', self.path, stdout=io.StringIO())
+                User.objects.all().delete()
+                self.import_dump()
+                self.assertEqual(Todo.objects.values_list('created_at', 'updated_at', 'due_date').get(), expected)
+
+    def test_import_reports_rows_already_present(self):
+        call_command('export_todos', self.path, stdout=io.StringIO())
+        self.assertIn('Imported 0 rows', self.import_dump())
+        self.assertIn('skipped 2 already present', self.import_dump())
+
+        self.todo.delete()
+        output = self.import_dump()
+        self.assertIn('Imported 1 rows', output)
+        self.assertIn('skipped 1 already present', output)
+        self.assertEqual(Todo.objects.get().title, 'Precise')
+
+
+class WriteCoordinatorTests(TransactionTestCase):
+    """
+    Runs the writer thread against the test database. The in-memory test
+    database is shared between connections, so the thread's writes are
+    visible here once committed; nothing else may query while it writes.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('writer', password='writer-password')
+        self.coordinator = WriteCoordinator()
+
+    def create(self, title):
+        return Todo.objects.create(user=self.user, title=title).pk
+
+    def create_then_fail(self, title):
+        self.create(title)
+        raise Http404('Gone')
+
+    def run_together(self, *jobs):
+        """Submit ``(func, *args)`` jobs while the writer is busy, so they form one group"""
+        async def submit_all():
+            running, release = threading.Event(), threading.Event()
+
+            def hold():
+                running.set()
+                release.wait(5)
+
+            held = asyncio.ensure_future(self.coordinator.submit(hold))
+            await asyncio.get_running_loop().run_in_executor(None, running.wait, 5)
+            futures = [asyncio.ensure_future(self.coordinator.submit(*job)) for job in jobs]
+            # Let every submit reach the queue before the writer is freed
+            await asyncio.sleep(0)
+            release.set()
+            await held
+            return await asyncio.gather(*futures, return_exceptions=True)
+
+        return async_to_sync(submit_all)()
+
+    def test_waiting_jobs_commit_as_one_group(self):
+        results = self.run_together(*[(self.create, f'Todo {index}') for index in range(5)])
+        self.assertEqual((self.coordinator.groups, self.coordinator.jobs_run), (2, 6))
+        self.assertEqual(sorted(Todo.objects.values_list('pk', flat=True)), sorted(results))
+
+    def test_failed_job_rolls_back_alone_and_raises_to_its_caller(self):
+        first, failed, last = self.run_together(
+            (self.create, 'Kept'), (self.create_then_fail, 'Rolled back'), (self.create, 'Also kept')
+        )
+        self.assertEqual(self.coordinator.groups, 2)
+        self.assertIsInstance(failed, Http404)
+        self.assertEqual(sorted(Todo.objects.values_list('title', flat=True)), ['Also kept', 'Kept'])
+        self.assertEqual(Todo.objects.get(pk=first).title, 'Kept')
+        self.assertEqual(Todo.objects.get(pk=last).title, 'Also kept')
+
+    @override_settings(RATE_LIMITS={'ENABLED': False})
+    def test_views_write_through_the_queue(self):
+        auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        coordinator = self.coordinator
+        with mock.patch('todos.writer.use_write_queue', return_value=True), \
+                mock.patch('todos.writer.get_coordinator', return_value=coordinator):
+            created = self.client.post('/api/todos/', {'title': 'Queued'}, content_type='application/json', headers=auth)
+            missing = self.client.patch('/api/todos/999999/toggle/', headers=auth)
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(coordinator.jobs_run, 2)
+        self.assertTrue(Todo.objects.filter(pk=created.json()['id'], title='Queued').exists())
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.delivered = []
+        self.received = threading.Event()
+
+    def deliver(self, user_id, message):
+        self.delivered.append((user_id, message))
+        self.received.set()
+
+
+class UnixSocketBackendTests(SimpleTestCase):
+    def test_bad_datagrams_are_logged_and_skipped(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        broker = RecordingBroker()
+        backend = UnixSocketBackend(broker, directory.name)
+        backend.start()
+
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        with self.assertLogs('todos.events', 'ERROR') as logs:
+            for payload in (b'not-a-user\n{}', b'\xff\xfe', b'7\n{"type":"resync"}'):
+                sender.sendto(payload, str(backend.path))
+            self.assertTrue(broker.received.wait(5))
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(broker.delivered, [(7, '{"type":"resync"}')])
+
+
+class EventTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = Broker('todos.events.LocalBackend', queue_size=3, max_connections_per_user=2)
+        patcher = mock.patch('todos.events.broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def drain(self, subscription):
+        messages = []
+        while not subscription.queue.empty():
+            messages.append(subscription.queue.get_nowait())
+        return messages
+
+    def test_streams_only_get_their_users_events(self):
+        async def run():
+            mine, also_mine = self.broker.subscribe(self.user.pk), self.broker.subscribe(self.user.pk)
+            theirs = self.broker.subscribe(self.other.pk)
+            self.broker.publish(self.user.pk, 'for me')
+            self.broker.publish(self.other.pk, 'for them')
+            await asyncio.sleep(0)
+            self.assertEqual(self.drain(mine), ['for me'])
+            self.assertEqual(self.drain(also_mine), ['for me'])
+            self.assertEqual(self.drain(theirs), ['for them'])
+
+            stream = event_stream(mine, heartbeat=15)
+            self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+            self.broker.publish(self.other.pk, 'not mine')
+            self.broker.publish(self.user.pk, 'mine')
+            self.assertEqual(await anext(stream), 'data: mine\n\n')
+            await stream.aclose()
+            self.assertEqual(len(self.broker), 2)
+        async_to_sync(run)()
+
+    def test_overflow_is_replaced_by_one_resync(self):
+        async def run():
+            subscription = self.broker.subscribe(self.user.pk)
+            for index in range(4):
+                self.broker.publish(self.user.pk, f'event {index}')
+            await asyncio.sleep(0)
+            self.assertEqual(self.drain(subscription), [RESYNC])
+            # Later events queue up behind it as usual
+            for index in range(5):
+                self.broker.publish(self.user.pk, f'event {index}')
+            await asyncio.sleep(0)
+            self.assertEqual(self.drain(subscription), [RESYNC, 'event 4'])
+        async_to_sync(run)()
+
+    def test_close_unsubscribes_a_stream_that_never_started(self):
+        async def run():
+            response = EventStreamResponse(self.broker.subscribe(self.user.pk), heartbeat=15)
+            self.assertEqual(len(self.broker), 1)
+            response.close()
+            self.assertEqual(len(self.broker), 0)
+            self.assertEqual(self.broker.subscriptions, {})
+        async_to_sync(run)()
+
+    def test_connections_per_user_are_capped(self):
+        responses = [self.get('/api/todos/events/') for _ in range(2)]
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+        response = self.get('/api/todos/events/')
+        self.assertEqual(response.status_code, 429)
+
+        # Other users have their own allowance, and closing a stream frees a slot
+        other = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.other).access_token}'}
+        self.assertEqual(self.client.get('/api/todos/events/', **other).status_code, 200)
+        responses[0].close()
+        self.assertEqual(self.get('/api/todos/events/').status_code, 200)
+        self.assertEqual(len(self.broker.subscriptions[self.user.pk]), 2)
+
+
+class DetailFieldsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.todo = Todo.objects.create(user=self.user, title='Sparse', description='Long text', priority='high')
+        self.path = f'/api/todos/{self.todo.pk}/'
+
+    def test_only_requested_fields_are_returned(self):
+        response = self.get(self.path, {'fields': 'title, priority'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'id': self.todo.pk, 'title': 'Sparse', 'priority': 'high'})
+        self.assertEqual(set(self.get(self.path).json()), set(TodoSerializer(self.todo).data))
+
+    def test_unknown_fields_are_rejected(self):
+        for fields in ('owner', 'title,user_id', 'title,,nope'):
+            with self.subTest(fields=fields):
+                response = self.get(self.path, {'fields': fields})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Unknown field(s)', response.json()['error'])
+
+    def test_etag_depends_on_the_fields(self):
+        full = self.get(self.path)['ETag']
+        title = self.get(self.path, {'fields': 'title'})['ETag']
+        summary = self.get(self.path, {'fields': 'summary'})['ETag']
+        self.assertEqual(len({full, title, summary}), 3)
+
+        # A copy of one shape doesn't validate another
+        self.assertEqual(self.get(self.path, {'fields': 'title'}, **{'If-None-Match': title}).status_code, 304)
+        response = self.get(self.path, **{'If-None-Match': title})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('description', response.json())
+
+
+class ReturningWriteTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.todo = Todo.objects.create(user=self.user, title='Mine', priority='high')
+        self.foreign = Todo.objects.create(user=self.other, title='Not yours')
+
+    def check_toggle_and_delete(self):
+        response = self.send('patch', f'/api/todos/{self.todo.pk}/toggle/')
+        self.assertEqual(response.status_code, 200)
+        stored = Todo.objects.get(pk=self.todo.pk)
+        self.assertTrue(stored.completed)
+        self.assertEqual(response.json(), json.loads(json.dumps(TodoSerializer(stored).data)))
+        self.assertGreater(stored.updated_at, self.todo.updated_at)
+        self.assert_stats_match()
+
+        for path in (f'/api/todos/{self.foreign.pk}/toggle/', '/api/todos/999999/toggle/'):
+            self.assertEqual(self.send('patch', path).status_code, 404)
+        for path in (f'/api/todos/{self.foreign.pk}/', '/api/todos/999999/'):
+            self.assertEqual(self.send('delete', path).status_code, 404)
+        self.assertFalse(Todo.objects.get(pk=self.foreign.pk).completed)
+        self.assertFalse(TodoTombstone.objects.exists())
+
+        self.assertEqual(self.send('delete', f'/api/todos/{self.todo.pk}/').status_code, 204)
+        self.assertFalse(Todo.objects.filter(pk=self.todo.pk).exists())
+        self.assertEqual(
+            list(TodoTombstone.objects.values_list('user_id', 'todo_id')), [(self.user.pk, self.todo.pk)]
+        )
+        self.assert_stats_match()
+        self.assertEqual(self.send('delete', f'/api/todos/{self.todo.pk}/').status_code, 404)
+
+    def test_returning_statements(self):
+        self.check_toggle_and_delete()
+
+    def test_without_returning(self):
+        with mock.patch('todos.writes.supports_returning', return_value=False):
+            self.check_toggle_and_delete()
+
+
+class FileDatabaseTestCase(SimpleTestCase):
+    """
+    Runs against a migrated SQLite file under its own alias. The shared
+    in-memory test database locks whole tables, so a reader there blocks
+    writers whatever kind of transaction it is in.
+    """
+    alias = 'file'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings[cls.alias] = {
+            **connections['default'].settings_dict, 'NAME': os.path.join(cls.directory.name, 'db.sqlite3'),
+        }
+        # Added after setUpClass so the test runner doesn't try to set it up itself
+        cls.databases = {cls.alias}
+        call_command('migrate', database=cls.alias, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[cls.alias].close()
+        del connections[cls.alias]
+        del connections.settings[cls.alias]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def in_thread(self, func):
+        """Run ``func`` on a thread of its own, so on a connection of its own, and return what it returns"""
+        outcome = {}
+
+        def run():
+            try:
+                outcome['result'] = func()
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                connections[self.alias].close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+
+class DumpSnapshotTests(FileDatabaseTestCase):
+    def test_writes_go_ahead_while_a_dump_runs(self):
+        user = User.objects.db_manager(self.alias).create_user('exporter')
+        Todo.objects.using(self.alias).bulk_create(Todo(user=user, title=f'Todo {index}') for index in range(3))
+        written = []
+
+        def write():
+            with transaction.atomic(using=self.alias):
+                return Todo.objects.using(self.alias).create(user_id=user.pk, title='During the dump').pk
+
+        def progress(rows):
+            # The dump is mid-read here, holding its snapshot open
+            if not written:
+                written.append(self.in_thread(write))
+
+        with tempfile.TemporaryDirectory() as directory:
+            header = write_dump(os.path.join(directory, 'todos.ndjson.gz'), 1, progress, using=self.alias)
+
+        self.assertEqual(len(written), 1)
+        # The dump is the snapshot it started from, so the new todo isn't in it
+        self.assertEqual([section['rows'] for section in header['sections']], [1, 3])
+        self.assertTrue(Todo.objects.using(self.alias).filter(pk=written[0]).exists())
+
+
+class StatsRebuildRaceTests(TransactionTestCase):
+    def test_write_during_a_rebuild_is_counted(self):
+        user = User.objects.create_user('racer', password='racer-password')
+        Todo.objects.create(user=user, title='Predates stats')
+        racing = []
+
+        def count_then_race(row):
+            # The rebuild has counted; a write arriving now must not be lost
+            if not racing:
+                racing.append(asyncio.run_coroutine_threadsafe(run_write(create_todo, user, {'title': 'Racing'}), loop))
+                time.sleep(0.2)
+            return real_strip_suffix(row)
+
+        async def rebuild_while_writing():
+            nonlocal loop
+            loop = asyncio.get_running_loop()
+            # list_validators reads nothing after the rebuild; another read here would trip
+            # over the racing write's table lock, which only the in-memory database takes
+            await list_validators(user, RequestFactory().get('/api/todos/'))
+            await asyncio.wrap_future(racing[0])
+
+        loop = None
+        real_strip_suffix = stats.strip_suffix
+        with mock.patch('todos.writer.use_write_queue', return_value=True), \
+                mock.patch('todos.writer.get_coordinator', return_value=WriteCoordinator()), \
+                mock.patch('todos.stats.strip_suffix', count_then_race):
+            async_to_sync(rebuild_while_writing)()
+
+        self.assertEqual(Todo.objects.filter(user=user).count(), 2)
+        fresh = compute_all_counts()[user.pk]
+        stored = TodoStats.objects.get(user=user)
+        self.assertEqual({field: getattr(stored, field) for field in TodoStats.COUNTER_FIELDS}, fresh)
+
+
+class SearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.report = Todo.objects.create(user=cls.user, title='Quarterly report', description='Send to finance')
+        cls.groceries = Todo.objects.create(user=cls.user, title='Groceries', description='Milk and a report card')
+        cls.foreign = Todo.objects.create(user=cls.other, title='Quarterly report for someone else')
+
+    def search(self, q, **params):
+        response = self.get('/api/todos/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [todo['id'] for todo in response.json()]
+
+    def test_only_the_users_todos_are_found(self):
+        self.assertEqual(self.search('quarterly'), [self.report.pk])
+
+    def test_prefixes_match_and_titles_rank_first(self):
+        self.assertEqual(self.search('quart'), [self.report.pk])
+        self.assertEqual(self.search('rep'), [self.report.pk, self.groceries.pk])
+        self.assertEqual(self.search('fin rep'), [self.report.pk])
+
+    def test_search_follows_edits_and_deletes(self):
+        self.send('put', f'/api/todos/{self.groceries.pk}/', {'title': 'Hardware store', 'description': ''})
+        self.assertEqual(self.search('groceries'), [])
+        self.assertEqual(self.search('hardware'), [self.groceries.pk])
+        self.send('delete', f'/api/todos/{self.report.pk}/')
+        self.assertEqual(self.search('quarterly'), [])
+
+    def test_operator_text_is_quoted(self):
+        for q in ('"quarterly', 'quart*', 'quarterly OR groceries', 'NEAR(quarterly report)', 'report NOT milk',
+                  'title:quarterly', '^quarterly', '(report'):
+            with self.subTest(q=q):
+                self.search(q)
+        # OR is just another word that must match
+        self.assertEqual(self.search('quarterly OR groceries'), [])
+        self.assertEqual(self.search('NEAR(quarterly report)'), [])
+
+    def test_sparse_fields_and_validation(self):
+        response = self.get('/api/todos/search/', {'q': 'quarterly', 'fields': 'title'})
+        self.assertEqual(response.json(), [{'id': self.report.pk, 'title': 'Quarterly report'}])
+        self.assertEqual(self.get('/api/todos/search/', {'q': '*"()'}).status_code, 400)
+        self.assertEqual(self.get('/api/todos/search/', {'q': 'report', 'fields': 'owner'}).status_code, 400)
+
+
+class AdminSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='admin-password')
+        cls.match = Todo.objects.create(user=cls.admin, title='Renew passport')
+        Todo.objects.create(user=cls.admin, title='Book flights', description='After the passport office')
+        Todo.objects.create(user=cls.admin, title='Unrelated')
+
+    def test_changelist_search_uses_the_fts_index(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get('/admin/todos/todo/', {'q': 'passp'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(todo.title for todo in response.context['cl'].result_list), ['Book flights', 'Renew passport']
+        )
+        sql = [query['sql'] for query in queries.captured_queries if 'todos_todo' in query['sql']]
+        self.assertTrue(any(f'{FTS_TABLE} MATCH' in statement for statement in sql))
+        self.assertFalse(any('LIKE' in statement for statement in sql))
+
+    def test_operator_text_does_not_break_the_changelist(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/todos/todo/', {'q': 'passport" OR NEAR('})
+        self.assertEqual(response.status_code, 200)
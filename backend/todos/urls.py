@@ -1,8 +1,16 @@
 from django.urls import path
-from .views import TodoListCreateView, TodoDetailView, TodoToggleView
+from .views import (
+    TodoListCreateView, TodoDetailView, TodoToggleView, TodoBatchView, TodoChangesView,
+    TodoSearchView, TodoStatsView, TodoEventsView,
+)
 
 urlpatterns = [
     path('', TodoListCreateView.as_view(), name='todo-list-create'),
+    path('batch/', TodoBatchView.as_view(), name='todo-batch'),
+    path('changes/', TodoChangesView.as_view(), name='todo-changes'),
+    path('events/', TodoEventsView.as_view(), name='todo-events'),
+    path('search/', TodoSearchView.as_view(), name='todo-search'),
+    path('stats/', TodoStatsView.as_view(), name='todo-stats'),
     path('<int:pk>/', TodoDetailView.as_view(), name='todo-detail'),
     path('<int:pk>/toggle/', TodoToggleView.as_view(), name='todo-toggle'),
 ]
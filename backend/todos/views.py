@@ -1,34 +1,23 @@
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from asgiref.sync import sync_to_async
-from django.shortcuts import get_object_or_404
 import json
 
+from accounts.authentication import AuthMixin
+from .batch import BatchError, apply_operations, validate_operations
+from .changes import SyncTokenExpired, get_changes
+from .conditional import detail_validators, list_validators, not_modified, set_validators
+from .events import EventStreamResponse, TooManyConnections, get_broker, get_event_settings, publish_change
+from .encoding import FastJsonResponse, StreamingJsonArrayResponse, format_datetimes, parse_fields
+from .filters import apply_filters, apply_ordering
 from .models import Todo
+from .pagination import paginate, parse_limit
+from .search import TOKEN_RE, search_todos
 from .serializers import TodoSerializer
-
-
-class AuthMixin:
-    """Mixin to handle JWT authentication for async views"""
-    
-    async def get_authenticated_user(self, request):
-        """Get authenticated user from JWT token"""
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return None, JsonResponse({'error': 'Authentication required'}, status=401)
-        
-        token = auth_header.split(' ')[1]
-        
-        try:
-            from rest_framework_simplejwt.authentication import JWTAuthentication
-            jwt_auth = JWTAuthentication()
-            validated_token = await sync_to_async(jwt_auth.get_validated_token)(token)
-            user = await sync_to_async(jwt_auth.get_user)(validated_token)
-            return user, None
-        except Exception as e:
-            return None, JsonResponse({'error': f'Invalid token: {str(e)}'}, status=401)
+from .stats import get_stats
+from .writer import run_write
+from .writes import create_todo, delete_todo, toggle_todo, update_todo
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -39,16 +28,67 @@ class TodoListCreateView(View, AuthMixin):
             user, error_response = await self.get_authenticated_user(request)
             if error_response:
                 return error_response
-            
+
+            queryset = Todo.objects.filter(user=user)
+            paginated = 'limit' in request.GET or 'cursor' in request.GET
+            ordering = request.GET.get('ordering')
+
+            try:
+                fields = parse_fields(request.GET.get('fields'))
+                if ordering and paginated:
+                    raise ValueError('Cursor pagination only supports the default ordering')
+                # Filter and sort in SQL so the response only carries what the user sees
+                todos_qs = apply_filters(queryset, request.GET)
+                todos_qs = apply_ordering(todos_qs, ordering) if ordering else todos_qs.order_by('-created_at')
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            # Answer conditional requests before loading or serializing any rows;
+            # the ETag covers the user's whole list and includes the query string
+            etag = await list_validators(user, request)
+            response = not_modified(request, etag)
+            if response:
+                return response
+
+            # Reads skip TodoSerializer: plain values() rows are already the JSON shape,
+            # and only the requested columns are read from the table
+            query_fields = fields
+            if paginated and 'created_at' not in fields:
+                # Cursors are built from created_at, so fetch it even when not returned
+                query_fields = fields + ('created_at',)
+            rows = todos_qs.values(*query_fields)
+
+            # Clients opt in to cursor pagination by sending limit or cursor
+            if paginated:
+                try:
+                    limit = parse_limit(request.GET.get('limit'))
+                    todos, next_cursor, previous_cursor = await paginate(
+                        rows, cursor=request.GET.get('cursor') or None, limit=limit
+                    )
+                except ValueError as e:
+                    return JsonResponse({'error': str(e)}, status=400)
+
+                if query_fields is not fields:
+                    for row in todos:
+                        del row['created_at']
+
+                response = FastJsonResponse({
+                    'results': format_datetimes(todos),
+                    'next': next_cursor,
+                    'previous': previous_cursor,
+                })
+                return set_validators(response, etag)
+
+            # Large lists can be streamed instead of built up in memory
+            if request.GET.get('stream') in ('1', 'true'):
+                response = StreamingJsonArrayResponse(rows)
+                return set_validators(response, etag)
+
             # Get todos asynchronously
-            todos = await sync_to_async(list)(
-                Todo.objects.filter(user=user).order_by('-created_at')
-            )
-            
-            # Serialize data
-            serializer_data = await sync_to_async(lambda: TodoSerializer(todos, many=True).data)()
-            
-            return JsonResponse(serializer_data, safe=False)
+            todos = [row async for row in rows]
+
+            response = FastJsonResponse(format_datetimes(todos))
+            return set_validators(response, etag)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
@@ -58,21 +98,20 @@ class TodoListCreateView(View, AuthMixin):
             user, error_response = await self.get_authenticated_user(request)
             if error_response:
                 return error_response
-            
+
             # Parse JSON data
             data = json.loads(request.body.decode('utf-8'))
-            
-            # Validate and save
-            serializer = TodoSerializer(data=data, context={'request': type('Request', (), {'user': user})()})
-            is_valid = await sync_to_async(serializer.is_valid)()
-            if is_valid:
-                todo = await sync_to_async(serializer.save)()
-                todo_data = await sync_to_async(lambda: TodoSerializer(todo).data)()
-                return JsonResponse(todo_data, status=201)
+
+            # Validate and save; TodoSerializer validation never touches the DB
+            serializer = TodoSerializer(data=data)
+            if serializer.is_valid():
+                todo = await run_write(create_todo, user, serializer.validated_data)
+                data = TodoSerializer(todo).data
+                publish_change(user.pk, 'created', todo.pk, data)
+                return JsonResponse(data, status=201)
             else:
-                errors = await sync_to_async(lambda: serializer.errors)()
-                return JsonResponse(errors, status=400)
-                
+                return JsonResponse(serializer.errors, status=400)
+
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
         except Exception as e:
@@ -81,8 +120,12 @@ class TodoListCreateView(View, AuthMixin):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class TodoDetailView(View, AuthMixin):
-    async def get_object(self, pk, user):
-        return await sync_to_async(get_object_or_404)(Todo, pk=pk, user=user)
+    async def get_object(self, pk, user, only=None):
+        queryset = Todo.objects.only(*only) if only else Todo.objects
+        try:
+            return await queryset.aget(pk=pk, user=user)
+        except Todo.DoesNotExist:
+            raise Http404('No Todo matches the given query.')
 
     async def get(self, request, pk):
         try:
@@ -90,10 +133,22 @@ class TodoDetailView(View, AuthMixin):
             user, error_response = await self.get_authenticated_user(request)
             if error_response:
                 return error_response
-            
-            todo = await self.get_object(pk, user)
-            todo_data = await sync_to_async(lambda: TodoSerializer(todo).data)()
-            return JsonResponse(todo_data)
+
+            try:
+                fields = parse_fields(request.GET.get('fields'))
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            # Defer columns the client did not ask for; updated_at backs the validators
+            todo = await self.get_object(pk, user, only=set(fields) | {'updated_at'})
+
+            etag, last_modified = detail_validators(todo, request)
+            response = not_modified(request, etag, last_modified)
+            if response:
+                return response
+
+            response = JsonResponse(TodoSerializer(todo, fields=fields).data)
+            return set_validators(response, etag, last_modified)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=404)
 
@@ -103,21 +158,20 @@ class TodoDetailView(View, AuthMixin):
             user, error_response = await self.get_authenticated_user(request)
             if error_response:
                 return error_response
-            
+
             # Parse JSON data
             data = json.loads(request.body.decode('utf-8'))
-            
-            todo = await self.get_object(pk, user)
-            serializer = TodoSerializer(todo, data=data, partial=True)
-            is_valid = await sync_to_async(serializer.is_valid)()
-            if is_valid:
-                updated_todo = await sync_to_async(serializer.save)()
-                todo_data = await sync_to_async(lambda: TodoSerializer(updated_todo).data)()
-                return JsonResponse(todo_data)
+
+            # The todo is loaded inside the write transaction, so validate without it
+            serializer = TodoSerializer(data=data, partial=True)
+            if serializer.is_valid():
+                todo = await run_write(update_todo, user, pk, serializer.validated_data)
+                data = TodoSerializer(todo).data
+                publish_change(user.pk, 'updated', todo.pk, data)
+                return JsonResponse(data)
             else:
-                errors = await sync_to_async(lambda: serializer.errors)()
-                return JsonResponse(errors, status=400)
-                
+                return JsonResponse(serializer.errors, status=400)
+
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
         except Exception as e:
@@ -129,9 +183,10 @@ class TodoDetailView(View, AuthMixin):
             user, error_response = await self.get_authenticated_user(request)
             if error_response:
                 return error_response
-            
-            todo = await self.get_object(pk, user)
-            await sync_to_async(todo.delete)()
+
+            # Tombstone and stats are written in the same transaction as the delete
+            await run_write(delete_todo, user, pk)
+            publish_change(user.pk, 'deleted', pk)
             return JsonResponse({}, status=204)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=404)
@@ -145,11 +200,138 @@ class TodoToggleView(View, AuthMixin):
             user, error_response = await self.get_authenticated_user(request)
             if error_response:
                 return error_response
-            
-            todo = await sync_to_async(get_object_or_404)(Todo, pk=pk, user=user)
-            todo.completed = not todo.completed
-            await sync_to_async(todo.save)()
-            todo_data = await sync_to_async(lambda: TodoSerializer(todo).data)()
-            return JsonResponse(todo_data)
+
+            todo = await run_write(toggle_todo, user, pk)
+            data = TodoSerializer(todo).data
+            publish_change(user.pk, 'updated', todo.pk, data)
+            return JsonResponse(data)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=404)
+
+
+def publish_batch(user_id, validated, results):
+    """Publish a change event for each operation in a batch that succeeded"""
+    pks = {index: pk for index, _, pk, _ in validated}
+    for result in results:
+        if result['status'] == 204:
+            publish_change(user_id, 'deleted', pks[result['index']])
+        elif result['status'] in (200, 201):
+            kind = 'created' if result['status'] == 201 else 'updated'
+            publish_change(user_id, kind, result['data']['id'], result['data'])
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class TodoBatchView(View, AuthMixin):
+    async def post(self, request):
+        try:
+            # Authenticate user
+            user, error_response = await self.get_authenticated_user(request)
+            if error_response:
+                return error_response
+
+            # Parse JSON data
+            data = json.loads(request.body.decode('utf-8'))
+            if not isinstance(data, dict):
+                return JsonResponse({'error': 'Expected an object with an operations list'}, status=400)
+
+            try:
+                validated, results = validate_operations(data.get('operations'))
+            except BatchError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            # The whole batch is one job on the writer thread
+            results = await run_write(apply_operations, user, validated, results)
+            publish_batch(user.pk, validated, results)
+            return JsonResponse({'results': results})
+
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+class TodoEventsView(View, AuthMixin):
+    async def get(self, request):
+        try:
+            # Authenticate user; EventSource can't set headers, so ?token= is accepted too
+            user, error_response = await self.get_authenticated_user(request, allow_query_token=True)
+            if error_response:
+                return error_response
+
+            # Subscribe before responding so nothing published from here on is missed
+            try:
+                subscription = get_broker().subscribe(user.pk)
+            except TooManyConnections as e:
+                return JsonResponse({'error': str(e)}, status=429)
+
+            return EventStreamResponse(subscription, get_event_settings()['HEARTBEAT'])
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class TodoChangesView(View, AuthMixin):
+    async def get(self, request):
+        try:
+            # Authenticate user
+            user, error_response = await self.get_authenticated_user(request)
+            if error_response:
+                return error_response
+
+            try:
+                limit = parse_limit(request.GET.get('limit'))
+                todos, deleted, sync_token, has_more = await get_changes(
+                    user, token=request.GET.get('since') or None, limit=limit
+                )
+            except SyncTokenExpired as e:
+                return JsonResponse({'error': str(e)}, status=410)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            return JsonResponse({
+                'changed': TodoSerializer(todos, many=True).data,
+                'deleted': deleted,
+                'sync_token': sync_token,
+                'has_more': has_more,
+            })
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class TodoSearchView(View, AuthMixin):
+    async def get(self, request):
+        try:
+            # Authenticate user
+            user, error_response = await self.get_authenticated_user(request)
+            if error_response:
+                return error_response
+
+            query = request.GET.get('q', '')
+            if not TOKEN_RE.search(query):
+                return JsonResponse({'error': 'q is required'}, status=400)
+
+            try:
+                fields = parse_fields(request.GET.get('fields'))
+                limit = parse_limit(request.GET.get('limit'))
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+            todos = await search_todos(user, query, fields, limit)
+            return FastJsonResponse(format_datetimes(todos))
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class TodoStatsView(View, AuthMixin):
+    async def get(self, request):
+        try:
+            # Authenticate user
+            user, error_response = await self.get_authenticated_user(request)
+            if error_response:
+                return error_response
+
+            return JsonResponse(await get_stats(user))
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
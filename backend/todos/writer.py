@@ -0,0 +1,134 @@
+"""
+Single-writer queue for todo writes.
+
+SQLite allows one writer at a time. Under ASGI every request does its sync
+work on its own thread, so concurrent writes would each hold a connection
+and spin on busy_timeout for the lock. Instead, async views hand write jobs
+to one writer thread per database. The thread takes whatever jobs are
+waiting, runs them in a single transaction with a savepoint each, and
+resolves each caller's future once the transaction commits.
+"""
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from todo_project.metrics import record_wait
+
+
+MAX_GROUP_SIZE = 64
+
+
+def resolve(future, ok, value):
+    # The caller may have gone away (client disconnect cancels the view)
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+
+class WriteCoordinator:
+    def __init__(self, alias=DEFAULT_DB_ALIAS, max_group_size=MAX_GROUP_SIZE):
+        self.alias = alias
+        self.max_group_size = max_group_size
+        self.jobs = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.groups = 0
+        self.jobs_run = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name=f'todo-writer-{self.alias}', daemon=True)
+                self.thread.start()
+
+    async def submit(self, func, *args):
+        """Run ``func(*args)`` on the writer thread and return its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.start()
+        # The job runs in the caller's context so its queries count towards its request
+        self.jobs.put((func, args, loop, future, contextvars.copy_context(), time.perf_counter()))
+        return await future
+
+    def take_group(self):
+        """Block for one job, then take any others already waiting"""
+        group = [self.jobs.get()]
+        while len(group) < self.max_group_size:
+            try:
+                group.append(self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return group
+
+    def run(self):
+        while True:
+            self.run_group(self.take_group())
+
+    def run_group(self, group):
+        """
+        Run a group of jobs in one transaction.
+
+        Each job gets a savepoint, so one that raises (say Http404) is
+        rolled back alone and its exception goes to its own caller. If the
+        commit itself fails, nothing was saved and every caller gets the error.
+        """
+        outcomes = []
+        try:
+            with transaction.atomic(using=self.alias):
+                for func, args, _, _, context, submitted in group:
+                    context.run(record_wait, 'todo_writer', time.perf_counter() - submitted)
+                    try:
+                        with transaction.atomic(using=self.alias):
+                            outcomes.append((True, context.run(func, *args)))
+                    except Exception as e:
+                        outcomes.append((False, e))
+        except Exception as e:
+            outcomes = [(False, e)] * len(group)
+            # Start the next group on a fresh connection
+            connections[self.alias].close()
+
+        self.groups += 1
+        self.jobs_run += len(group)
+        for (ok, value), (_, _, loop, future, _, _) in zip(outcomes, group):
+            loop.call_soon_threadsafe(resolve, future, ok, value)
+
+
+coordinators = {}
+coordinators_lock = threading.Lock()
+
+
+def get_coordinator(alias=DEFAULT_DB_ALIAS):
+    with coordinators_lock:
+        if alias not in coordinators:
+            coordinators[alias] = WriteCoordinator(alias)
+        return coordinators[alias]
+
+
+def use_write_queue(alias=DEFAULT_DB_ALIAS):
+    """
+    The queue only pays off for SQLite's single write lock. In-memory
+    databases (the test suite) are left alone, since a second thread's
+    connection would not see the test case's open transaction.
+    """
+    connection = connections[alias]
+    return (
+        getattr(settings, 'TODO_WRITE_QUEUE', True)
+        and connection.vendor == 'sqlite'
+        and not connection.is_in_memory_db()
+    )
+
+
+async def run_write(func, *args):
+    """Run a sync write function from an async view, through the write queue if enabled"""
+    if use_write_queue():
+        return await get_coordinator().submit(func, *args)
+    return await sync_to_async(func)(*args)
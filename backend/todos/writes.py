@@ -0,0 +1,124 @@
+"""
+Transactional todo writes.
+
+Every change to a todo also adjusts the owner's TodoStats row and, for
+deletes, leaves a tombstone. Django's transactions are sync-only, so the
+async views run each of these in a single sync_to_async hop.
+
+Toggle and delete change the row with one UPDATE/DELETE ... RETURNING
+statement. The returned row supplies the state the stats delta needs, so
+the row is never read first, and two concurrent toggles can't both flip
+it from the same value. Updates load the row and write back only the
+columns that changed. Backends without RETURNING (SQLite before 3.35)
+get equivalent ORM queries.
+"""
+from collections import Counter
+
+from django.db import connections, router, transaction
+from django.db.models import Case, Value, When
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from .changes import record_tombstones
+from .models import Todo
+from .stats import apply_delta, count_todo, counter_field
+
+
+def supports_returning(connection):
+    return connection.vendor in ('sqlite', 'postgresql') and connection.features.can_return_columns_from_insert
+
+
+def write_returning(connection, statement, where_params, params=()):
+    """
+    Run an UPDATE or DELETE of one todo, matched by id and user_id, that
+    returns every column. ``statement`` is formatted with the quoted
+    ``table`` and column names. Returns the todo, or None if no row matched.
+    """
+    qn = connection.ops.quote_name
+    fields = Todo._meta.concrete_fields
+    columns = {field.attname: qn(field.column) for field in fields}
+    sql = (
+        statement.format(table=qn(Todo._meta.db_table), **columns)
+        + f" WHERE {columns['id']} = %s AND {columns['user_id']} = %s"
+        + f" RETURNING {', '.join(columns.values())}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, *where_params])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    # Apply the converters a normal query would, so datetimes come back aware
+    values = []
+    for field, value in zip(fields, row):
+        column = field.get_col(Todo._meta.db_table)
+        for converter in connection.ops.get_db_converters(column) + field.get_db_converters(connection):
+            value = converter(value, column, connection)
+        values.append(value)
+    return Todo.from_db(connection.alias, [field.attname for field in fields], values)
+
+
+def create_todo(user, data):
+    with transaction.atomic():
+        todo = Todo.objects.create(user=user, **data)
+        apply_delta(todo.user_id, count_todo(Counter(), todo, 1))
+    return todo
+
+
+def update_todo(user, pk, data):
+    """Apply validated data to one of the user's todos; raises Http404 if missing"""
+    with transaction.atomic():
+        todo = get_object_or_404(Todo, pk=pk, user=user)
+        changed = [attr for attr, value in data.items() if getattr(todo, attr) != value]
+        if not changed:
+            # Nothing to write, and updated_at (and so the ETag) stays put
+            return todo
+        delta = count_todo(Counter(), todo, -1)
+        for attr in changed:
+            setattr(todo, attr, data[attr])
+        todo.save(update_fields=[*changed, 'updated_at'])
+        # Bumps the list version, and the counters if completed or priority changed
+        apply_delta(todo.user_id, count_todo(delta, todo, 1))
+    return todo
+
+
+def toggle_todo(user, pk):
+    """Flip completed in the database; raises Http404 if the todo is missing"""
+    now = timezone.now()
+    alias = router.db_for_write(Todo)
+    connection = connections[alias]
+    with transaction.atomic(using=alias):
+        if supports_returning(connection):
+            updated_at = Todo._meta.get_field('updated_at').get_db_prep_value(now, connection)
+            todo = write_returning(
+                connection, 'UPDATE {table} SET {completed} = NOT {completed}, {updated_at} = %s',
+                [pk, user.pk], [updated_at],
+            )
+        else:
+            flipped = Case(When(completed=True, then=Value(False)), default=Value(True))
+            todo = None
+            if Todo.objects.using(alias).filter(pk=pk, user=user).update(completed=flipped, updated_at=now):
+                todo = Todo.objects.using(alias).get(pk=pk)
+        if todo is None:
+            raise Http404('No Todo matches the given query.')
+        delta = Counter({counter_field(not todo.completed, todo.priority): -1})
+        delta[counter_field(todo.completed, todo.priority)] += 1
+        apply_delta(todo.user_id, delta)
+    return todo
+
+
+def delete_todo(user, pk):
+    """Delete one of the user's todos, leaving a tombstone for delta sync"""
+    alias = router.db_for_write(Todo)
+    connection = connections[alias]
+    with transaction.atomic(using=alias):
+        if supports_returning(connection):
+            todo = write_returning(connection, 'DELETE FROM {table}', [pk, user.pk])
+        else:
+            todo = Todo.objects.using(alias).filter(pk=pk, user=user).first()
+            if todo is not None:
+                Todo.objects.using(alias).filter(pk=pk).delete()
+        if todo is None:
+            raise Http404('No Todo matches the given query.')
+        record_tombstones(todo.user_id, [todo.pk])
+        apply_delta(todo.user_id, count_todo(Counter(), todo, -1))
@@ -3,7 +3,7 @@
 import { useState, useEffect } from 'react';
 import { useAuth } from '@/contexts/AuthContext';
 import { useRouter } from 'next/navigation';
-import { Todo, todosAPI } from '@/lib/api';
+import { Todo, TodoEvent, todosAPI } from '@/lib/api';
 import { Plus, Check, X, Edit, Trash2 } from 'lucide-react';
 
 export default function DashboardPage() {
@@ -31,6 +31,29 @@ export default function DashboardPage() {
     }
   }, [isAuthenticated, authLoading, router]);
 
+  useEffect(() => {
+    if (!isAuthenticated) {
+      return;
+    }
+
+    // Keep the list in step with changes made in other tabs and devices
+    const handleEvent = (event: TodoEvent) => {
+      if (event.type === 'resync' || (event.type !== 'deleted' && !event.todo)) {
+        fetchTodos();
+      } else if (event.type === 'deleted') {
+        setTodos(current => current.filter(todo => todo.id !== event.id));
+      } else if (event.type === 'created') {
+        const created = event.todo!;
+        setTodos(current => current.some(todo => todo.id === created.id) ? current : [created, ...current]);
+      } else {
+        const updated = event.todo!;
+        setTodos(current => current.map(todo => todo.id === updated.id ? updated : todo));
+      }
+    };
+    // Refetch on every (re)connect to pick up changes missed while disconnected
+    return todosAPI.subscribe(handleEvent, () => fetchTodos());
+  }, [isAuthenticated]);
+
   const fetchTodos = async () => {
     try {
       setLoading(true);
@@ -52,7 +75,8 @@ export default function DashboardPage() {
         due_date: newTodo.due_date || undefined,
       };
       const createdTodo = await todosAPI.createTodo(todoData);
-      setTodos([createdTodo, ...todos]);
+      // The change event for this todo may already have added it
+      setTodos(current => current.some(todo => todo.id === createdTodo.id) ? current : [createdTodo, ...current]);
       setNewTodo({ title: '', description: '', priority: 'medium', due_date: '' });
       setShowAddForm(false);
     } catch (error) {
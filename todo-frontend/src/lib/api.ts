@@ -2,6 +2,10 @@ import axios from 'axios';
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000/api';
 
+// Delay before reopening an event stream the server closed, doubling per failure
+const SUBSCRIBE_RETRY_MIN_MS = 1000;
+const SUBSCRIBE_RETRY_MAX_MS = 30000;
+
 const api = axios.create({
   baseURL: API_BASE_URL,
   headers: {
@@ -18,35 +22,70 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Refresh tokens are single use: rotation revokes the old one, so two
+// requests refreshing with it at once would get one of them a 401 and
+// log the user out. Every caller shares the one refresh in flight.
+let refreshPromise: Promise<string> | null = null;
+
+const refreshAccessToken = (): Promise<string> => {
+  if (!refreshPromise) {
+    refreshPromise = (async () => {
+      const response = await axios.post(`${API_BASE_URL}/auth/token/refresh/`, {
+        refresh: localStorage.getItem('refresh_token'),
+      });
+
+      const { access, refresh } = response.data as { access: string; refresh?: string };
+      localStorage.setItem('access_token', access);
+      // Refresh tokens are rotated and the old one revoked, so keep the new one
+      if (refresh) {
+        localStorage.setItem('refresh_token', refresh);
+      }
+      return access;
+    })().finally(() => {
+      refreshPromise = null;
+    });
+  }
+  return refreshPromise;
+};
+
+// Whether a JWT has expired (or is about to), read from its exp claim
+const isExpired = (token: string | null): boolean => {
+  try {
+    const payload = (token ?? '').split('.')[1].replace(/-/g, '+').replace(/_/g, '/');
+    const { exp } = JSON.parse(atob(payload)) as { exp: number };
+    return exp * 1000 <= Date.now() + 5000;
+  } catch {
+    return true;
+  }
+};
+
 // Handle token refresh
 api.interceptors.response.use(
   (response) => response,
   async (error) => {
     const originalRequest = error.config;
     
-    if (error.response?.status === 401 && !originalRequest._retry) {
+    if (error.response?.status === 401 && !originalRequest._retry && localStorage.getItem('refresh_token')) {
       originalRequest._retry = true;
-      
-      const refreshToken = localStorage.getItem('refresh_token');
-      if (refreshToken) {
-        try {
-          const response = await axios.post(`${API_BASE_URL}/auth/token/refresh/`, {
-            refresh: refreshToken,
-          });
-          
-          const { access } = response.data as { access: string };
-          localStorage.setItem('access_token', access);
-          if (originalRequest.headers) {
-            originalRequest.headers.Authorization = `Bearer ${access}`;
-          }
-          
-          return api(originalRequest);
-        } catch (refreshError) {
-          localStorage.removeItem('access_token');
-          localStorage.removeItem('refresh_token');
-          window.location.href = '/login';
-        }
+
+      let access: string;
+      try {
+        // A request sent before another one finished refreshing only needs the new token
+        const current = localStorage.getItem('access_token');
+        access = current && originalRequest.headers?.Authorization !== `Bearer ${current}`
+          ? current
+          : await refreshAccessToken();
+      } catch (refreshError) {
+        localStorage.removeItem('access_token');
+        localStorage.removeItem('refresh_token');
+        window.location.href = '/login';
+        return Promise.reject(error);
+      }
+      if (originalRequest.headers) {
+        originalRequest.headers.Authorization = `Bearer ${access}`;
       }
+
+      return api(originalRequest);
     }
     
     return Promise.reject(error);
@@ -72,6 +111,11 @@ export interface Todo {
   due_date?: string;
 }
 
+export type TodoEvent =
+  | { type: 'created' | 'updated'; id: number; todo?: Todo }
+  | { type: 'deleted'; id: number }
+  | { type: 'resync' };
+
 export interface AuthTokens {
   access: string;
   refresh: string;
@@ -126,6 +170,53 @@ export const todosAPI = {
     const response = await api.patch(`/todos/${id}/toggle/`);
     return response.data as Todo;
   },
+
+  // EventSource can't send an Authorization header, so the token goes in the query string
+  subscribe: (onEvent: (event: TodoEvent) => void, onOpen?: () => void): (() => void) => {
+    let source: EventSource | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let retryDelay = SUBSCRIBE_RETRY_MIN_MS;
+    let unsubscribed = false;
+
+    const connect = () => {
+      const token = localStorage.getItem('access_token');
+      const current = new EventSource(`${API_BASE_URL}/todos/events/?token=${encodeURIComponent(token ?? '')}`);
+      source = current;
+      current.onmessage = (message) => onEvent(JSON.parse(message.data) as TodoEvent);
+      current.onopen = () => {
+        retryDelay = SUBSCRIBE_RETRY_MIN_MS;
+        onOpen?.();
+      };
+      // The browser reconnects dropped streams by itself, but gives up for good on an
+      // error response, such as the 401 an expired token gets. Reconnect with a fresh one.
+      current.onerror = () => {
+        if (current.readyState !== EventSource.CLOSED || unsubscribed) {
+          return;
+        }
+        retryTimer = setTimeout(async () => {
+          if (localStorage.getItem('access_token') === token && isExpired(token)) {
+            try {
+              await refreshAccessToken();
+            } catch {
+              // The next API call will find the session gone and go to the login page
+              return;
+            }
+          }
+          if (!unsubscribed) {
+            connect();
+          }
+        }, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, SUBSCRIBE_RETRY_MAX_MS);
+      };
+    };
+
+    connect();
+    return () => {
+      unsubscribed = true;
+      clearTimeout(retryTimer);
+      source?.close();
+    };
+  },
 };
 
 export default api;